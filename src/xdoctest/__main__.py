@@ -37,6 +37,17 @@ def main(argv: list[str] | None = None) -> int:
         print(version_info['version'])
         return 0
 
+    # Workers of a queue run have their own command line interface
+    is_worker = len(argv) > 1 and argv[1] == 'worker'
+    if is_worker and any(a.split('=')[0] == '--connect' for a in argv[2:]):
+        from xdoctest import workqueue
+
+        return workqueue.worker_main(argv[2:])
+
+    serve_queue = len(argv) > 1 and argv[1] == 'serve-queue'
+    if serve_queue:
+        argv = argv[:1] + argv[2:]
+
     if '--version-info' in argv:
         print('sys_version = {}'.format(version_info['sys_version']))
         print('file = {}'.format(__file__))
@@ -125,6 +136,28 @@ def main(argv: list[str] | None = None) -> int:
         else:
             command = arg.pop(0)
 
+    if not serve_queue and (ns['listen'] is not None or ns['workers']):
+        errors += ['--listen and --workers require the serve-queue command']
+
+    if ns['resume'] and ns['journal'] is None:
+        errors += ['--resume requires --journal']
+
+    if ns['keyword'] is not None:
+        from xdoctest import selection
+
+        try:
+            selection.compile_keyword(ns['keyword'])
+        except ValueError as ex:
+            errors += [str(ex)]
+
+    if ns['sample'] is not None:
+        from xdoctest import smoke
+
+        try:
+            smoke.parse_sample(ns['sample'])
+        except ValueError as ex:
+            errors += [str(ex)]
+
     if errors:
         if len(errors) == 1:
             errmsg = errors[0]
@@ -174,7 +207,10 @@ def main(argv: list[str] | None = None) -> int:
 
     from xdoctest import doctest_example
 
-    config = doctest_example.DoctestConfig()._populate_from_cli(ns)
+    try:
+        config = doctest_example.DoctestConfig()._populate_from_cli(ns)
+    except ValueError as ex:
+        parser.error(str(ex))
 
     if config['verbose'] > 2:
         print(
@@ -199,10 +235,60 @@ def main(argv: list[str] | None = None) -> int:
         config=config,
         durations=durations,
         analysis=analysis,
+        timing_breakdown=ns['timing_breakdown'],
+        profile=ns['profile'],
+        profile_dir=ns['profile_dir'],
+        sample_profile=ns['sample_profile'],
+        trace_events=ns['trace_events'],
+        resource_report=ns['resource_report'],
+        detect_leaks=ns['detect_leaks'],
+        leak_reruns=ns['leak_reruns'],
+        repeat=ns['repeat'],
+        warmup=ns['warmup'],
+        benchmark_json=ns['benchmark_json'],
+        cache_dir=ns['cache_dir'],
+        duration_history=ns['duration_history'],
+        longest_first=ns['longest_first'],
+        progress=ns['progress'],
+        save_baseline=ns['save_baseline'],
+        compare_baseline=ns['compare_baseline'],
+        baseline_rtol=ns['baseline_rtol'],
+        baseline_atol=ns['baseline_atol'],
+        # Only touch the cache when an option uses it
+        cache_failures=bool(
+            ns['cache_dir']
+            or ns['last_failed']
+            or ns['failed_first']
+            or ns['maxfail']
+        ),
+        last_failed=ns['last_failed'],
+        failed_first=ns['failed_first'],
+        maxfail=ns['maxfail'],
+        cache_results=ns['cache_results'],
+        no_cache=ns['no_cache'],
+        changed_since=ns['changed_since'],
+        record_impact=ns['record_impact'],
+        impacted=ns['impacted'],
+        coverage=ns['coverage'],
+        shard=ns['shard'],
+        shard_strategy=ns['shard_strategy'],
+        shard_report=ns['shard_report'],
+        serve_queue=(ns['listen'] or '127.0.0.1:0') if serve_queue else None,
+        queue_workers=ns['workers'],
+        time_budget=ns['time_budget'],
+        sample=ns['sample'],
+        journal=ns['journal'],
+        resume=ns['resume'],
+        keyword=ns['keyword'],
+        dedup=ns['dedup'],
     )
     n_failed = run_summary.get('n_failed', 0)
     if n_failed > 0:
         return 1
+    elif ns['fail_on_regression'] and run_summary.get('baseline', {}).get(
+        'regressions'
+    ):
+        return 1
     else:
         return 0
 
@@ -0,0 +1,287 @@
+"""
+Detect doctest performance regressions between runs.
+
+A baseline stores the duration of each passing doctest (and its peak Python
+allocations when ``--resource-report`` is enabled) under a name in the cache
+directory. A later run can be compared against it, which reports a ranked
+table of the doctests that became slower or use more memory.
+
+Timings are noisy, so a doctest only counts as a regression when the increase
+exceeds all of the following:
+
+    * a relative tolerance (``--baseline-rtol``, 20% by default)
+    * an absolute tolerance (``--baseline-atol``, 5ms by default)
+    * a multiple of the combined standard deviation of both measurements,
+      which is known when the runs use ``--repeat``
+
+With ``--repeat`` the median of the repeated timings is compared, otherwise
+the time spent in the doctest's own code in the single checked run.
+
+CommandLine:
+    xdoctest -m xdoctest.checker all --repeat 5 --save-baseline main
+    xdoctest -m xdoctest.checker all --repeat 5 --compare-baseline main --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import typing
+
+# Differences smaller than this many bytes of peak allocation are ignored
+MEMORY_ATOL = 64 * 1024
+
+
+def _baseline_fpath(name: str, dpath: str | None = None) -> str:
+    """
+    Args:
+        name (str): the name of the baseline
+        dpath (str | None): the cache directory
+
+    Returns:
+        str
+
+    Example:
+        >>> from xdoctest.baseline import _baseline_fpath
+        >>> _baseline_fpath('main', 'cache')
+        'cache/baselines/main.json'
+    """
+    from xdoctest import cache
+
+    if not name or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError('Invalid baseline name: {!r}'.format(name))
+    if dpath is None:
+        dpath = cache.default_cache_dpath()
+    return os.path.join(dpath, 'baselines', name + '.json')
+
+
+def measure(run_summary: dict[str, typing.Any]) -> dict[str, dict]:
+    """
+    Extract the measurements of the passing doctests in a run.
+
+    Args:
+        run_summary (Dict[str, Any]): the result of the native runner
+
+    Returns:
+        Dict[str, Dict]: maps the keys of doctests (see
+            :func:`xdoctest.sharding.shard_key`, so baselines can be compared
+            between checkouts) to the duration (``seconds``), its standard
+            deviation (``stddev``), the number of timings (``n``), and
+            optionally the peak allocations (``peak_alloc``).
+    """
+    from xdoctest.sharding import shard_key
+
+    failed = set(run_summary.get('failed', []))
+    measurements: dict[str, dict] = {}
+    # The benchmark and resource records refer to doctests by node id
+    node_to_key: dict[str, str] = {}
+    for example in run_summary.get('times', {}):
+        if example in failed or not example.part_times:
+            continue
+        seconds = sum(timer.wall for timer in example.part_times.values())
+        key = shard_key(example)
+        node_to_key[example.node] = key
+        measurements[key] = {'seconds': seconds, 'stddev': 0.0, 'n': 1}
+
+    # Prefer the statistics of a benchmark run
+    bench_info = run_summary.get('benchmark', {})
+    for row in bench_info.get('results', []):
+        if row['node'] in node_to_key:
+            measurements[node_to_key[row['node']]].update(
+                {
+                    'seconds': row['median'],
+                    'stddev': row['stddev'],
+                    'n': row['n'],
+                }
+            )
+
+    resource_info = run_summary.get('resources', {})
+    for record in resource_info.get('records', []):
+        if record['node'] in node_to_key:
+            key = node_to_key[record['node']]
+            measurements[key]['peak_alloc'] = record['peak_alloc']
+    return measurements
+
+
+def save(
+    name: str, measurements: dict[str, dict], dpath: str | None = None
+) -> str:
+    """
+    Args:
+        name (str): the name of the baseline
+        measurements (Dict[str, Dict]): the result of :func:`measure`
+        dpath (str | None): the cache directory
+
+    Returns:
+        str: the path of the written baseline
+    """
+    import datetime
+    import platform
+    import sys
+
+    import xdoctest
+    from xdoctest import cache
+
+    fpath = _baseline_fpath(name, dpath)
+    data = {
+        'xdoctest_version': xdoctest.__version__,
+        'python': sys.version,
+        'platform': platform.platform(),
+        'created': datetime.datetime.now().isoformat(),
+        'nodes': measurements,
+    }
+    cache.write_json(fpath, data)
+    return fpath
+
+
+def load(name: str, dpath: str | None = None) -> dict[str, dict] | None:
+    """
+    Args:
+        name (str): the name of the baseline
+        dpath (str | None): the cache directory
+
+    Returns:
+        Dict[str, Dict] | None: the stored measurements or None if the
+            baseline does not exist
+    """
+    from xdoctest import cache
+
+    data = cache.read_json(_baseline_fpath(name, dpath))
+    if not isinstance(data, dict):
+        return None
+    return data.get('nodes', {})
+
+
+def compare(
+    reference: dict[str, dict],
+    measurements: dict[str, dict],
+    rtol: float = 0.2,
+    atol: float = 0.005,
+    n_sigma: float = 3.0,
+) -> dict[str, typing.Any]:
+    """
+    Compare the measurements of a run against a baseline.
+
+    Args:
+        reference (Dict[str, Dict]): the baseline measurements
+        measurements (Dict[str, Dict]): the new measurements
+        rtol (float): relative increase that is tolerated
+        atol (float): increase in seconds that is tolerated
+        n_sigma (float): number of combined standard deviations that are
+            tolerated
+
+    Returns:
+        Dict[str, Any]: with the keys ``regressions`` and ``improvements``
+            (lists of rows sorted by the relative change, largest first),
+            ``n_unchanged``, ``new`` (nodes without a baseline), and
+            ``missing`` (baseline nodes that did not pass in this run).
+            Each row has the keys ``node``, ``kind`` (time or memory),
+            ``old``, ``new``, and ``change``.
+
+    Example:
+        >>> from xdoctest.baseline import compare
+        >>> reference = {
+        ...     'a': {'seconds': 1.0, 'stddev': 0.0, 'n': 1},
+        ...     'b': {'seconds': 1.0, 'stddev': 0.4, 'n': 5},
+        ...     'c': {'seconds': 0.001, 'stddev': 0.0, 'n': 1},
+        ...     'd': {'seconds': 1.0, 'stddev': 0.0, 'n': 1,
+        ...           'peak_alloc': 10 ** 6},
+        ...     'gone': {'seconds': 1.0, 'stddev': 0.0, 'n': 1},
+        ... }
+        >>> measurements = {
+        ...     'a': {'seconds': 1.5, 'stddev': 0.0, 'n': 1},
+        ...     'b': {'seconds': 1.5, 'stddev': 0.4, 'n': 5},
+        ...     'c': {'seconds': 0.002, 'stddev': 0.0, 'n': 1},
+        ...     'd': {'seconds': 0.5, 'stddev': 0.0, 'n': 1,
+        ...           'peak_alloc': 3 * 10 ** 6},
+        ...     'added': {'seconds': 1.0, 'stddev': 0.0, 'n': 1},
+        ... }
+        >>> result = compare(reference, measurements)
+        >>> # b is within the noise and c is within the absolute tolerance
+        >>> [(r['node'], r['kind']) for r in result['regressions']]
+        [('d', 'memory'), ('a', 'time')]
+        >>> [(r['node'], r['kind']) for r in result['improvements']]
+        [('d', 'time')]
+        >>> result['new'], result['missing'], result['n_unchanged']
+        (['added'], ['gone'], 2)
+    """
+    regressions = []
+    improvements = []
+    n_unchanged = 0
+    for node, new in measurements.items():
+        old = reference.get(node, None)
+        if old is None:
+            continue
+        pairs = [
+            (
+                'time',
+                old['seconds'],
+                new['seconds'],
+                max(
+                    atol,
+                    n_sigma * math.hypot(old['stddev'], new['stddev']),
+                ),
+            )
+        ]
+        if 'peak_alloc' in old and 'peak_alloc' in new:
+            pairs.append(
+                ('memory', old['peak_alloc'], new['peak_alloc'], MEMORY_ATOL)
+            )
+        changed = False
+        for kind, old_value, new_value, tolerance in pairs:
+            delta = new_value - old_value
+            threshold = max(tolerance, rtol * old_value)
+            if abs(delta) <= threshold:
+                continue
+            row = {
+                'node': node,
+                'kind': kind,
+                'old': old_value,
+                'new': new_value,
+                'change': delta / old_value if old_value else math.inf,
+            }
+            changed = True
+            if delta > 0:
+                regressions.append(row)
+            else:
+                improvements.append(row)
+        if not changed:
+            n_unchanged += 1
+
+    result = {
+        'regressions': sorted(
+            regressions, key=lambda r: r['change'], reverse=True
+        ),
+        'improvements': sorted(improvements, key=lambda r: r['change']),
+        'n_unchanged': n_unchanged,
+        'new': sorted(set(measurements) - set(reference)),
+        'missing': sorted(set(reference) - set(measurements)),
+    }
+    return result
+
+
+def format_row(row: dict[str, typing.Any]) -> str:
+    """
+    Args:
+        row (Dict[str, Any]): a row of the result of :func:`compare`
+
+    Returns:
+        str
+
+    Example:
+        >>> from xdoctest.baseline import format_row
+        >>> print(format_row({'node': 'mod.py::f:0', 'kind': 'time',
+        ...                   'old': 0.5, 'new': 0.75, 'change': 0.5}))
+        +50.0% time: 0.50000000 -> 0.75000000, test: mod.py::f:0
+    """
+    from xdoctest import resources
+
+    if row['kind'] == 'memory':
+        old_text = resources.format_nbytes(row['old'])
+        new_text = resources.format_nbytes(row['new'])
+    else:
+        old_text = '{:0.8f}'.format(row['old'])
+        new_text = '{:0.8f}'.format(row['new'])
+    return '{:+.1f}% {}: {} -> {}, test: {}'.format(
+        100 * row['change'], row['kind'], old_text, new_text, row['node']
+    )
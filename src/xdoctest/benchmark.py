@@ -0,0 +1,218 @@
+"""
+Use doctests as micro-benchmarks.
+
+Docstring examples are often the most representative usage snippets of a
+library, so tracking their speed is useful. The :class:`Benchmark` re-executes
+each passing doctest in a fresh namespace and reports the minimum, median,
+and standard deviation of the time spent in user code.
+
+Only the first (regular) execution of each doctest checks "got" against
+"want". The additional iterations run with ``IGNORE_WANT`` so the measurement
+loop stays cheap. With ``warmup=K`` the first K executions (including the
+checked one) are discarded.
+
+Results can be written to a JSON file that can be compared across commits.
+
+CommandLine:
+    xdoctest -m xdoctest.checker all --repeat 10 --warmup 2 --benchmark-json bench.json
+"""
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+
+def _exec_seconds(example: DocTest) -> float:
+    """
+    Args:
+        example (DocTest): a doctest that has been run
+
+    Returns:
+        float: wall time spent executing user code in the last run
+    """
+    return sum(timer.wall for timer in example.part_times.values())
+
+
+def _stats(times: list[float]) -> dict[str, typing.Any]:
+    """
+    Args:
+        times (List[float]): measured durations
+
+    Returns:
+        Dict[str, Any]
+
+    Example:
+        >>> from xdoctest.benchmark import _stats
+        >>> stats = _stats([3.0, 1.0, 2.0])
+        >>> print(stats['min'], stats['median'], stats['stddev'], stats['n'])
+        1.0 2.0 1.0 3
+    """
+    import statistics
+
+    stats = {
+        'n': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'times': times,
+    }
+    return stats
+
+
+class Benchmark:
+    """
+    Repeats passing doctests and collects timing statistics.
+
+    This is used as an example hook: :func:`after_example` records the time
+    of the regular (checked) run, and :func:`run` performs the remaining
+    iterations once all doctests have been run.
+
+    Attributes:
+        repeat (int): number of measured iterations per doctest
+        warmup (int): number of discarded iterations per doctest
+        results (Dict[DocTest, Dict[str, Any]]): statistics for each doctest
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.core import parse_docstr_examples
+        >>> from xdoctest.benchmark import Benchmark
+        >>> docstr = utils.codeblock(
+        ...     '''
+        ...     >>> print(sum(range(1000)))
+        ...     499500
+        ...     ''')
+        >>> example = next(parse_docstr_examples(docstr, 'bench'))
+        >>> self = Benchmark(repeat=5, warmup=2)
+        >>> self.before_example(example)
+        >>> summary = example.run(verbose=0)
+        >>> self.after_example(example, summary)
+        >>> self.run()
+        >>> stats = self.results[example]
+        >>> assert stats['n'] == 5
+        >>> assert stats['min'] <= stats['median']
+    """
+
+    def __init__(self, repeat: int, warmup: int = 0) -> None:
+        """
+        Args:
+            repeat (int): number of measured iterations per doctest
+            warmup (int): number of leading iterations to discard
+        """
+        if repeat < 1:
+            raise ValueError('repeat must be at least 1, got {}'.format(repeat))
+        if warmup < 0:
+            raise ValueError(
+                'warmup must be non-negative, got {}'.format(warmup)
+            )
+        self.repeat = repeat
+        self.warmup = warmup
+        self.results: dict[DocTest, dict[str, typing.Any]] = {}
+        self.errors: dict[DocTest, str] = {}
+        self._first_times: dict[DocTest, float] = {}
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+    def before_example(self, example: DocTest) -> None:
+        pass
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        if summary is not None and summary['passed']:
+            self._first_times[example] = _exec_seconds(example)
+
+    def _rerun(self, example: DocTest) -> float | None:
+        """
+        Execute a doctest again without checking its output.
+
+        Returns:
+            float | None: the time spent in user code or None on error
+        """
+        orig_state = example.config['default_runtime_state']
+        runtime_state = dict(orig_state)
+        runtime_state['IGNORE_WANT'] = True
+        example.config['default_runtime_state'] = runtime_state
+        try:
+            summary = example.run(verbose=0, on_error='return')
+        finally:
+            example.config['default_runtime_state'] = orig_state
+        if not summary['passed']:
+            return None
+        return _exec_seconds(example)
+
+    def run(self) -> None:
+        """
+        Run the remaining iterations of each doctest that passed.
+        """
+        n_total = self.warmup + self.repeat
+        for example, first_time in self._first_times.items():
+            times = [first_time]
+            while len(times) < n_total:
+                seconds = self._rerun(example)
+                if seconds is None:
+                    self.errors[example] = 'failed on iteration {}'.format(
+                        len(times)
+                    )
+                    break
+                times.append(seconds)
+            else:
+                self.results[example] = _stats(times[self.warmup :])
+
+    def summary(self) -> dict[str, typing.Any]:
+        """
+        Returns:
+            Dict[str, Any]: json-friendly statistics for each doctest,
+                slowest (by median) first.
+        """
+        results = []
+        for example, stats in self.results.items():
+            row = {'node': example.node}
+            row.update(stats)
+            results.append(row)
+        results = sorted(results, key=lambda r: r['median'], reverse=True)
+        summary = {
+            'repeat': self.repeat,
+            'warmup': self.warmup,
+            'results': results,
+            'errors': {
+                example.node: msg for example, msg in self.errors.items()
+            },
+        }
+        return summary
+
+    def dump_json(self, fpath: str) -> None:
+        """
+        Write the results along with information about the environment.
+
+        Args:
+            fpath (str): path of the JSON file to write
+        """
+        import datetime
+        import json
+        import platform
+        import sys
+
+        import xdoctest
+
+        data = {
+            'xdoctest_version': xdoctest.__version__,
+            'python': sys.version,
+            'platform': platform.platform(),
+            'created': datetime.datetime.now().isoformat(),
+        }
+        data.update(self.summary())
+        with open(fpath, 'w') as file:
+            json.dump(data, file, indent=2)
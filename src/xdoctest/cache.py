@@ -0,0 +1,904 @@
+"""
+Persistent state that is shared between xdoctest runs.
+
+Information about previous runs is kept in a small local store, by default in
+the ``.xdoctest_cache`` directory of the current working directory. The
+location can be changed with ``--cache-dir`` or the ``XDOCTEST_CACHE_DIR``
+environment variable.
+
+The :class:`DurationHistory` keeps an exponentially weighted moving average
+(EWMA) of the duration of each doctest. It is used to run the longest doctests
+first (so stragglers do not extend the wall time when the work is split
+between several workers) and to estimate the time remaining in a run with
+:class:`ProgressReporter`. Both the native runner and the pytest plugin read
+and write the same store.
+
+The :class:`FailureCache` remembers which doctests failed in previous runs,
+so they can be re-run alone (``--lf``) or first (``--ff``).
+
+The :class:`ResultCache` remembers a fingerprint of each doctest that passed
+and lets ``--cache-results`` skip doctests whose fingerprint did not change.
+
+Files are replaced atomically and entries written by concurrent processes are
+merged, so several workers may share a cache directory.
+
+CommandLine:
+    xdoctest -m xdoctest.checker all --duration-history
+    xdoctest -m xdoctest.checker all --longest-first --progress
+    xdoctest -m xdoctest.checker all --lf --maxfail 3
+    xdoctest -m xdoctest.checker all --cache-results
+    pytest --xdoctest --xdoctest-duration-history --xdoctest-longest-first
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+import typing
+import warnings
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+CACHE_DNAME = '.xdoctest_cache'
+
+
+def default_cache_dpath() -> str:
+    """
+    Returns:
+        str: the cache directory used when none is specified
+
+    Example:
+        >>> from xdoctest.cache import default_cache_dpath
+        >>> assert default_cache_dpath()
+    """
+    return os.environ.get('XDOCTEST_CACHE_DIR', '') or CACHE_DNAME
+
+
+def read_json(fpath: str, default: typing.Any = None) -> typing.Any:
+    """
+    Read a JSON file from the cache.
+
+    Args:
+        fpath (str): the file to read
+        default (Any): returned if the file does not exist or is corrupt
+
+    Returns:
+        Any
+
+    Example:
+        >>> from xdoctest.cache import read_json
+        >>> read_json('/does/not/exist.json', default={})
+        {}
+    """
+    try:
+        with open(fpath, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(fpath: str, data: typing.Any) -> None:
+    """
+    Atomically write a JSON file to the cache.
+
+    Args:
+        fpath (str): the file to write
+        data (Any): json-serializable data
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.cache import read_json, write_json
+        >>> with utils.TempDir() as temp:
+        ...     fpath = temp.dpath + '/sub/data.json'
+        ...     write_json(fpath, {'a': 1})
+        ...     assert read_json(fpath) == {'a': 1}
+    """
+    from xdoctest.utils import util_path
+
+    dpath = os.path.dirname(fpath)
+    if dpath:
+        util_path.ensuredir(dpath)
+    temp_fpath = '{}.{}.tmp'.format(fpath, os.getpid())
+    with open(temp_fpath, 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(temp_fpath, fpath)
+
+
+def _save_json(fpath: str, data: typing.Any) -> bool:
+    """
+    Like :func:`write_json`, but warn instead of failing the run if the
+    cache cannot be written.
+
+    Args:
+        fpath (str): the file to write
+        data (Any): json-serializable data
+
+    Returns:
+        bool: True if the file was written
+
+    Example:
+        >>> import warnings
+        >>> from xdoctest.cache import _save_json
+        >>> with warnings.catch_warnings(record=True) as warnlist:
+        ...     warnings.simplefilter('always')
+        ...     _save_json('/dev/null/cache/data.json', {})
+        False
+        >>> assert 'cannot write' in str(warnlist[0].message)
+    """
+    try:
+        write_json(fpath, data)
+    except OSError as ex:
+        warnings.warn('xdoctest cannot write {}: {}'.format(fpath, ex))
+        return False
+    return True
+
+
+class DurationHistory:
+    """
+    Exponentially weighted moving average of the duration of each doctest.
+
+    This is also an example hook for the native runner. It times each example
+    and updates its average, and :func:`save` writes the averages to the cache.
+
+    Attributes:
+        fpath (str): the JSON file the history is stored in
+        alpha (float): weight of a new measurement
+        entries (Dict[str, Dict]): maps the keys of doctests (see
+            :func:`xdoctest.sharding.shard_key`, which do not depend on where
+            the code is checked out) to the average duration (``ewma``), the
+            number of measurements (``n``), and the most recent duration
+            (``last``)
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.cache import DurationHistory
+        >>> with utils.TempDir() as temp:
+        ...     self = DurationHistory(temp.dpath, alpha=0.5)
+        ...     self.update('mod::slow:0', 4.0)
+        ...     self.update('mod::slow:0', 2.0)
+        ...     self.update('mod::fast:0', 0.1)
+        ...     self.save()
+        ...     other = DurationHistory(temp.dpath)
+        >>> other.estimate('mod::slow:0')
+        3.0
+        >>> print(other.estimate('mod::unknown:0'))
+        None
+    """
+
+    fname = 'durations.json'
+    # Version 1 keyed the entries on node ids, which contain the module path
+    version = 2
+
+    def __init__(self, dpath: str | None = None, alpha: float = 0.3) -> None:
+        """
+        Args:
+            dpath (str | None): the cache directory. Defaults to
+                :func:`default_cache_dpath`.
+            alpha (float): weight of a new measurement in the moving average
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError('alpha must be in (0, 1], got {}'.format(alpha))
+        if dpath is None:
+            dpath = default_cache_dpath()
+        self.fpath = os.path.join(dpath, self.fname)
+        self.alpha = alpha
+        self.entries: dict[str, dict[str, typing.Any]] = self._load()
+        self._updated: dict[str, dict[str, typing.Any]] = {}
+        self._tic: float | None = None
+
+    def _load(self) -> dict[str, dict[str, typing.Any]]:
+        data = read_json(self.fpath, default={})
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return {}
+        return dict(data.get('nodes', {}))
+
+    def estimate(self, key: str) -> float | None:
+        """
+        Args:
+            key (str): the key of a doctest
+
+        Returns:
+            float | None: the expected duration or None if never measured
+        """
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        return entry['ewma']
+
+    def update(self, key: str, seconds: float) -> None:
+        """
+        Add a measurement to the moving average of a doctest.
+
+        Args:
+            key (str): the key of a doctest
+            seconds (float): the measured duration
+        """
+        entry = self.entries.get(key, None)
+        if entry is None:
+            entry = {'ewma': seconds, 'n': 1, 'last': seconds}
+        else:
+            ewma = self.alpha * seconds + (1 - self.alpha) * entry['ewma']
+            entry = {'ewma': ewma, 'n': entry['n'] + 1, 'last': seconds}
+        self.entries[key] = entry
+        self._updated[key] = entry
+
+    def order(self, examples: list[DocTest]) -> list[DocTest]:
+        """
+        Sort doctests so the longest expected run first.
+
+        Doctests without a history are assumed to be slow and go first. Ties
+        keep their original order.
+
+        Args:
+            examples (List[DocTest]): the doctests to sort
+
+        Returns:
+            List[DocTest]
+
+        Example:
+            >>> from xdoctest.cache import DurationHistory
+            >>> from xdoctest.doctest_example import DocTest
+            >>> from xdoctest.sharding import shard_key
+            >>> self = DurationHistory('/does/not/exist')
+            >>> a, b, c = [DocTest('>>> pass', callname=n) for n in 'abc']
+            >>> self.update(shard_key(a), 1.0)
+            >>> self.update(shard_key(b), 5.0)
+            >>> [e.callname for e in self.order([a, b, c])]
+            ['c', 'b', 'a']
+        """
+        return sorted(examples, key=self._sortkey)
+
+    def _sortkey(self, example: DocTest) -> float:
+        from xdoctest.sharding import shard_key
+
+        seconds = self.estimate(shard_key(example))
+        return -float('inf') if seconds is None else -seconds
+
+    def save(self) -> None:
+        """
+        Write the averages updated by this process to the cache. Entries
+        written by other processes in the meantime are kept.
+        """
+        if not self._updated:
+            return
+        entries = self._load()
+        entries.update(self._updated)
+        data = {'version': self.version, 'nodes': entries}
+        if _save_json(self.fpath, data):
+            self._updated = {}
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        self.save()
+
+    def before_example(self, example: DocTest) -> None:
+        self._tic = time.perf_counter()
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        from xdoctest.sharding import shard_key
+
+        if self._tic is None or summary is None or summary['skipped']:
+            return
+        self.update(shard_key(example), time.perf_counter() - self._tic)
+        self._tic = None
+
+
+class FailureCache:
+    """
+    The set of doctests that failed the last time they were run.
+
+    This is also an example hook for the native runner. Doctests that fail
+    are added to the set and doctests that pass or are skipped are removed.
+    Doctests that are not run keep their state.
+
+    Attributes:
+        fpath (str): the JSON file the failures are stored in
+        failed (Set[str]): the keys (see :func:`xdoctest.sharding.shard_key`)
+            of the doctests that failed
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.cache import FailureCache
+        >>> from xdoctest.doctest_example import DocTest
+        >>> from xdoctest.sharding import shard_key
+        >>> a, b, c = [DocTest('>>> pass', callname=n) for n in 'abc']
+        >>> with utils.TempDir() as temp:
+        ...     self = FailureCache(temp.dpath)
+        ...     self.record(shard_key(a), failed=True)
+        ...     self.record(shard_key(b), failed=True)
+        ...     self.save()
+        ...     other = FailureCache(temp.dpath)
+        ...     other.record(shard_key(b), failed=False)
+        ...     other.save()
+        ...     self = FailureCache(temp.dpath)
+        >>> [e.callname for e in self.select([a, b, c])]
+        ['a']
+        >>> [e.callname for e in self.order([c, b, a])]
+        ['a', 'c', 'b']
+    """
+
+    fname = 'lastfailed.json'
+    # Version 1 keyed the failures on node ids, which contain the module path
+    version = 2
+
+    def __init__(self, dpath: str | None = None) -> None:
+        """
+        Args:
+            dpath (str | None): the cache directory. Defaults to
+                :func:`default_cache_dpath`.
+        """
+        if dpath is None:
+            dpath = default_cache_dpath()
+        self.fpath = os.path.join(dpath, self.fname)
+        self.failed: set[str] = self._load()
+        self._changes: dict[str, bool] = {}
+
+    def _load(self) -> set[str]:
+        data = read_json(self.fpath, default={})
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return set()
+        return set(data.get('failed', []))
+
+    def record(self, key: str, failed: bool) -> None:
+        """
+        Args:
+            key (str): the key of a doctest that was run
+            failed (bool): if the doctest failed
+        """
+        if failed:
+            self.failed.add(key)
+        else:
+            self.failed.discard(key)
+        self._changes[key] = failed
+
+    def select(self, examples: list[DocTest]) -> list[DocTest]:
+        """
+        Args:
+            examples (List[DocTest]): candidate doctests
+
+        Returns:
+            List[DocTest]: the doctests that failed last time
+        """
+        from xdoctest.sharding import shard_key
+
+        return [e for e in examples if shard_key(e) in self.failed]
+
+    def order(self, examples: list[DocTest]) -> list[DocTest]:
+        """
+        Args:
+            examples (List[DocTest]): doctests to sort
+
+        Returns:
+            List[DocTest]: the doctests that failed last time followed by
+                the others. Otherwise the order is kept.
+        """
+        from xdoctest.sharding import shard_key
+
+        return sorted(examples, key=lambda e: shard_key(e) not in self.failed)
+
+    def save(self) -> None:
+        """
+        Write the results of this process to the cache. Failures recorded by
+        other processes in the meantime are kept.
+        """
+        if not self._changes:
+            return
+        failed = self._load()
+        for key, flag in self._changes.items():
+            if flag:
+                failed.add(key)
+            else:
+                failed.discard(key)
+        data = {'version': self.version, 'failed': sorted(failed)}
+        if _save_json(self.fpath, data):
+            self._changes = {}
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        self.save()
+
+    def before_example(self, example: DocTest) -> None:
+        pass
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        from xdoctest.sharding import shard_key
+
+        failed = summary is None or bool(summary['failed'])
+        self.record(shard_key(example), failed)
+
+
+# Config keys that only change how results are displayed
+_PRESENTATION_CONFIG_KEYS = {
+    'colored',
+    'reportchoice',
+    'verbose',
+    'on_error',
+    'partnos',
+    'line_timing',
+}
+
+
+def _file_digest(fpath: str) -> str | None:
+    """
+    Args:
+        fpath (str): a file to hash
+
+    Returns:
+        str | None: the sha256 of the file or None if it cannot be read
+
+    Example:
+        >>> from xdoctest.cache import _file_digest
+        >>> print(_file_digest('/does/not/exist.py'))
+        None
+    """
+    import hashlib
+
+    try:
+        with open(fpath, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+# Matches ``import a.b as c, d`` and ``from ..a import (b, c)`` statements
+_IMPORT_PAT = re.compile(
+    r'(?:^|;)[ \t]*(?:'
+    r'from[ \t]+(?P<dots>\.*)(?P<module>[\w.]*)[ \t]+import[ \t]+'
+    r'(?P<names>\([^)]*\)|[^\n#;]*)'
+    r'|import[ \t]+(?P<imports>[^\n#;]*))',
+    flags=re.MULTILINE,
+)
+
+
+def _imported_modnames(
+    source: str, modname: str, is_package: bool = False
+) -> set[str]:
+    """
+    Statically find the modules a piece of code imports.
+
+    For ``from a import b`` both ``a`` and ``a.b`` are returned, because
+    ``b`` may be a submodule. Relative imports are resolved with respect to
+    ``modname``. This is a textual scan, which is much faster than parsing
+    the code, and may find extra names (e.g. in strings), which only makes
+    the fingerprint more conservative.
+
+    Args:
+        source (str): python source code
+        modname (str): the name of the module the code belongs to
+        is_package (bool): if the code is the ``__init__`` of ``modname``
+
+    Returns:
+        Set[str]: absolute module names
+
+    Example:
+        >>> from xdoctest.cache import _imported_modnames
+        >>> source = 'import os.path as p; from . import (core,\\n  checker)'
+        >>> sorted(_imported_modnames(source, 'xdoctest.runner'))
+        ['os.path', 'xdoctest', 'xdoctest.checker', 'xdoctest.core']
+        >>> source = 'from ..utils import util_path, util_misc as m'
+        >>> sorted(_imported_modnames(source, 'xdoctest.utils.util_str'))
+        ['xdoctest.utils', 'xdoctest.utils.util_misc', 'xdoctest.utils.util_path']
+    """
+    package_parts = (
+        modname.split('.') if is_package else modname.split('.')[:-1]
+    )
+    names: set[str] = set()
+    for match in _IMPORT_PAT.finditer(source):
+        if match.group('imports') is not None:
+            for item in match.group('imports').split(','):
+                name = item.split(' as ')[0].strip()
+                if name:
+                    names.add(name)
+            continue
+        level = len(match.group('dots'))
+        if level:
+            if level - 1 > len(package_parts):
+                continue
+            base_parts = package_parts[: len(package_parts) - level + 1]
+            if match.group('module'):
+                base_parts = base_parts + [match.group('module')]
+            base = '.'.join(base_parts)
+        else:
+            base = match.group('module')
+        if not base:
+            continue
+        names.add(base)
+        for item in match.group('names').strip('()').split(','):
+            name = item.split(' as ')[0].strip()
+            if name and name != '*':
+                names.add(base + '.' + name)
+    return names
+
+
+class ResultCache:
+    """
+    Remembers the fingerprints of doctests that passed, so an unchanged
+    doctest does not need to run again.
+
+    The fingerprint of a doctest is a hash of its source, the source of its
+    module, the source of the first-party modules its module and its code
+    import (transitively), the configuration that affects its outcome, and
+    the versions of xdoctest and Python. First-party modules are those in
+    the same top-level package, or for a module outside of a package, the
+    modules next to it. Imports are found statically, so changes to data
+    files or to dynamically imported modules are not detected. Use
+    ``--no-cache`` to run everything.
+
+    This is also an example hook for the native runner. A doctest that
+    passes stores its fingerprint and any other outcome removes it.
+
+    Attributes:
+        fpath (str): the JSON file the fingerprints are stored in
+        passed (Dict[str, str]): maps the keys of doctests (see
+            :func:`xdoctest.sharding.shard_key`) to the fingerprint they had
+            when they last passed
+        n_hits (int): number of doctests found in the cache
+        n_misses (int): number of doctests that were not
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.cache import ResultCache
+        >>> from xdoctest.doctest_example import DocTest
+        >>> a, b = [DocTest('>>> pass', callname=n) for n in 'ab']
+        >>> with utils.TempDir() as temp:
+        ...     self = ResultCache(temp.dpath)
+        ...     self.record(a, passed=True)
+        ...     self.save()
+        ...     other = ResultCache(temp.dpath)
+        ...     a.config['global_exec'] = 'import math'
+        ...     cached = other.partition([a, b])
+        >>> [e.callname for e in cached[0]], [e.callname for e in cached[1]]
+        ([], ['a', 'b'])
+        >>> a.config['global_exec'] = None
+        >>> cached, uncached = other.partition([a, b])
+        >>> [e.callname for e in cached], [e.callname for e in uncached]
+        (['a'], ['b'])
+        >>> other.stats()
+        {'hits': 1, 'misses': 3, 'hit_rate': 0.25}
+    """
+
+    fname = 'results.json'
+    # Version 1 keyed the results on node ids, which contain the module path
+    version = 2
+
+    def __init__(self, dpath: str | None = None) -> None:
+        """
+        Args:
+            dpath (str | None): the cache directory. Defaults to
+                :func:`default_cache_dpath`.
+        """
+        if dpath is None:
+            dpath = default_cache_dpath()
+        self.fpath = os.path.join(dpath, self.fname)
+        self.passed: dict[str, str] = self._load()
+        self.n_hits = 0
+        self.n_misses = 0
+        self._changes: dict[str, str | None] = {}
+        # maps module paths to their digest and the names they import
+        self._module_info: dict[str, tuple[str | None, set[str]]] = {}
+        self._closures: dict[tuple, dict[str, str | None]] = {}
+        self._fingerprints: dict[str, str] = {}
+
+    def _load(self) -> dict[str, str]:
+        data = read_json(self.fpath, default={})
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return {}
+        return dict(data.get('passed', {}))
+
+    def _module(self, modpath: str) -> tuple[str | None, set[str]]:
+        """
+        Returns the digest of a module and the modules it imports.
+        """
+        info = self._module_info.get(modpath, None)
+        if info is None:
+            from xdoctest import static_analysis as static
+
+            digest = _file_digest(modpath)
+            imports: set[str] = set()
+            if digest is not None and modpath.endswith('.py'):
+                modname = static.modpath_to_modname(modpath, check=False)
+                is_package = os.path.basename(modpath) == '__init__.py'
+                with open(modpath, 'r', encoding='utf8') as file:
+                    source = file.read()
+                imports = _imported_modnames(source, modname, is_package)
+            info = (digest, imports)
+            self._module_info[modpath] = info
+        return info
+
+    def _dependencies(self, example: DocTest) -> list[tuple[str, str | None]]:
+        """
+        Returns the names and digests of the first-party modules a doctest
+        depends on.
+        """
+        from xdoctest import static_analysis as static
+
+        modpath = os.fspath(example.modpath)
+        if not os.path.isfile(modpath):
+            return []
+        root, relpath = static.split_modpath(modpath, check=False)
+        modname = example.modname
+        # Outside of a package only the neighbors of the module are
+        # first-party, otherwise only the modules of the same package
+        top_level = None
+        if os.sep in relpath or (os.altsep and os.altsep in relpath):
+            top_level = modname.split('.')[0]
+
+        example._parse()
+        assert example._parts is not None
+        code = '\n'.join(part.source for part in example._parts)
+        found: dict[str, str | None] = {}
+        for name in _imported_modnames(code, modname) | {modname}:
+            found.update(self._closure(root, name, top_level))
+        return sorted(found.items())
+
+    def _closure(
+        self, root: str, modname: str, top_level: str | None
+    ) -> dict[str, str | None]:
+        """
+        Returns the digests of a first-party module and of the first-party
+        modules it transitively imports.
+        """
+        from xdoctest.utils import util_import
+
+        key = (root, modname, top_level)
+        found = self._closures.get(key, None)
+        if found is not None:
+            return found
+        found = {}
+        todo = [modname]
+        seen: set[str] = set()
+        while todo:
+            name = todo.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            if top_level is not None and name.split('.')[0] != top_level:
+                continue
+            dep_path = util_import.modname_to_modpath(
+                name, hide_init=False, sys_path=[root]
+            )
+            if dep_path is None:
+                continue
+            digest, imports = self._module(os.fspath(dep_path))
+            found[name] = digest
+            todo.extend(imports - seen)
+        self._closures[key] = found
+        return found
+
+    def fingerprint(self, example: DocTest) -> str:
+        """
+        Args:
+            example (DocTest): a doctest
+
+        Returns:
+            str: a hash of everything the outcome of the doctest depends on
+        """
+        import hashlib
+        import sys
+
+        import xdoctest
+        from xdoctest.sharding import shard_key
+
+        config = {
+            key: value
+            for key, value in example.config.items()
+            if key not in _PRESENTATION_CONFIG_KEYS
+        }
+        data = {
+            'xdoctest': xdoctest.__version__,
+            'python': sys.version,
+            'key': shard_key(example),
+            'docsrc': example.docsrc,
+            'config': config,
+            'modules': self._dependencies(example),
+        }
+        text = json.dumps(data, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+    def partition(
+        self, examples: list[DocTest]
+    ) -> tuple[list[DocTest], list[DocTest]]:
+        """
+        Split doctests into those that passed before with the same
+        fingerprint and those that need to run.
+
+        Args:
+            examples (List[DocTest]): candidate doctests
+
+        Returns:
+            Tuple[List[DocTest], List[DocTest]]: the cached and uncached
+                doctests in their original order
+        """
+        from xdoctest.sharding import shard_key
+
+        cached = []
+        uncached = []
+        for example in examples:
+            key = shard_key(example)
+            fingerprint = self.fingerprint(example)
+            self._fingerprints[key] = fingerprint
+            if self.passed.get(key, None) == fingerprint:
+                cached.append(example)
+            else:
+                uncached.append(example)
+        self.n_hits += len(cached)
+        self.n_misses += len(uncached)
+        return cached, uncached
+
+    def record(self, example: DocTest, passed: bool) -> None:
+        """
+        Args:
+            example (DocTest): a doctest that was run
+            passed (bool): if the doctest passed and was not skipped
+        """
+        from xdoctest.sharding import shard_key
+
+        key = shard_key(example)
+        if passed:
+            fingerprint = self._fingerprints.get(key, None)
+            if fingerprint is None:
+                fingerprint = self.fingerprint(example)
+            self.passed[key] = fingerprint
+        else:
+            self.passed.pop(key, None)
+        self._changes[key] = self.passed.get(key, None)
+
+    def stats(self) -> dict[str, typing.Any]:
+        """
+        Returns:
+            Dict[str, Any]: the number of ``hits`` and ``misses`` and the
+                ``hit_rate``
+        """
+        n_total = self.n_hits + self.n_misses
+        return {
+            'hits': self.n_hits,
+            'misses': self.n_misses,
+            'hit_rate': self.n_hits / n_total if n_total else 0.0,
+        }
+
+    def save(self) -> None:
+        """
+        Write the results of this process to the cache. Results recorded by
+        other processes in the meantime are kept.
+        """
+        if not self._changes:
+            return
+        passed = self._load()
+        for key, fingerprint in self._changes.items():
+            if fingerprint is None:
+                passed.pop(key, None)
+            else:
+                passed[key] = fingerprint
+        if _save_json(self.fpath, {'version': self.version, 'passed': passed}):
+            self._changes = {}
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        self.save()
+
+    def before_example(self, example: DocTest) -> None:
+        pass
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        passed = (
+            summary is not None
+            and bool(summary['passed'])
+            and not summary['skipped']
+        )
+        self.record(example, passed)
+
+
+class ProgressReporter:
+    """
+    Prints a progress line with an estimate of the remaining time before
+    each doctest is run.
+
+    Doctests that were never measured are assumed to take as long as the
+    average measured doctest.
+
+    Example:
+        >>> from xdoctest.cache import DurationHistory, ProgressReporter
+        >>> from xdoctest.doctest_example import DocTest
+        >>> from xdoctest.sharding import shard_key
+        >>> history = DurationHistory('/does/not/exist')
+        >>> a, b = [DocTest('>>> pass', callname=n) for n in 'ab']
+        >>> history.update(shard_key(a), 2.0)
+        >>> history.update(shard_key(b), 1.0)
+        >>> self = ProgressReporter([a, b], history, print)
+        >>> self.start()
+        >>> self.before_example(a)
+        [1/2] 0% done, elapsed 0.0s, ETA 3.0s: ...::a:0
+    """
+
+    def __init__(
+        self,
+        examples: list[DocTest],
+        history: DurationHistory,
+        log: typing.Callable[[str], typing.Any],
+    ) -> None:
+        """
+        Args:
+            examples (List[DocTest]): all doctests in the order they run
+            history (DurationHistory): source of the estimates
+            log (Callable): function that writes the progress line
+        """
+        from xdoctest.sharding import shard_key
+
+        self.log = log
+        known = [history.estimate(shard_key(e)) for e in examples]
+        measured = [s for s in known if s is not None]
+        default = sum(measured) / len(measured) if measured else 0.0
+        self._estimates = {
+            example: default if seconds is None else seconds
+            for example, seconds in zip(examples, known)
+        }
+        self._n_total = len(examples)
+        self._index = 0
+        self._remaining = sum(self._estimates.values())
+        self._start: float | None = None
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+
+    def finish(self) -> None:
+        pass
+
+    def before_example(self, example: DocTest) -> None:
+        """
+        Args:
+            example (DocTest): the doctest about to run
+        """
+        if self._start is None:
+            self.start()
+        assert self._start is not None
+        self._index += 1
+        elapsed = time.perf_counter() - self._start
+        total = elapsed + self._remaining
+        percent = 100 * elapsed / total if total > 0 else 0
+        self.log(
+            '[{}/{}] {:.0f}% done, elapsed {:.1f}s, ETA {:.1f}s: {}'.format(
+                self._index,
+                self._n_total,
+                percent,
+                elapsed,
+                self._remaining,
+                example.node,
+            )
+        )
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        self._remaining = max(
+            self._remaining - self._estimates.get(example, 0.0), 0.0
+        )
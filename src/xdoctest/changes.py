@@ -0,0 +1,330 @@
+"""
+Select the doctests that changed since a git revision.
+
+In pre-commit hooks and pull request CI it is usually enough to run the
+doctests that were edited. ``--changed-since REV`` asks the local git
+checkout which lines differ between ``REV`` and the working tree (including
+uncommitted and untracked files) and only runs the doctests whose lines
+overlap a changed hunk. Modules without changes are skipped before they are
+parsed, so the cost of a run scales with the size of the change.
+
+Only the text of the doctests is considered. A change to the code that a
+doctest calls does not select it.
+
+CommandLine:
+    xdoctest -m xdoctest all --changed-since main
+    xdoctest -m xdoctest all --changed-since HEAD~3
+    pytest --xdoctest --xdoctest-changed-since main
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+# Matches a hunk header: ``@@ -start,count +start,count @@``
+_HUNK_PAT = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# The single character escapes in paths quoted by git
+_PATH_ESCAPES = {
+    'a': 7,
+    'b': 8,
+    't': 9,
+    'n': 10,
+    'v': 11,
+    'f': 12,
+    'r': 13,
+    '"': 34,
+    '\\': 92,
+}
+
+
+def _git(args: list[str], cwd: str | None = None) -> str:
+    """
+    Run a git command and return its output.
+
+    Raises:
+        RuntimeError: if git is unavailable or the command fails
+    """
+    try:
+        info = subprocess.run(
+            ['git'] + args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+    except OSError as ex:
+        raise RuntimeError('Unable to run git: {}'.format(ex))
+    if info.returncode != 0:
+        raise RuntimeError(
+            'git {} failed: {}'.format(' '.join(args), info.stderr.strip())
+        )
+    return info.stdout
+
+
+def _unquote_path(path: str) -> str:
+    """
+    Undo the C-style quoting git applies to unusual paths in a diff.
+
+    Args:
+        path (str): a path from a file header of a diff
+
+    Returns:
+        str: the path without quotes and escapes
+
+    Example:
+        >>> from xdoctest.changes import _unquote_path
+        >>> _unquote_path('"b/caf\\\\303\\\\251.py"')
+        'b/café.py'
+        >>> _unquote_path('"b/say \\\\"hi\\\\"\\\\t.py"')
+        'b/say "hi"\\t.py'
+        >>> _unquote_path('b/plain.py')
+        'b/plain.py'
+    """
+    if len(path) < 2 or not (path.startswith('"') and path.endswith('"')):
+        return path
+    body = path[1:-1]
+    data = bytearray()
+    index = 0
+    while index < len(body):
+        char = body[index]
+        if char == '\\' and index + 1 < len(body):
+            escaped = body[index + 1]
+            if escaped in '01234567':
+                # An octal escape encodes one byte of a UTF-8 sequence
+                data.append(int(body[index + 1 : index + 4], 8))
+                index += 4
+            else:
+                data.append(_PATH_ESCAPES.get(escaped, ord(escaped)))
+                index += 2
+        else:
+            data.extend(char.encode('utf-8'))
+            index += 1
+    return data.decode('utf-8', errors='surrogateescape')
+
+
+def parse_unified_diff(
+    text: str, root: str = '', side: str = 'new'
+) -> dict[str, list[tuple[int, int]]]:
+    """
+    Find the changed lines of the new (or old) files in a unified diff.
+
+    A hunk that only removes (or on the old side, only adds) lines marks the
+    lines on both sides of the gap as changed. Paths that git quoted are
+    unquoted.
+
+    Args:
+        text (str): the output of ``git diff --unified=0``
+        root (str): the directory the paths in the diff are relative to
+        side (str): ``'new'`` for line numbers of the changed files or
+            ``'old'`` for line numbers of the files they replace
+
+    Returns:
+        Dict[str, List[Tuple[int, int]]]: maps the path of each changed file
+            to inclusive ranges of changed line numbers
+
+    Example:
+        >>> from xdoctest.changes import parse_unified_diff
+        >>> from xdoctest import utils
+        >>> text = utils.codeblock(
+        ...     '''
+        ...     diff --git a/pkg/mod.py b/pkg/mod.py
+        ...     --- a/pkg/mod.py
+        ...     +++ b/pkg/mod.py
+        ...     @@ -3 +3,2 @@ def func():
+        ...     @@ -10,2 +11,0 @@ def other():
+        ...     diff --git a/gone.py b/gone.py
+        ...     --- a/gone.py
+        ...     +++ /dev/null
+        ...     @@ -1 +0,0 @@
+        ...     ''')
+        >>> parse_unified_diff(text)
+        {'pkg/mod.py': [(3, 4), (11, 12)]}
+        >>> parse_unified_diff(text, side='old')
+        {'pkg/mod.py': [(3, 3), (10, 11)], 'gone.py': [(1, 1)]}
+        >>> # Paths with spaces end in a tab and unusual paths are quoted
+        >>> text = utils.codeblock(
+        ...     '''
+        ...     diff --git a/a b.py b/a b.py
+        ...     --- a/a b.py\t
+        ...     +++ b/a b.py\t
+        ...     @@ -1 +1 @@
+        ...     diff --git "a/caf\\\\303\\\\251.py" "b/caf\\\\303\\\\251.py"
+        ...     --- "a/caf\\\\303\\\\251.py"
+        ...     +++ "b/caf\\\\303\\\\251.py"
+        ...     @@ -2 +2 @@
+        ...     ''')
+        >>> parse_unified_diff(text)
+        {'a b.py': [(1, 1)], 'café.py': [(2, 2)]}
+    """
+    if side not in {'old', 'new'}:
+        raise KeyError(side)
+    header, prefix, group = (
+        ('--- ', 'a/', 1) if side == 'old' else ('+++ ', 'b/', 3)
+    )
+    ranges: dict[str, list[tuple[int, int]]] = {}
+    current: list[tuple[int, int]] | None = None
+    # File headers are only expected between "diff" lines and the first hunk
+    in_header = False
+    for line in text.splitlines():
+        if line.startswith('diff '):
+            in_header = True
+            current = None
+        elif in_header and line.startswith(header):
+            target = _unquote_path(line[4:].rstrip('\t'))
+            if target != '/dev/null':
+                if target.startswith(prefix):
+                    target = target[2:]
+                current = ranges.setdefault(os.path.join(root, target), [])
+        elif line.startswith('@@'):
+            in_header = False
+            match = _HUNK_PAT.match(line)
+            if match is None or current is None:
+                continue
+            start = int(match.group(group))
+            count = match.group(group + 1)
+            count = 1 if count is None else int(count)
+            if count == 0:
+                # Lines were removed (or added) after ``start``
+                current.append((start, start + 1))
+            else:
+                current.append((start, start + count - 1))
+    return ranges
+
+
+class ChangeSet:
+    """
+    The lines that changed in a set of files.
+
+    Attributes:
+        ranges (Dict[str, List[Tuple[int, int]] | None]): maps normalized
+            file paths to inclusive ranges of changed lines, or None if the
+            entire file is new
+
+    Example:
+        >>> from xdoctest.changes import ChangeSet
+        >>> from xdoctest.doctest_example import DocTest
+        >>> self = ChangeSet({'mod.py': [(10, 12)], 'new.py': None})
+        >>> 'mod.py' in self, 'other.py' in self
+        (True, False)
+        >>> self.overlaps('mod.py', 1, 9), self.overlaps('mod.py', 12, 20)
+        (False, True)
+        >>> self.overlaps('new.py', 1, 2)
+        True
+        >>> a = DocTest('>>> x = 1\\n>>> y = 2', fpath='mod.py', lineno=9)
+        >>> b = DocTest('>>> x = 1', fpath='mod.py', lineno=20)
+        >>> [e.lineno for e in self.select([a, b])]
+        [9]
+    """
+
+    def __init__(self, ranges: dict[str, list[tuple[int, int]] | None]) -> None:
+        """
+        Args:
+            ranges (Dict[str, List[Tuple[int, int]] | None]): maps file
+                paths to inclusive ranges of changed lines, or None if the
+                entire file changed
+        """
+        self.ranges = {
+            self._normalize(fpath): spans for fpath, spans in ranges.items()
+        }
+
+    @staticmethod
+    def _normalize(fpath: str | os.PathLike) -> str:
+        return os.path.normcase(os.path.realpath(os.fspath(fpath)))
+
+    @classmethod
+    def from_git(
+        cls, rev: str, cwd: str | None = None, side: str = 'new'
+    ) -> ChangeSet:
+        """
+        Find the lines that differ between a revision and the working tree.
+
+        Args:
+            rev (str): a git revision, e.g. ``main`` or ``HEAD~1``
+            cwd (str | None): a directory inside the git checkout
+            side (str): ``'new'`` for the line numbers in the working tree,
+                including untracked files, or ``'old'`` for the line numbers
+                at the revision
+
+        Returns:
+            ChangeSet
+
+        Raises:
+            RuntimeError: if git is unavailable or the revision is unknown
+        """
+        root = _git(['rev-parse', '--show-toplevel'], cwd=cwd).strip()
+        diff_text = _git(
+            [
+                # Print non-ASCII paths verbatim instead of as octal escapes
+                '-c',
+                'core.quotePath=false',
+                'diff',
+                '--unified=0',
+                '--no-color',
+                '--no-ext-diff',
+                '--no-renames',
+                rev,
+                '--',
+            ],
+            cwd=root,
+        )
+        ranges: dict[str, list[tuple[int, int]] | None] = {}
+        ranges.update(parse_unified_diff(diff_text, root, side=side))
+        if side == 'new':
+            untracked = _git(
+                ['ls-files', '--others', '--exclude-standard', '-z'], cwd=root
+            )
+            for relpath in untracked.split('\0'):
+                if relpath:
+                    ranges[os.path.join(root, relpath)] = None
+        return cls(ranges)
+
+    def __contains__(self, fpath: str | os.PathLike) -> bool:
+        """
+        Args:
+            fpath (str | PathLike): a file
+
+        Returns:
+            bool: if any line of the file changed
+        """
+        return self._normalize(fpath) in self.ranges
+
+    def overlaps(self, fpath: str | os.PathLike, start: int, end: int) -> bool:
+        """
+        Args:
+            fpath (str | PathLike): a file
+            start (int): the first line of a region of the file
+            end (int): the last line of the region
+
+        Returns:
+            bool: if a changed line is inside the region
+        """
+        key = self._normalize(fpath)
+        if key not in self.ranges:
+            return False
+        spans = self.ranges[key]
+        if spans is None:
+            return True
+        return any(lo <= end and start <= hi for lo, hi in spans)
+
+    def select(self, examples: typing.Iterable[DocTest]) -> list[DocTest]:
+        """
+        Args:
+            examples (Iterable[DocTest]): candidate doctests
+
+        Returns:
+            List[DocTest]: the doctests with a changed line
+        """
+        selected = []
+        for example in examples:
+            start = example.lineno
+            end = start + max(len(example.docsrc.splitlines()) - 1, 0)
+            if self.overlaps(example.fpath, start, end):
+                selected.append(example)
+        return selected
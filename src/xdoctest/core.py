@@ -39,11 +39,16 @@ from xdoctest import (
     global_state,
     parser,
     static_analysis,
+    timing,
     utils,
 )
 from xdoctest.docstr import docscrape_google
 from xdoctest.utils import util_import
 
+if typing.TYPE_CHECKING:
+    from xdoctest.changes import ChangeSet
+    from xdoctest.selection import Selector
+
 DOCTEST_STYLES = [
     'freeform',
     'google',
@@ -522,6 +527,8 @@ def package_calldefs(
     exclude: list[str] = [],
     ignore_syntax_errors: bool = True,
     analysis: str = 'auto',
+    changes: ChangeSet | None = None,
+    selector: Selector | None = None,
 ) -> typing.Iterator[tuple[dict[str, static_analysis.CallDefNode], typing.Any]]:
     """
     Statically generates all callable definitions in a module or package
@@ -542,6 +549,13 @@ def package_calldefs(
             extensions, but static analysis elsewhere, if 'dynamic', then
             dynamic analysis is used to parse all calldefs. Defaults to 'auto'.
 
+        changes (ChangeSet | None):
+            if specified, modules without changed lines are skipped
+
+        selector (Selector | None):
+            if specified, only the calldefs whose callname it matches are
+            yielded, and modules without such calldefs are skipped
+
     Yields:
         Tuple[Dict[str, xdoctest.static_analysis.CallDefNode], str | ModuleType] -
             * item[0]: the mapping of callnames-to-calldefs
@@ -555,6 +569,14 @@ def package_calldefs(
         >>> calldefs, modpath = testables[0]
         >>> assert util_import.modpath_to_modname(modpath) == pkg_identifier
         >>> assert 'package_calldefs' in calldefs
+
+    Example:
+        >>> from xdoctest.selection import Selector
+        >>> selector = Selector('package_*')
+        >>> testables = list(package_calldefs('xdoctest', selector=selector))
+        >>> sorted((util_import.modpath_to_modname(modpath), list(calldefs))
+        ...        for calldefs, modpath in testables)
+        [('xdoctest.core', ['package_calldefs']), ('xdoctest.static_analysis', ['package_modpaths'])]
     """
     if global_state.DEBUG_CORE:  # nocover
         print(
@@ -569,10 +591,11 @@ def package_calldefs(
         identifiers = [pkg_identifier]
     else:
         pkgpath = _rectify_to_modpath(pkg_identifier)
-        _ideniter = static_analysis.package_modpaths(
-            pkgpath, with_pkg=True, with_libs=True
-        )
-        identifiers = list(_ideniter)
+        with timing.span('discover', pkgpath):
+            _ideniter = static_analysis.package_modpaths(
+                pkgpath, with_pkg=True, with_libs=True
+            )
+            identifiers = list(_ideniter)
 
     for module_identifier in identifiers:
         if isinstance(module_identifier, str):
@@ -580,6 +603,8 @@ def package_calldefs(
             modname = util_import.modpath_to_modname(modpath)
             if any(fnmatch(modname, pat) for pat in exclude):
                 continue
+            if changes is not None and modpath not in changes:
+                continue
             if not exists(modpath):
                 warnings.warn(
                     'Module {} does not exist. Is it an old pyc file?'.format(
@@ -588,7 +613,18 @@ def package_calldefs(
                 )
                 continue
         try:
-            calldefs = parse_calldefs(module_identifier, analysis=analysis)
+            with timing.span('calldefs', module_identifier):
+                calldefs = parse_calldefs(module_identifier, analysis=analysis)
+            if calldefs is not None and selector is not None:
+                if isinstance(module_identifier, types.ModuleType):
+                    modname = module_identifier.__name__
+                calldefs = {
+                    callname: calldef
+                    for callname, calldef in calldefs.items()
+                    if selector.match_callname(callname, modname)
+                }
+                if not calldefs:
+                    continue
             if calldefs is not None:
                 yield calldefs, module_identifier
         except SyntaxError as ex:
@@ -688,6 +724,8 @@ def parse_doctestables(
     ignore_syntax_errors: bool = True,
     parser_kw: dict = {},
     analysis: str = 'auto',
+    changes: ChangeSet | None = None,
+    selector: Selector | None = None,
 ) -> typing.Iterator[doctest_example.DocTest]:
     """
     Parses all doctests within top-level callables of a module and generates
@@ -712,6 +750,14 @@ def parse_doctestables(
             extensions, but static analysis elsewhere, if 'dynamic', then
             dynamic analysis is used to parse all calldefs.
 
+        changes (ChangeSet | None):
+            if specified, only the doctests that overlap a changed line are
+            generated. Unchanged modules and docstrings are not parsed.
+
+        selector (Selector | None):
+            if specified, only the doctests it matches are generated. The
+            docstrings of callables whose name does not match are not parsed.
+
     Yields:
         xdoctest.doctest_example.DocTest : parsed doctest example objects
 
@@ -754,14 +800,26 @@ def parse_doctestables(
 
     # Statically parse modules and their doctestable callables in a package
     assert module_identifier is not None
+    if changes is not None and isinstance(module_identifier, types.ModuleType):
+        raise ValueError('Selecting changed doctests requires a module path')
     for calldefs, modpath in package_calldefs(
-        module_identifier, exclude, ignore_syntax_errors, analysis=analysis
+        module_identifier,
+        exclude,
+        ignore_syntax_errors,
+        analysis=analysis,
+        changes=changes,
+        selector=selector,
     ):
         for callname, calldef in calldefs.items():
             docstr = calldef.docstr
             if docstr is not None:
                 lineno = calldef.doclineno
                 assert isinstance(lineno, int)
+                if changes is not None and calldef.doclineno_end is not None:
+                    if not changes.overlaps(
+                        modpath, lineno, calldef.doclineno_end
+                    ):
+                        continue
                 example_gen = parse_docstr_examples(
                     docstr,
                     callname=callname,
@@ -770,6 +828,10 @@ def parse_doctestables(
                     style=style,
                     parser_kw=parser_kw,
                 )
+                if changes is not None:
+                    example_gen = iter(changes.select(example_gen))
+                if selector is not None:
+                    example_gen = filter(selector.match, example_gen)
                 if global_state.DEBUG_CORE:  # nocover
                     for example in example_gen:
                         print(' * Yield example={}'.format(example))
@@ -0,0 +1,550 @@
+"""
+Measure the line and branch coverage of first-party code while doctests run.
+
+Running doctests under a :func:`sys.settrace` based coverage tool makes them
+several times slower, and such tools do not know that the synthetic
+``<doctest:...>`` file names of doctest parts (see
+:func:`xdoctest.doctest_example.DocTest._partfilename_for`) belong to a
+docstring. With ``--coverage PATH`` the native runner records coverage with
+:mod:`sys.monitoring` on Python 3.12+ (see :mod:`xdoctest.monitoring`).
+Every location reports once and is then disabled, so the overhead of a line
+that runs in a loop is paid only once. Older versions fall back to
+:func:`sys.settrace` and only measure lines.
+
+The lines of doctest parts are attributed to the lines of the docstring they
+came from, so docstrings appear as covered (or missed) code in the report.
+
+The report is written in the lcov tracefile format, which is understood by
+genhtml, codecov, and most editors, or if ``PATH`` ends with ``.json``, in a
+format modeled on the JSON report of coverage.py. Hit counts are 0 or 1
+because locations are disabled after their first hit.
+
+First-party files are the files inside the package (or for a single module,
+the directory) under test.
+
+CommandLine:
+    xdoctest -m xdoctest all --coverage coverage.lcov
+    xdoctest -m xdoctest all --coverage coverage.json
+    genhtml coverage.lcov -o htmlcov
+"""
+
+from __future__ import annotations
+
+import ast
+import dis
+import json
+import os
+import sys
+import typing
+import warnings
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+    from xdoctest.monitoring import LineRecorder
+
+# A branch point is (code key, offset, line, fallthrough offset, line when
+# falling through, line when jumping). Lines of -1 mean the code exits.
+_BranchPoint = typing.Tuple[typing.Tuple[str, int], int, int, int, int, int]
+
+
+def _iter_code(code: typing.Any) -> typing.Iterator[typing.Any]:
+    """
+    Yield a code object and all code objects nested in it.
+    """
+    stack = [code]
+    while stack:
+        code = stack.pop()
+        yield code
+        stack.extend(c for c in code.co_consts if hasattr(c, 'co_code'))
+
+
+def _code_key(code: typing.Any) -> tuple[str, int]:
+    # Identifies a code object in a fresh compile of the same source
+    return (getattr(code, 'co_qualname', code.co_name), code.co_firstlineno)
+
+
+def _analyze(code: typing.Any) -> tuple[set[int], list[_BranchPoint]]:
+    """
+    Find the lines that start statements and the conditional branches of a
+    compiled module.
+
+    Args:
+        code (CodeType): the code of a module
+
+    Returns:
+        Tuple[Set[int], List[Tuple]]: the executable lines and the branch
+            points
+
+    Example:
+        >>> from xdoctest.coverage import _analyze
+        >>> from xdoctest import utils
+        >>> source = utils.codeblock(
+        ...     '''
+        ...     def func(x):
+        ...         if x:
+        ...             return 1
+        ...         return 2
+        ...     ''')
+        >>> lines, branches = _analyze(compile(source, 'mod.py', 'exec'))
+        >>> sorted(lines)
+        [1, 2, 3, 4]
+        >>> import sys
+        >>> if sys.version_info[0:2] >= (3, 12):
+        ...     key, offset, line, _, fall_line, jump_line = branches[0]
+        ...     assert key == ('func', 1) and line == 2
+        ...     assert {fall_line, jump_line} == {3, 4}
+    """
+    lines: set[int] = set()
+    branches: list[_BranchPoint] = []
+    for sub in _iter_code(code):
+        lines.update(lineno for _, lineno in dis.findlinestarts(sub) if lineno)
+        if sys.version_info[0:2] < (3, 12):
+            continue
+        key = _code_key(sub)
+        instrs = list(dis.get_instructions(sub))
+        offset_to_index = {
+            instr.offset: idx for idx, instr in enumerate(instrs)
+        }
+
+        def line_at(index: int) -> int:
+            if index >= len(instrs):
+                return -1
+            lineno = instrs[index].positions.lineno
+            return -1 if lineno is None else lineno
+
+        for idx, instr in enumerate(instrs):
+            is_branch = instr.opname == 'FOR_ITER' or instr.opname.startswith(
+                'POP_JUMP_IF'
+            )
+            if not is_branch or instr.positions.lineno is None:
+                continue
+            jump_index = offset_to_index.get(instr.argval, len(instrs))
+            if instr.opname == 'FOR_ITER':
+                # An exhausted iterator skips over the END_FOR instruction
+                jump_index += 1
+            fall_offset = (
+                instrs[idx + 1].offset if idx + 1 < len(instrs) else -1
+            )
+            branches.append(
+                (
+                    key,
+                    instr.offset,
+                    instr.positions.lineno,
+                    fall_offset,
+                    line_at(idx + 1),
+                    line_at(jump_index),
+                )
+            )
+    return lines, branches
+
+
+def _compile_file(fpath: str) -> typing.Any:
+    """
+    Returns:
+        CodeType | None: the code of a source file, or None if it cannot be
+            read or compiled
+    """
+    try:
+        with open(fpath, 'rb') as file:
+            source = file.read()
+        return compile(source, fpath, 'exec', dont_inherit=True)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+class DoctestCoverage:
+    """
+    An example hook for the native runner that measures coverage of the
+    first-party code executed by doctests.
+
+    Attributes:
+        include_dpath (str): the measured directory
+        statements (Dict[str, Set[int]]): executable lines of doctest parts
+            in the files that contain their docstring
+        executed (Dict[str, Set[int]]): executed lines of doctest parts in
+            the files that contain their docstring
+        arcs (Dict[str, Set[Tuple]]): the taken branches in each file, as
+            (code key, offset, destination offset), numbered as in the
+            compiled file or doctest part
+
+    Example:
+        >>> from xdoctest.coverage import DoctestCoverage
+        >>> from xdoctest.doctest_example import DocTest
+        >>> from xdoctest import utils
+        >>> from os.path import join
+        >>> import xdoctest
+        >>> dpath = utils.TempDir().ensure()
+        >>> fpath = join(dpath, 'mod.py')
+        >>> example = DocTest(utils.codeblock(
+        ...     '''
+        ...     >>> x = 0
+        ...     >>> for i in range(3):
+        ...     ...     x += i
+        ...     >>> if x > 100:
+        ...     ...     print('big')
+        ...     '''), fpath=fpath, lineno=10)
+        >>> self = DoctestCoverage(dpath)
+        >>> self.start()
+        >>> self.before_example(example)
+        >>> summary = example.run(verbose=0)
+        >>> self.after_example(example, summary)
+        >>> self.finish()
+        >>> report = self.report()
+        >>> file_report = report[fpath]
+        >>> if self.recorder_backend is not None:
+        ...     assert sorted(file_report['statements']) == [10, 11, 12, 13, 14]
+        ...     assert sorted(file_report['executed']) == [10, 11, 12, 13]
+        >>> if self.recorder_backend == 'monitoring':
+        ...     # Both directions of the loop, but not the print
+        ...     assert len(file_report['branches']) == 2
+        ...     assert self.totals(report)['n_branches_taken'] == 3
+    """
+
+    def __init__(self, include_dpath: str) -> None:
+        """
+        Args:
+            include_dpath (str): only the files in this directory (and the
+                doctests that run) are measured
+        """
+        self.include_dpath = os.path.realpath(include_dpath)
+        self._include_prefix = self.include_dpath + os.sep
+        self.recorder: LineRecorder | None = None
+        self.recorder_backend: str | None = None
+        self.statements: dict[str, set[int]] = {}
+        self.executed: dict[str, set[int]] = {}
+        self.arcs: dict[str, set[tuple[tuple[str, int], int, int]]] = {}
+        # Maps part file names to the file and line offset of their docstring
+        self._part_origins: dict[str, tuple[str, int]] = {}
+        # The statements and branch points of each part file name
+        self._part_analysis: dict[str, tuple[set[int], list[_BranchPoint]]] = {}
+
+    def _include(self, fpath: str) -> bool:
+        if fpath.startswith('<'):
+            return fpath.startswith('<doctest:')
+        return os.path.realpath(fpath).startswith(self._include_prefix)
+
+    def start(self) -> None:
+        from xdoctest.monitoring import LineRecorder
+
+        self.recorder = LineRecorder(self._include, branches=True)
+        if not self.recorder.start():
+            warnings.warn(
+                'Cannot measure coverage while another trace function is active'
+            )
+            self.recorder = None
+        else:
+            self.recorder_backend = self.recorder.backend
+
+    def finish(self) -> None:
+        if self.recorder is None:
+            return
+        recorder = self.recorder
+        recorder.stop()
+        self.recorder = None
+        for found in [recorder.lines, recorder.module_lines]:
+            for fpath, linenos in found.items():
+                if fpath in self._part_origins:
+                    target, shift = self._part_origins[fpath]
+                    self.executed.setdefault(target, set()).update(
+                        lineno + shift for lineno in linenos
+                    )
+                else:
+                    key = os.path.realpath(fpath)
+                    self.executed.setdefault(key, set()).update(linenos)
+        for code, code_arcs in recorder.arcs.items():
+            fpath = code.co_filename
+            if fpath not in self._part_origins:
+                fpath = os.path.realpath(fpath)
+            key = _code_key(code)
+            self.arcs.setdefault(fpath, set()).update(
+                (key, offset, dest) for offset, dest in code_arcs
+            )
+
+    def before_example(self, example: DocTest) -> None:
+        pass
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Remember where the parts of a doctest came from.
+
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        if example.fpath is None or not example._parts:
+            return
+        target = os.path.realpath(os.fspath(example.fpath))
+        lineno = example.lineno or 1
+        for partx, part in enumerate(example._parts):
+            partfilename = example._partfilename_for(partx)
+            shift = lineno + part.line_offset - 1
+            self._part_origins[partfilename] = (target, shift)
+            try:
+                code = compile(
+                    part.compilable_source(),
+                    mode=part.compile_mode,
+                    filename=partfilename,
+                    flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+                    dont_inherit=True,
+                )
+            except (SyntaxError, ValueError):
+                continue
+            linenos, branches = _analyze(code)
+            self._part_analysis[partfilename] = (linenos, branches)
+            self.statements.setdefault(target, set()).update(
+                n + shift for n in linenos
+            )
+
+    def _measured_files(self) -> list[str]:
+        fpaths = set(self.statements)
+        fpaths.update(fpath for fpath in self.executed)
+        for root, dnames, fnames in os.walk(self.include_dpath):
+            dnames[:] = [
+                d
+                for d in dnames
+                if not d.startswith('.') and d != '__pycache__'
+            ]
+            for fname in fnames:
+                if fname.endswith('.py'):
+                    fpaths.add(os.path.join(root, fname))
+        return sorted(fpaths)
+
+    def report(self) -> dict[str, dict[str, typing.Any]]:
+        """
+        Combine the measurements with a static analysis of the files.
+
+        Returns:
+            Dict[str, Dict]: maps each measured file to its ``statements``
+                and ``executed`` lines and its ``branches``, a list of
+                ``(line, block, fall_line, jump_line, fall_taken,
+                jump_taken)`` tuples
+        """
+        report = {}
+        for fpath in self._measured_files():
+            statements = set(self.statements.get(fpath, set()))
+            branch_rows = []
+            code = _compile_file(fpath) if fpath.endswith('.py') else None
+            units: list[tuple[str, int, list[_BranchPoint]]] = []
+            if code is not None:
+                linenos, branches = _analyze(code)
+                statements.update(linenos)
+                units.append((fpath, 0, branches))
+            for partfilename, (target, shift) in self._part_origins.items():
+                if target == fpath and partfilename in self._part_analysis:
+                    branches = self._part_analysis[partfilename][1]
+                    units.append((partfilename, shift, branches))
+            for unit_fpath, shift, branches in units:
+                dests: dict[tuple[tuple[str, int], int], set[int]] = {}
+                for key, offset, dest in self.arcs.get(unit_fpath, set()):
+                    dests.setdefault((key, offset), set()).add(dest)
+                for branch in branches:
+                    key, offset, line, fall_offset, fall_line, jump_line = (
+                        branch
+                    )
+                    seen = dests.get((key, offset), set())
+                    fall_taken = fall_offset in seen
+                    jump_taken = bool(seen - {fall_offset})
+                    branch_rows.append(
+                        (
+                            line + shift,
+                            len(branch_rows),
+                            fall_line + shift if fall_line > 0 else -1,
+                            jump_line + shift if jump_line > 0 else -1,
+                            fall_taken,
+                            jump_taken,
+                        )
+                    )
+            executed = self.executed.get(fpath, set()) & statements
+            report[fpath] = {
+                'statements': statements,
+                'executed': executed,
+                'branches': branch_rows,
+            }
+        return report
+
+    @staticmethod
+    def totals(report: dict[str, dict[str, typing.Any]]) -> dict[str, int]:
+        """
+        Args:
+            report (Dict): the result of :func:`DoctestCoverage.report`
+
+        Returns:
+            Dict[str, int]: the number of statements, executed statements,
+                branches, and taken branches
+        """
+        totals = {
+            'n_statements': 0,
+            'n_executed': 0,
+            'n_branches': 0,
+            'n_branches_taken': 0,
+        }
+        for file_report in report.values():
+            totals['n_statements'] += len(file_report['statements'])
+            totals['n_executed'] += len(file_report['executed'])
+            for row in file_report['branches']:
+                totals['n_branches'] += 2
+                totals['n_branches_taken'] += row[4] + row[5]
+        return totals
+
+    def dump(self, fpath: str, report: dict | None = None) -> str:
+        """
+        Write the report as lcov, or as JSON if the path ends with ``.json``.
+
+        Args:
+            fpath (str): output file
+            report (Dict | None): the result of :func:`DoctestCoverage.report`
+
+        Returns:
+            str: the format that was written
+        """
+        if report is None:
+            report = self.report()
+        dpath = os.path.dirname(fpath)
+        if dpath:
+            os.makedirs(dpath, exist_ok=True)
+        if fpath.endswith('.json'):
+            fmt = 'json'
+            text = json.dumps(self._json_data(report), indent=2) + '\n'
+        else:
+            fmt = 'lcov'
+            text = _format_lcov(report)
+        with open(fpath, 'w') as file:
+            file.write(text)
+        return fmt
+
+    def _json_data(self, report: dict[str, dict[str, typing.Any]]) -> dict:
+        import xdoctest
+
+        def percent(n_hit: int, n_total: int) -> float:
+            return 100.0 * n_hit / n_total if n_total else 100.0
+
+        files = {}
+        for fpath, file_report in report.items():
+            executed_branches = []
+            missing_branches = []
+            for line, _, fall_line, jump_line, fall, jump in file_report[
+                'branches'
+            ]:
+                for dest, taken in [(fall_line, fall), (jump_line, jump)]:
+                    target = executed_branches if taken else missing_branches
+                    target.append([line, dest])
+            statements = file_report['statements']
+            executed = file_report['executed']
+            summary = self.totals({fpath: file_report})
+            summary['percent_covered'] = percent(
+                summary['n_executed'], summary['n_statements']
+            )
+            files[fpath] = {
+                'executed_lines': sorted(executed),
+                'missing_lines': sorted(statements - executed),
+                'executed_branches': executed_branches,
+                'missing_branches': missing_branches,
+                'summary': summary,
+            }
+        totals = self.totals(report)
+        totals['percent_covered'] = percent(
+            totals['n_executed'], totals['n_statements']
+        )
+        return {
+            'meta': {
+                'format': 1,
+                'xdoctest_version': xdoctest.__version__,
+                'backend': self.recorder_backend,
+                'branch_coverage': self.recorder_backend == 'monitoring',
+            },
+            'files': files,
+            'totals': totals,
+        }
+
+    def summary(self, fpath: str | None = None) -> dict[str, typing.Any]:
+        """
+        Write the report (if requested) and summarize it.
+
+        Args:
+            fpath (str | None): where to write the report
+
+        Returns:
+            Dict[str, Any]: totals, the least covered files, and the written
+                file and its format
+        """
+        report = self.report()
+        fmt = None
+        if fpath is not None:
+            fmt = self.dump(fpath, report)
+        least_covered = []
+        for key, file_report in report.items():
+            n_statements = len(file_report['statements'])
+            if n_statements:
+                n_missing = n_statements - len(file_report['executed'])
+                if n_missing:
+                    least_covered.append(
+                        (1 - n_missing / n_statements, -n_missing, key)
+                    )
+        least_covered.sort()
+        root = os.path.dirname(self.include_dpath)
+        return {
+            'totals': self.totals(report),
+            'backend': self.recorder_backend,
+            'least_covered': [
+                (100 * frac, -neg_missing, os.path.relpath(key, root))
+                for frac, neg_missing, key in least_covered[:5]
+            ],
+            'fpath': fpath,
+            'format': fmt,
+        }
+
+
+def _format_lcov(report: dict[str, dict[str, typing.Any]]) -> str:
+    """
+    Format a coverage report as an lcov tracefile.
+
+    Args:
+        report (Dict): the result of :func:`DoctestCoverage.report`
+
+    Returns:
+        str
+
+    Example:
+        >>> from xdoctest.coverage import _format_lcov
+        >>> report = {'/src/mod.py': {
+        ...     'statements': {1, 2, 3}, 'executed': {1, 2},
+        ...     'branches': [(2, 0, 3, -1, False, True)]}}
+        >>> print(_format_lcov(report))
+        TN:
+        SF:/src/mod.py
+        DA:1,1
+        DA:2,1
+        DA:3,0
+        LF:3
+        LH:2
+        BRDA:2,0,0,0
+        BRDA:2,0,1,1
+        BRF:2
+        BRH:1
+        end_of_record
+    """
+    lines = ['TN:']
+    for fpath, file_report in report.items():
+        statements = file_report['statements']
+        executed = file_report['executed']
+        lines.append('SF:{}'.format(fpath))
+        for lineno in sorted(statements):
+            lines.append('DA:{},{}'.format(lineno, int(lineno in executed)))
+        lines.append('LF:{}'.format(len(statements)))
+        lines.append('LH:{}'.format(len(executed)))
+        n_hit = 0
+        for line, block, _, _, fall, jump in file_report['branches']:
+            for branchx, taken in enumerate([fall, jump]):
+                # lcov uses '-' for branches of lines that never ran
+                count = int(taken) if line in executed else '-'
+                lines.append(
+                    'BRDA:{},{},{},{}'.format(line, block, branchx, count)
+                )
+                n_hit += taken
+        if file_report['branches']:
+            lines.append('BRF:{}'.format(2 * len(file_report['branches'])))
+            lines.append('BRH:{}'.format(n_hit))
+        lines.append('end_of_record')
+    return '\n'.join(lines) + '\n'
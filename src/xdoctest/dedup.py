@@ -0,0 +1,176 @@
+"""
+Run textually identical doctests of a module only once.
+
+The same docstring often shows up under several callnames of one module,
+e.g. through aliases found by dynamic analysis, decorator wrappers, or
+``__doc__`` assignments. With ``--dedup`` the runner groups the doctests by
+their module, normalized source, and configuration, runs the first doctest
+of each group, and reports the others as its aliases. The summary lists the
+aliases with the outcome of the doctest that ran for them and the time this
+saved.
+
+Two doctests are only grouped if their sources are equal after trailing
+whitespace and surrounding blank lines are removed. Doctests that differ in
+any other way (even in a comment) are run separately.
+
+CommandLine:
+    xdoctest -m xdoctest all --dedup
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+
+def normalize_source(docsrc: str) -> str:
+    """
+    Args:
+        docsrc (str): the source of a doctest
+
+    Returns:
+        str: the source without trailing whitespace and surrounding blank
+            lines
+
+    Example:
+        >>> from xdoctest.dedup import normalize_source
+        >>> normalize_source('\\n>>> x = 1  \\n>>> print(x)\\n1\\n\\n')
+        '>>> x = 1\\n>>> print(x)\\n1'
+    """
+    lines = [line.rstrip() for line in docsrc.splitlines()]
+    return '\n'.join(lines).strip('\n')
+
+
+def dedup_key(example: DocTest) -> tuple[str, str, str]:
+    """
+    Args:
+        example (DocTest): a doctest
+
+    Returns:
+        Tuple[str, str, str]: the module path, normalized source, and the
+            configuration that affects the outcome of the doctest
+    """
+    from xdoctest.cache import _PRESENTATION_CONFIG_KEYS
+
+    config = {
+        key: value
+        for key, value in example.config.items()
+        if key not in _PRESENTATION_CONFIG_KEYS
+    }
+    return (
+        str(example.modpath),
+        normalize_source(example.docsrc or ''),
+        json.dumps(config, sort_keys=True, default=repr),
+    )
+
+
+class Deduplicator:
+    """
+    Groups identical doctests and remembers the outcome of the doctest that
+    ran for each group.
+
+    This is also an example hook for the native runner.
+
+    Attributes:
+        representatives (List[DocTest]): the first doctest of each group, in
+            the original order. Only these are run.
+        aliases (Dict[DocTest, List[DocTest]]): maps each representative to
+            the other doctests of its group
+        results (Dict[DocTest, Tuple[str, float]]): the status and duration
+            of each representative that ran
+
+    Example:
+        >>> from xdoctest.dedup import Deduplicator
+        >>> from xdoctest.doctest_example import DocTest
+        >>> examples = [DocTest('>>> print(1)\\n1', callname=name)
+        ...             for name in ['func', 'alias']]
+        >>> examples.append(DocTest('>>> print(2)\\n2', callname='other'))
+        >>> self = Deduplicator(examples)
+        >>> [e.callname for e in self.representatives]
+        ['func', 'other']
+        >>> for example in self.representatives:
+        ...     self.before_example(example)
+        ...     self.after_example(example, example.run(verbose=0))
+        >>> info = self.summary()
+        >>> info['n_duplicates']
+        1
+        >>> info['groups'][0]['status'], info['groups'][0]['aliases']
+        ('passed', ['<modpath?>::alias:0'])
+    """
+
+    def __init__(self, examples: list[DocTest]) -> None:
+        """
+        Args:
+            examples (List[DocTest]): the doctests to deduplicate
+        """
+        groups: dict[tuple[str, str, str], list[DocTest]] = {}
+        for example in examples:
+            groups.setdefault(dedup_key(example), []).append(example)
+        self.representatives = [group[0] for group in groups.values()]
+        self.aliases = {
+            group[0]: group[1:] for group in groups.values() if len(group) > 1
+        }
+        self.results: dict[DocTest, tuple[str, float]] = {}
+        self._tic: float | None = None
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+    def before_example(self, example: DocTest) -> None:
+        self._tic = time.perf_counter()
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        if example not in self.aliases:
+            return
+        if summary is not None and 'duration' in summary:
+            duration = summary['duration']
+        elif self._tic is not None:
+            duration = time.perf_counter() - self._tic
+        else:
+            duration = 0.0
+        if summary is None or summary['failed']:
+            status = 'failed'
+        elif summary['skipped']:
+            status = 'skipped'
+        else:
+            status = 'passed'
+        self.results[example] = (status, duration)
+
+    def summary(self) -> dict[str, typing.Any]:
+        """
+        Returns:
+            Dict[str, Any]: the number of duplicates that did not run, the
+                estimated seconds this saved, and for each group with
+                aliases the node that ran, its status, and the alias nodes
+        """
+        groups = []
+        n_seconds_saved = 0.0
+        for example, aliases in self.aliases.items():
+            status, duration = self.results.get(example, ('not run', 0.0))
+            n_seconds_saved += duration * len(aliases)
+            groups.append(
+                {
+                    'node': example.node,
+                    'status': status,
+                    'aliases': [alias.node for alias in aliases],
+                }
+            )
+        return {
+            'n_duplicates': sum(len(a) for a in self.aliases.values()),
+            'n_seconds_saved': n_seconds_saved,
+            'groups': groups,
+        }
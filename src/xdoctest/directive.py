@@ -55,9 +55,8 @@ value in the runtime state, the advanced ``REQUIRES`` directive either adds or
 removes a value from a ``set`` of unmet requirements. Doctests will only run if
 there are no unmet requirements.
 
-Currently the only advanced directive is ``REQUIRES(.)``. Multiple arguments
-may be specified, by separating them with commas. The currently available
-arguments allow you to condition on:
+Multiple arguments may be specified to ``REQUIRES(.)``, by separating them
+with commas. The currently available arguments allow you to condition on:
 
 
     * Special operating system / python implementation / python version tags, via: ``WIN32``, ``LINUX``, ``DARWIN``, ``POSIX``, ``NT``, ``JAVA``, ``CPYTHON``, ``IRONPYTHON``, ``JYTHON``, ``PYPY``, ``PY2``, ``PY3``. (e.g. ``# xdoctest +REQUIRES(WIN32)``)
@@ -68,6 +67,46 @@ arguments allow you to condition on:
 
     * Environment variables, via: ``env:<varname>==<val>``, (e.g. ``# xdoctest +REQUIRES(env:MYENVIRON==1)``)
 
+A doctest whose ``SKIP`` and ``REQUIRES`` directives skip every part is
+skipped when it is collected (see :func:`DocTest.static_skip_reason`), so it
+is never set up and its skip reason is reported.
+
+The ``MAX_TIME(.)`` and ``MAX_MEMORY(.)`` directives specify a performance
+budget. The doctest fails with a :class:`BudgetExceededError` if the code it
+covers takes longer or allocates more than the budget allows.
+
+    * ``MAX_TIME`` takes a number of seconds, optionally suffixed with ``s``
+      or ``ms`` (e.g. ``# xdoctest: +MAX_TIME(2.0)``).
+
+    * ``MAX_MEMORY`` takes a number of bytes, optionally suffixed with ``B``,
+      ``KB``, ``MB``, or ``GB`` (e.g. ``# xdoctest: +MAX_MEMORY(500MB)``).
+      Memory is the peak of Python allocations measured by :mod:`tracemalloc`.
+
+As an inline directive a budget applies to the wall time or allocation peak
+of that single part. As a block directive it applies to the total time (or the
+largest peak) of all parts that run until the budget is set again (a repeated
+directive starts a new block even with the same limit) or removed with
+``-MAX_TIME`` / ``-MAX_MEMORY``.
+
+Budgets are multiplied by the ``budget_scale`` option (``--budget-scale`` or
+the ``XDOCTEST_BUDGET_SCALE`` environment variable) to accommodate slower
+machines, and can be disabled for an entire run with
+``--options=-MAX_TIME,-MAX_MEMORY``.
+
+The ``SERIAL`` and ``LOCK(.)`` directives do not change how a doctest runs,
+but how a parallel scheduler (e.g. ``xdoctest serve-queue``) may run it next
+to others. They are read when the doctest is collected and apply to the
+whole doctest wherever they appear in it.
+
+    * ``SERIAL`` runs the doctest alone, i.e. no other doctest runs while it
+      does (e.g. ``# xdoctest: +SERIAL``).
+
+    * ``LOCK`` takes one or more names of shared resources, such as a fixed
+      port or a temporary path. Doctests that hold the same lock never run at
+      the same time (e.g. ``# xdoctest: +LOCK(port-8080, tmp-cache)``).
+
+All other doctests still run in parallel.
+
 
 TODO
 ----
@@ -165,7 +204,7 @@ from collections import OrderedDict, namedtuple
 from typing import Dict, Literal, Set, TypedDict, Union, cast
 
 from xdoctest import static_analysis as static
-from xdoctest import utils
+from xdoctest import timing, utils
 
 
 def named(key: str, pattern: str) -> str:
@@ -206,6 +245,8 @@ class RuntimeStateDict(TypedDict, total=False):
     ASYNC: bool
     SKIP: bool
     REQUIRES: set[str]
+    MAX_TIME: float | None
+    MAX_MEMORY: int | None
 
 
 # Report style choices for set_report_style method
@@ -237,6 +278,10 @@ DEFAULT_RUNTIME_STATE: RuntimeStateDict = {
     # Maintains a set unmet dependencies, ie the reasons we are skipping.
     # Doctests will be skipped while REQUIRES is non-empty and SKIP is False.
     'REQUIRES': set(),
+    # Performance budgets in seconds and bytes. None means unlimited. New in
+    # 1.3.3
+    'MAX_TIME': None,
+    'MAX_MEMORY': None,
     # Original directives we are currently not supporting:
     # DONT_ACCEPT_TRUE_FOR_1
     # REPORT_ONLY_FIRST_FAILURE
@@ -245,6 +290,13 @@ DEFAULT_RUNTIME_STATE: RuntimeStateDict = {
 }
 
 
+# Directives whose argument is a measured resource limit
+BUDGET_DIRECTIVES = ['MAX_TIME', 'MAX_MEMORY']
+
+# Directives that constrain which doctests may run concurrently. They have no
+# runtime effect and are read at collection time.
+SCHEDULING_DIRECTIVES = ['SERIAL', 'LOCK']
+
 Effect = namedtuple('Effect', ('action', 'key', 'value'))
 
 
@@ -284,6 +336,8 @@ class RuntimeState(utils.NiceRepr):
             IGNORE_EXCEPTION_DETAIL: False,
             IGNORE_WANT: False,
             IGNORE_WHITESPACE: False,
+            MAX_MEMORY: None,
+            MAX_TIME: None,
             NORMALIZE_REPR: True,
             NORMALIZE_WHITESPACE: True,
             REPORT_CDIFF: False,
@@ -306,6 +360,14 @@ class RuntimeState(utils.NiceRepr):
         if default_state:
             self._global_state.update(default_state)
         self._inline_state: dict[str, typing.Any] = {}
+        # Budgets turned off in the default state (e.g. via the
+        # ``--options=-MAX_TIME`` CLI flag) ignore all directives in the run.
+        self._disabled: set[str] = set()
+        state = cast(Dict[str, typing.Any], self._global_state)
+        for key in BUDGET_DIRECTIVES:
+            if state[key] is False:
+                self._disabled.add(key)
+                state[key] = None
 
     def to_dict(self) -> OrderedDict[str, bool | set[str]]:
         """
@@ -327,13 +389,13 @@ class RuntimeState(utils.NiceRepr):
         parts = ['{}: {}'.format(*item) for item in self.to_dict().items()]
         return '{' + ', '.join(parts) + '}'
 
-    def __getitem__(self, key: str) -> bool | set[str]:
+    def __getitem__(self, key: str) -> typing.Any:
         """
         Args:
             key (str):
 
         Returns:
-            bool | set[str]
+            bool | set[str] | float | None
         """
         if key not in self._global_state:
             raise KeyError('Unknown key: {}'.format(key))
@@ -354,6 +416,37 @@ class RuntimeState(utils.NiceRepr):
             raise KeyError('Unknown key: {}'.format(key))
         cast(Dict[str, Union[bool, Set[str]]], self._global_state)[key] = value
 
+    def budget_limits(self, key: str) -> tuple[typing.Any, typing.Any]:
+        """
+        Lookup the budget that applies to the current part and to the block
+        of parts it belongs to.
+
+        Args:
+            key (str): either ``'MAX_TIME'`` or ``'MAX_MEMORY'``
+
+        Returns:
+            Tuple[float | None, float | None]:
+                the inline (part) limit and the block limit
+
+        Example:
+            >>> from xdoctest.directive import *
+            >>> runstate = RuntimeState()
+            >>> runstate.update(list(Directive.extract('# xdoc: +MAX_TIME(3)')))
+            >>> runstate.budget_limits('MAX_TIME')
+            (None, 3.0)
+            >>> runstate.update([Directive('MAX_TIME', args=['1'], inline=True)])
+            >>> runstate.budget_limits('MAX_TIME')
+            (1.0, 3.0)
+            >>> # Budgets can be globally disabled by the default state
+            >>> runstate = RuntimeState({'MAX_TIME': False})
+            >>> runstate.update(list(Directive.extract('# xdoc: +MAX_TIME(3)')))
+            >>> runstate.budget_limits('MAX_TIME')
+            (None, None)
+        """
+        block_limit = cast(Dict[str, typing.Any], self._global_state)[key]
+        part_limit = self._inline_state.get(key, None)
+        return part_limit, block_limit
+
     def set_report_style(
         self,
         reportchoice: ReportStyle,
@@ -398,6 +491,8 @@ class RuntimeState(utils.NiceRepr):
                 action, key, value = effect
                 if action == 'noop':
                     continue
+                if key in self._disabled:
+                    continue
 
                 if key not in self._global_state:
                     warnings.warn('Unknown state: {}'.format(key))
@@ -644,6 +739,12 @@ class Directive(utils.NiceRepr):
             Effect(action='set.add', key='REQUIRES', value='-s')
             >>> Directive('ELLIPSIS', args=['-s']).effects(argv=[])[0]
             Effect(action='assign', key='ELLIPSIS', value=True)
+            >>> Directive('MAX_MEMORY', args=['500MB']).effects()[0]
+            Effect(action='assign', key='MAX_MEMORY', value=524288000)
+            >>> Directive('MAX_TIME', positive=False).effects()[0]
+            Effect(action='assign', key='MAX_TIME', value=None)
+            >>> Directive('LOCK', args=['port-8080']).effects()[0]
+            Effect(action='noop', key='LOCK', value='port-8080')
 
         Doctest:
             >>> # requirement directive with module
@@ -700,6 +801,16 @@ class Directive(utils.NiceRepr):
                     else:
                         action = 'set.remove'
                 effects.append(Effect(action, key, value))
+        elif key in BUDGET_DIRECTIVES:
+            # Budgets are assigned a limit, or removed if negative
+            action = 'assign'
+            if self.positive:
+                value = _parse_budget(key, self.args)
+            effects.append(Effect(action, key, value))
+        elif key in SCHEDULING_DIRECTIVES:
+            # Scheduling directives are handled at collection time
+            for arg in self.args or [None]:
+                effects.append(Effect('noop', key, arg))
         elif key.startswith('REPORT_'):
             # Special handling of report style
             if self.positive:
@@ -715,6 +826,117 @@ class Directive(utils.NiceRepr):
         return effects
 
 
+def scheduling_constraints(
+    directives: typing.Iterable[Directive],
+) -> tuple[bool, frozenset[str]]:
+    """
+    Determine how a doctest may be scheduled next to others.
+
+    Args:
+        directives (Iterable[Directive]): all directives of the doctest
+
+    Returns:
+        Tuple[bool, FrozenSet[str]]: if the doctest must run alone and the
+            names of the locks it holds while it runs
+
+    Raises:
+        ValueError: if a ``LOCK`` directive is not given a name
+
+    Example:
+        >>> from xdoctest.directive import Directive, scheduling_constraints
+        >>> text = '# xdoctest: +LOCK(port-8080, tmp), +LOCK(tmp)'
+        >>> serial, locks = scheduling_constraints(Directive.extract(text))
+        >>> serial, sorted(locks)
+        (False, ['port-8080', 'tmp'])
+        >>> scheduling_constraints(Directive.extract('# xdoctest: +SERIAL'))
+        (True, frozenset())
+        >>> # A constraint holds for the entire doctest and cannot be removed
+        >>> scheduling_constraints(Directive.extract('# xdoc: -SERIAL'))
+        (False, frozenset())
+        >>> scheduling_constraints(Directive.extract('# xdoctest: +LOCK()'))
+        Traceback (most recent call last):
+        ValueError: LOCK directive expected at least 1 argument, got ['']
+    """
+    serial = False
+    locks: set[str] = set()
+    for directive in directives:
+        if not directive.positive:
+            continue
+        if directive.name == 'SERIAL':
+            serial = True
+        elif directive.name == 'LOCK':
+            names = [arg.strip('\'"') for arg in directive.args or []]
+            if not all(names):
+                raise ValueError(
+                    'LOCK directive expected at least 1 argument, '
+                    'got {!r}'.format(directive.args or [])
+                )
+            locks.update(names)
+    return serial, frozenset(locks)
+
+
+def _parse_budget(key: str, args: list[str] | None) -> float | int:
+    """
+    Parse the argument of a ``MAX_TIME`` or ``MAX_MEMORY`` directive.
+
+    Args:
+        key (str): the name of the budget directive
+        args (list[str] | None): the directive arguments
+
+    Returns:
+        float | int: a limit in seconds for ``MAX_TIME`` or in bytes for
+            ``MAX_MEMORY``
+
+    Example:
+        >>> from xdoctest.directive import _parse_budget
+        >>> _parse_budget('MAX_TIME', ['2.5'])
+        2.5
+        >>> _parse_budget('MAX_TIME', ['250ms'])
+        0.25
+        >>> _parse_budget('MAX_MEMORY', ['1.5kb'])
+        1536
+        >>> _parse_budget('MAX_MEMORY', ['100'])
+        100
+        >>> import pytest
+        >>> with pytest.raises(ValueError):
+        ...     _parse_budget('MAX_MEMORY', ['10 parsecs'])
+        >>> with pytest.raises(ValueError):
+        ...     _parse_budget('MAX_TIME', [])
+    """
+    if not args or len(args) != 1 or not args[0]:
+        raise ValueError(
+            '{} directive expected exactly 1 argument, got {!r}'.format(
+                key, args
+            )
+        )
+    text = args[0].strip().strip('\'"').upper()
+    if key == 'MAX_TIME':
+        units = [('MS', 1e-3), ('S', 1.0), ('', 1.0)]
+    else:
+        units = [
+            ('GB', 1024**3),
+            ('MB', 1024**2),
+            ('KB', 1024),
+            ('B', 1),
+            ('', 1),
+        ]
+    for suffix, factor in units:
+        if text.endswith(suffix):
+            number = text[: len(text) - len(suffix)]
+            try:
+                amount = float(number) * factor
+            except ValueError:
+                continue
+            if amount <= 0:
+                break
+            if key == 'MAX_MEMORY':
+                return int(amount)
+            return amount
+    raise ValueError(
+        'Invalid argument to the {} directive: {!r}'.format(key, args[0])
+    )
+
+
 def _split_opstr(optstr: str) -> list[str]:
     """
     Simplified balanced paren logic to only split commas outside of parens
@@ -730,7 +952,11 @@ def _split_opstr(optstr: str) -> list[str]:
         >>> _split_opstr(optstr)
         ['+FOO', 'REQUIRES(foo,bar)', '+ELLIPSIS']
     """
-    import re
+    cached = _RESOLUTION_CACHE.opstr_splits.get(optstr)
+    if cached is not None:
+        timing.count('split_opstr', 'hits')
+        return list(cached)
+    timing.count('split_opstr', 'misses')
 
     stack: list[typing.Any] = []
     split_pos = []
@@ -753,6 +979,7 @@ def _split_opstr(optstr: str) -> list[str]:
         prev = curr + 1
     curr = None
     parts.append(optstr[prev:curr].strip())
+    _RESOLUTION_CACHE.opstr_splits[optstr] = tuple(parts)
     return parts
 
 
@@ -901,7 +1128,67 @@ def _is_requires_satisfied(
     return flag
 
 
-_MODNAME_EXISTS_CACHE = {}
+class _ResolutionCache:
+    """
+    Memoizes how directives are resolved for the lifetime of the process.
+
+    The same directives (e.g. ``REQUIRES(module:numpy)``) tend to appear in
+    many doctests, and checking if a module exists searches ``sys.path``.
+    These results are forgotten when ``sys.path`` changes. Splitting and
+    parsing option strings only depends on the text, so these results are
+    kept. Hits and misses are counted in the ``--timing-breakdown``.
+
+    Attributes:
+        module_exists (Dict[str, bool]): if each module name was found
+        optstrs (Dict[str, Tuple[str, str, bool, Tuple[str, ...]]]): maps
+            option strings to their label, name, sign, and arguments
+        opstr_splits (Dict[str, Tuple[str, ...]]): maps option strings to
+            the individual directive option strings
+
+    Example:
+        >>> from xdoctest.directive import _RESOLUTION_CACHE, _module_exists
+        >>> import sys
+        >>> _module_exists('xdoctest')
+        True
+        >>> 'xdoctest' in _RESOLUTION_CACHE.module_exists
+        True
+        >>> sys.path.append('/does/not/exist')
+        >>> try:
+        ...     _RESOLUTION_CACHE.check_sys_path()
+        ... finally:
+        ...     sys.path.remove('/does/not/exist')
+        >>> 'xdoctest' in _RESOLUTION_CACHE.module_exists
+        False
+    """
+
+    def __init__(self) -> None:
+        self.module_exists: dict[str, bool] = {}
+        self.optstrs: dict[str, tuple[str, str, bool, tuple[str, ...]]] = {}
+        self.opstr_splits: dict[str, tuple[str, ...]] = {}
+        self._sys_path = tuple(sys.path)
+
+    def check_sys_path(self) -> None:
+        """
+        Forget which modules exist if ``sys.path`` changed since the last
+        check.
+        """
+        sys_path = tuple(sys.path)
+        if sys_path != self._sys_path:
+            self._sys_path = sys_path
+            if self.module_exists:
+                self.module_exists.clear()
+                timing.count('module_exists', 'invalidations')
+
+    def clear(self) -> None:
+        """
+        Forget all results
+        """
+        self.module_exists.clear()
+        self.optstrs.clear()
+        self.opstr_splits.clear()
+
+
+_RESOLUTION_CACHE = _ResolutionCache()
 
 
 def _module_exists(modname: typing.Any) -> bool:
@@ -912,19 +1199,26 @@ def _module_exists(modname: typing.Any) -> bool:
     Returns:
         bool
     """
-    if modname not in _MODNAME_EXISTS_CACHE:
+    cache = _RESOLUTION_CACHE
+    cache.check_sys_path()
+    try:
+        exists_flag = cache.module_exists[modname]
+    except KeyError:
+        timing.count('module_exists', 'misses')
         from xdoctest.utils import util_import
 
         modpath = util_import.modname_to_modpath(modname)
         exists_flag = modpath is not None
-        _MODNAME_EXISTS_CACHE[modname] = exists_flag
-    exists_flag = _MODNAME_EXISTS_CACHE[modname]
+        cache.module_exists[modname] = exists_flag
+    else:
+        timing.count('module_exists', 'hits')
     return exists_flag
 
 
 COMMANDS = list(DEFAULT_RUNTIME_STATE.keys()) + [
     # Define extra commands that can resolve to a runtime state modification
     'REQUIRES',
+    *SCHEDULING_DIRECTIVES,
 ]
 DIRECTIVE_PATTERNS = [
     # r'\s*\+\s*' + named('style1', '.*'),
@@ -960,6 +1254,40 @@ def parse_directive_optstr(
         >>> print(str(parse_directive_optstr('+IGNORE_WHITESPACE')))
         <Directive(+IGNORE_WHITESPACE)>
     """
+    parsed = _RESOLUTION_CACHE.optstrs.get(optpart)
+    if parsed is None:
+        timing.count('parse_directive_optstr', 'misses')
+        parsed = _parse_optstr(optpart)
+        _RESOLUTION_CACHE.optstrs[optpart] = parsed
+    else:
+        timing.count('parse_directive_optstr', 'hits')
+    label, name, positive, args = parsed
+    if name not in COMMANDS:
+        msg = 'Unknown directive: {!r}'.format(label)
+        warnings.warn(msg)
+        return None
+    else:
+        directive = Directive(name, positive, list(args), inline)
+        return directive
+
+
+def _parse_optstr(optpart: str) -> tuple[str, str, bool, tuple[str, ...]]:
+    """
+    Implementation of :func:`parse_directive_optstr` without the cache.
+
+    Args:
+        optpart (str): the string corresponding to the operation
+
+    Returns:
+        Tuple[str, str, bool, Tuple[str, ...]]: the option without its
+            arguments, the upper case name, if it is positive, and the
+            arguments
+
+    Example:
+        >>> from xdoctest.directive import _parse_optstr
+        >>> _parse_optstr(' -requires(module:foo, env:BAR) ')
+        ('-requires', 'REQUIRES', False, ('module:foo', 'env:BAR'))
+    """
     optpart = optpart.strip()
     # all spaces are ignored
     optpart = optpart.replace(' ', '')
@@ -982,14 +1310,7 @@ def parse_directive_optstr(
         positive = True
         name = optpart
 
-    name = name.upper()
-    if name not in COMMANDS:
-        msg = 'Unknown directive: {!r}'.format(optpart)
-        warnings.warn(msg)
-        return None
-    else:
-        directive = Directive(name, positive, args, inline)
-        return directive
+    return optpart, name.upper(), positive, tuple(args)
 
 
 if __name__ == '__main__':
@@ -25,6 +25,8 @@ from xdoctest import (
     exceptions,
     global_state,
     parser,
+    resources,
+    timing,
     utils,
 )
 
@@ -64,12 +66,18 @@ class DoctestConfig(dict):
                 'supress_import_errors': False,
                 'on_error': 'raise',
                 'partnos': False,
+                'line_timing': False,
+                # multiplier applied to MAX_TIME and MAX_MEMORY budgets
+                'budget_scale': 1.0,
                 'verbose': 1,
             }
         )
 
     def _populate_from_cli(self, ns):
-        from xdoctest.directive import parse_directive_optstr
+        from xdoctest.directive import (
+            BUDGET_DIRECTIVES,
+            parse_directive_optstr,
+        )
 
         directive_optstr = ns['options']
         default_runtime_state = {}
@@ -81,7 +89,18 @@ class DoctestConfig(dict):
                         'Failed to parse directive given in the xdoctest "options"'
                         'directive_optstr={!r}'.format(directive_optstr)
                     )
-                default_runtime_state[directive.name] = directive.positive
+                if directive.name in BUDGET_DIRECTIVES and directive.positive:
+                    # A default budget, e.g. --options="+MAX_TIME(10)"
+                    try:
+                        effect = directive.effects()[0]
+                    except ValueError as ex:
+                        raise ValueError(
+                            'Invalid budget in the xdoctest "options" {!r}: '
+                            '{}'.format(directive_optstr, ex)
+                        )
+                    default_runtime_state[directive.name] = effect.value
+                else:
+                    default_runtime_state[directive.name] = directive.positive
         _examp_conf = {
             'default_runtime_state': default_runtime_state,
             'deferred_output_matching': ns['deferred_output_matching'],
@@ -91,6 +110,8 @@ class DoctestConfig(dict):
             'global_exec': ns['global_exec'],
             'optional_want': ns['optional_want'],
             'supress_import_errors': ns['supress_import_errors'],
+            'line_timing': ns['line_timing'],
+            'budget_scale': ns['budget_scale'],
             'verbose': ns['verbose'],
         }
         return _examp_conf
@@ -232,6 +253,30 @@ class DoctestConfig(dict):
                     help='Removes tracebacks from errors in implicit imports',
                 ),
             ),
+            (
+                ['--line-timing'],
+                dict(
+                    dest='line_timing',
+                    action='store_true',
+                    default=self['line_timing'],
+                    help=(
+                        'Measure the wall and CPU time of each line of each '
+                        'doctest and report the slowest lines'
+                    ),
+                ),
+            ),
+            (
+                ['--budget-scale'],
+                dict(
+                    type=float,
+                    dest='budget_scale',
+                    default=self['budget_scale'],
+                    help=(
+                        'Multiply the limits given by MAX_TIME and MAX_MEMORY '
+                        'directives by this factor (e.g. on slow CI machines)'
+                    ),
+                ),
+            ),
             (
                 ['--verbose'],
                 dict(
@@ -281,6 +326,7 @@ class DoctestConfig(dict):
             'report',
             'options',
             'global-exec',
+            'budget-scale',
             'verbose',
         }
         for alias, kw in add_argument_kws:
@@ -379,6 +425,14 @@ class DocTest:
         logged_stdout (OrderedDict):
             Mapping from part index to captured stdout.
 
+        part_times (OrderedDict):
+            Mapping from part index to the :class:`xdoctest.timing.CodeTimer`
+            that measured its execution.
+
+        part_allocs (OrderedDict):
+            Mapping from part index to the peak number of bytes it allocated.
+            Only parts with a ``MAX_MEMORY`` budget are measured.
+
         global_namespace (dict):
             globals visible to the doctest
 
@@ -427,6 +481,8 @@ class DocTest:
     _partfilename: str | None
     logged_evals: OrderedDict[int, typing.Any] | None
     logged_stdout: OrderedDict[int, str | None] | None
+    part_times: OrderedDict[int, timing.CodeTimer]
+    part_allocs: OrderedDict[int, int]
     _unmatched_stdout: list[str] | None
     _skipped_parts: list | None
     _runstate: typing.Any
@@ -519,6 +575,11 @@ class DocTest:
 
         self.logged_evals = OrderedDict()
         self.logged_stdout = OrderedDict()
+        # Maps each executed part index to a timing.CodeTimer
+        self.part_times = OrderedDict()
+        self.part_allocs = OrderedDict()
+        # Maps budget keys to the first part and usage of the current block
+        self._budget_usage: dict[str, list] = {}
         self._unmatched_stdout = []
         self._skipped_parts = []
 
@@ -604,6 +665,96 @@ class DocTest:
         m = re.match(pattern, self.docsrc, flags=re.IGNORECASE)
         return m is not None
 
+    def scheduling_constraints(self) -> tuple[bool, frozenset[str]]:
+        """
+        Find the ``SERIAL`` and ``LOCK`` directives of this doctest, which
+        tell a parallel scheduler what may run concurrently with it.
+
+        Returns:
+            Tuple[bool, FrozenSet[str]]: if the doctest must run alone and the
+                names of the locks it holds
+
+        Example:
+            >>> from xdoctest.doctest_example import DocTest
+            >>> self = DocTest(utils.codeblock(
+            ...     '''
+            ...     >>> x = 1  # xdoctest: +LOCK(port-8080)
+            ...     >>> # xdoctest: +LOCK(tmp-cache)
+            ...     '''))
+            >>> serial, locks = self.scheduling_constraints()
+            >>> serial, sorted(locks)
+            (False, ['port-8080', 'tmp-cache'])
+        """
+        self._parse()
+        assert self._parts is not None
+        return directive.scheduling_constraints(
+            d for part in self._parts for d in part.directives
+        )
+
+    def static_skip_reason(self) -> str | None:
+        """
+        Check if the directives of this doctest skip every part with code.
+
+        The ``SKIP`` and ``REQUIRES`` directives only depend on the platform,
+        the command line, environment variables, and installed modules, so
+        this is known when the doctest is collected. Runners use this to skip
+        such doctests without setting them up.
+
+        Returns:
+            str | None: why the doctest is skipped, or None if any part would
+                run (or if the doctest cannot be parsed, which is reported
+                when it runs)
+
+        Example:
+            >>> from xdoctest.doctest_example import DocTest
+            >>> self = DocTest(utils.codeblock(
+            ...     '''
+            ...     >>> # xdoctest: +REQUIRES(module:xdoctest)
+            ...     >>> # xdoctest: +REQUIRES(module:notamodule, env:NOTSET)
+            ...     >>> x = 1
+            ...     '''))
+            >>> self.static_skip_reason()
+            'doctest has unmet requirements: env:NOTSET, module:notamodule'
+            >>> self = DocTest(utils.codeblock(
+            ...     '''
+            ...     >>> # xdoctest: +SKIP
+            ...     >>> x = 1
+            ...     >>> # xdoctest: -SKIP
+            ...     >>> y = 2
+            ...     '''))
+            >>> print(self.static_skip_reason())
+            None
+        """
+        try:
+            self._parse()
+        except (exceptions.DoctestParseError, SyntaxError):
+            return None
+        assert self._parts is not None
+        runstate = directive.RuntimeState(self.config['default_runtime_state'])
+        reason = None
+        with warnings.catch_warnings():
+            # Unknown directives are reported when the doctest runs
+            warnings.simplefilter('ignore')
+            for part in self._parts:
+                try:
+                    runstate.update(part.directives)
+                except Exception:
+                    return None
+                if not part.has_any_code():
+                    continue
+                requires = runstate['REQUIRES']
+                if runstate['SKIP']:
+                    part_reason = 'doctest encountered a SKIP directive'
+                elif isinstance(requires, set) and len(requires) > 0:
+                    part_reason = 'doctest has unmet requirements: {}'.format(
+                        ', '.join(sorted(requires))
+                    )
+                else:
+                    return None
+                if reason is None:
+                    reason = part_reason
+        return reason
+
     @property
     def unique_callname(self) -> str:
         """
@@ -840,9 +991,10 @@ class DocTest:
                     # here depending on your local environment. We may want to
                     # try and detect that.
                     assert self.modpath is not None
-                    self.module = utils.import_module_from_path(
-                        self.modpath, index=-1
-                    )
+                    with timing.span('import', self.modpath):
+                        self.module = utils.import_module_from_path(
+                            self.modpath, index=-1
+                        )
                 except RuntimeError as ex:
                     if global_state.DEBUG_DOCTEST:
                         print('sys.path={}'.format(sys.path))
@@ -967,6 +1119,15 @@ class DocTest:
         Returns:
             Dict : summary
         """
+        with timing.span('doctest', self.modpath, self.node):
+            return self._run(verbose, on_error)
+
+    def _run(
+        self, verbose: int | None | bool = None, on_error: str | None = None
+    ) -> dict[str, typing.Any]:
+        """
+        Implementation of :func:`DocTest.run`
+        """
         on_error = cast(
             Union[str, None], self.config.getvalue('on_error', on_error)
         )
@@ -983,6 +1144,9 @@ class DocTest:
         assert self.logged_stdout is not None
         self.logged_evals.clear()
         self.logged_stdout.clear()
+        self.part_times.clear()
+        self.part_allocs.clear()
+        self._budget_usage = {}
         self._unmatched_stdout = []
 
         self._skipped_parts = []
@@ -1017,6 +1181,8 @@ class DocTest:
 
         DEBUG = global_state.DEBUG_DOCTEST
 
+        line_timing = self.config['line_timing']
+
         # Use the same capture object for all parts in the test
         cap = utils.CaptureStdout(
             suppress=self._suppressed_stdout, enabled=needs_capture
@@ -1041,6 +1207,14 @@ class DocTest:
                 try:
                     try:
                         runstate.update(part_directive)
+                        for budget in part_directive:
+                            if (
+                                budget.name in directive.BUDGET_DIRECTIVES
+                                and not budget.inline
+                            ):
+                                # Every block budget directive starts a new
+                                # block, even if the limit did not change
+                                self._budget_usage[budget.name] = [partx, 0]
                     except Exception as ex:
                         assert self.lineno is not None
                         msg = 'Failed to parse directive: {} in {} at line {}. Caused by {}'.format(
@@ -1149,13 +1323,14 @@ class DocTest:
                     # Compile code, handle syntax errors
                     #   part.compile_mode can be single, exec, or eval.
                     #   Typically single is used instead of eval
-                    code = compile(
-                        source_text,
-                        mode=part.compile_mode,
-                        filename=self._partfilename,
-                        flags=compileflags,
-                        dont_inherit=True,
-                    )
+                    with timing.span('compile', self.modpath):
+                        code = compile(
+                            source_text,
+                            mode=part.compile_mode,
+                            filename=self._partfilename,
+                            flags=compileflags,
+                            dont_inherit=True,
+                        )
                 except KeyboardInterrupt:  # nocover
                     raise
                 except Exception:
@@ -1178,7 +1353,16 @@ class DocTest:
                             # NOTE: For code passed to eval or exec, there is no
                             # difference between locals and globals. Only pass in
                             # one dict, otherwise there is weird behavior
-                            with cap:
+                            part_timer = timing.CodeTimer(code, line_timing)
+                            self.part_times[partx] = part_timer
+                            alloc_tracer = resources.AllocTracer(
+                                enabled=any(
+                                    runstate.budget_limits('MAX_MEMORY')
+                                )
+                            )
+                            with cap, timing.span(
+                                'exec', self.modpath, partx
+                            ), part_timer, alloc_tracer:
                                 # We can execute each part using exec or eval.  If
                                 # a doctest part has `compile_mode=eval` we
                                 # expect it to return an object with a repr that
@@ -1222,6 +1406,8 @@ class DocTest:
                             # this doctest_part.
                             self.logged_evals[partx] = got_eval
                             self.logged_stdout[partx] = cap.text
+                            if alloc_tracer.peak is not None:
+                                self.part_allocs[partx] = alloc_tracer.peak
                         except Exception:
                             if part.want:
                                 # A failure may be expected if the traceback
@@ -1232,7 +1418,10 @@ class DocTest:
                                     *exception[:2]
                                 )[-1]
                                 want = part.want
-                                checker.check_exception(exc_got, want, runstate)
+                                with timing.span('check', self.modpath):
+                                    checker.check_exception(
+                                        exc_got, want, runstate
+                                    )
                             else:
                                 raise
                         else:
@@ -1242,12 +1431,13 @@ class DocTest:
                                 doctest. Allow the rest of the code to run.  If
                                 multiple errors occur, show them both.
                             """
-                            self._check_or_defer_part_output(
-                                part,
-                                cap.text,
-                                got_eval,
-                                runstate,
-                            )
+                            with timing.span('check', self.modpath):
+                                self._check_or_defer_part_output(
+                                    part,
+                                    cap.text,
+                                    got_eval,
+                                    runstate,
+                                )
                     except BaseException:
                         # close the asyncio runner (base exception)
                         if asyncio_runner is not None:
@@ -1263,6 +1453,7 @@ class DocTest:
                                 asyncio_runner.close()
                             finally:
                                 asyncio_runner = None
+                    self._check_budgets(partx, runstate)
 
                 # Handle anything that could go wrong
                 except KeyboardInterrupt:  # nocover
@@ -1281,6 +1472,13 @@ class DocTest:
                     if on_error == 'raise':
                         raise
                     break
+                except exceptions.BudgetExceededError:
+                    # When a part took longer or allocated more than a
+                    # MAX_TIME or MAX_MEMORY directive allows.
+                    self.exc_info = sys.exc_info()
+                    if on_error == 'raise':
+                        raise
+                    break
                 except checker.GotWantException:
                     # When the "got", doesn't match the "want"
                     self.exc_info = sys.exc_info()
@@ -1535,6 +1733,104 @@ class DocTest:
                     self._color(self._block_prefix + ' STDOUT/STDERR', 'white')
                 )
 
+    def _check_budgets(self, partx: int, runstate: typing.Any) -> None:
+        """
+        Compare the time and memory used by a part that just ran against the
+        ``MAX_TIME`` and ``MAX_MEMORY`` directives that apply to it.
+
+        An inline budget limits the part itself. A block budget limits the
+        total time (or the largest allocation peak) of all parts that ran
+        since the budget was last set, even if it was set to the same limit
+        before.
+
+        Args:
+            partx (int): index of the part that just ran
+            runstate (xdoctest.directive.RuntimeState): the current state
+
+        Raises:
+            BudgetExceededError: if a budget (times ``budget_scale``) is
+                exceeded
+
+        Example:
+            >>> from xdoctest import utils
+            >>> from xdoctest.core import parse_docstr_examples
+            >>> docstr = utils.codeblock(
+            ...     '''
+            ...     >>> # xdoctest: +MAX_TIME(10ms)
+            ...     >>> import time
+            ...     >>> time.sleep(0.006)
+            ...     >>> time.sleep(0.006)
+            ...     ''')
+            >>> self = next(parse_docstr_examples(docstr, 'budget'))
+            >>> summary = self.run(verbose=0, on_error='return')
+            >>> assert summary['failed']
+            >>> print(self.exc_info[1])
+            MAX_TIME budget exceeded: parts took ...s in total, but the budget is 0.010s
+            >>> self.config['budget_scale'] = 10
+            >>> assert self.run(verbose=0, on_error='return')['passed']
+            >>> # Setting the same budget again starts a new block
+            >>> docstr = utils.codeblock(
+            ...     '''
+            ...     >>> # xdoctest: +MAX_TIME(100ms)
+            ...     >>> import time
+            ...     >>> time.sleep(0.06)
+            ...     >>> # xdoctest: +MAX_TIME(100ms)
+            ...     >>> time.sleep(0.06)
+            ...     ''')
+            >>> self = next(parse_docstr_examples(docstr, 'budget'))
+            >>> assert self.run(verbose=0, on_error='return')['passed']
+        """
+        scale = self.config.getvalue('budget_scale')
+        scale = 1.0 if scale is None else float(scale)
+        measured = {
+            'MAX_TIME': self.part_times[partx].wall,
+            'MAX_MEMORY': self.part_allocs.get(partx, 0),
+        }
+        for key in directive.BUDGET_DIRECTIVES:
+            part_limit, block_limit = runstate.budget_limits(key)
+            value = measured[key]
+            checks = []
+            if part_limit is not None:
+                checks.append(('part', part_limit, value))
+            if block_limit is None:
+                self._budget_usage.pop(key, None)
+            else:
+                # A default budget (from the options) starts at the first
+                # part that runs
+                usage = self._budget_usage.setdefault(key, [partx, 0])
+                if key == 'MAX_TIME':
+                    usage[1] += value
+                else:
+                    usage[1] = max(usage[1], value)
+                checks.append(('block', block_limit, usage[1]))
+
+            for scope, limit, used in checks:
+                scaled_limit = limit * scale
+                if used <= scaled_limit:
+                    continue
+                if key == 'MAX_TIME':
+                    fmt = '{:.3f}s'.format
+                    verb = 'took'
+                else:
+                    fmt = resources.format_nbytes
+                    verb = 'allocated'
+                if scope == 'part':
+                    usage_text = 'part {} {} {}'.format(partx, verb, fmt(used))
+                elif key == 'MAX_TIME':
+                    usage_text = 'parts took {} in total'.format(fmt(used))
+                else:
+                    usage_text = 'a part allocated {}'.format(fmt(used))
+                msg = '{} budget exceeded: {}, but the budget is {}'.format(
+                    key, usage_text, fmt(scaled_limit)
+                )
+                if scale != 1.0:
+                    msg += ' ({} scaled by budget_scale={})'.format(
+                        fmt(limit), scale
+                    )
+                raise exceptions.BudgetExceededError(
+                    msg, key=key, limit=scaled_limit, measured=used, scale=scale
+                )
+
     def failed_line_offset(self) -> int | None:
         """
         Determine which line in the doctest failed.
@@ -1554,6 +1850,7 @@ class DocTest:
                 (
                     checker.ExtractGotReprException,
                     exceptions.ExistingEventLoopError,
+                    exceptions.BudgetExceededError,
                 ),
             ):
                 # These exceptions conceptually belong to the currently failed
@@ -1594,6 +1891,64 @@ class DocTest:
             lineno = self.lineno + offset
             return lineno
 
+    def slowest_lines(
+        self, top: int | None = None
+    ) -> list[tuple[int, float, float, str]]:
+        """
+        The lines that took the most wall time in the last run.
+
+        If the ``line_timing`` option was enabled each statement is measured,
+        otherwise each part is reported at its first line.
+
+        Args:
+            top (int | None): maximum number of lines to return
+
+        Returns:
+            List[Tuple[int, float, float, str]]:
+                tuples of the line number (wrt the source file), wall time,
+                CPU time, and source text of each line, slowest first.
+
+        Example:
+            >>> from xdoctest.doctest_example import DocTest
+            >>> self = DocTest(utils.codeblock(
+            ...     '''
+            ...     >>> x = 1
+            ...     >>> y = sum(range(10000))
+            ...     >>> z = 3
+            ...     '''), lineno=10)
+            >>> self.config['line_timing'] = True
+            >>> summary = self.run(verbose=0)
+            >>> lines = self.slowest_lines()
+            >>> assert len(lines) == 3
+            >>> assert sorted(t[0] for t in lines) == [10, 11, 12]
+            >>> assert dict((t[0], t[3]) for t in lines)[11] == 'y = sum(range(10000))'
+        """
+        assert self._parts is not None
+        assert self.lineno is not None
+        rows = []
+        for partx, part_timer in self.part_times.items():
+            part = self._parts[partx]
+            start = self.lineno + part.line_offset
+            if part_timer.line_times:
+                for line, (wall, cpu) in part_timer.line_times.items():
+                    idx = line - 1
+                    if 0 <= idx < len(part.exec_lines):
+                        text = part.exec_lines[idx]
+                    else:
+                        text = ''
+                    rows.append((start + idx, wall, cpu, text.strip()))
+            else:
+                text = part.exec_lines[0] if part.exec_lines else ''
+                if part.n_exec_lines > 1:
+                    text += ' ...'
+                rows.append(
+                    (start, part_timer.wall, part_timer.cpu, text.strip())
+                )
+        rows = sorted(rows, key=lambda t: t[1], reverse=True)
+        if top is not None:
+            rows = rows[:top]
+        return rows
+
     def repr_failure(self, with_tb: typing.Any = True) -> list[str]:
         r"""
         Constructs lines detailing information about a failed doctest
@@ -1799,6 +2154,9 @@ class DocTest:
                 ),
                 ex_value_cast.output_repr_difference(self._runstate),
             ]
+        elif isinstance(ex_value, exceptions.BudgetExceededError):
+            # The traceback only points into xdoctest internals
+            lines += [str(ex_value)]
         else:
             if with_tb:
                 # TODO: enhance formatting to show an IPython-like output of
@@ -1986,6 +2344,14 @@ class DocTest:
                     lines = self.repr_failure()
                     text = '\n'.join(lines)
                     print(text)
+        if verbose >= 2 and self.config['line_timing'] and self.part_times:
+            print(self._color(self._block_prefix + ' SLOWEST LINES', 'white'))
+            for lineno, wall, cpu, text in self.slowest_lines(top=5):
+                print(
+                    '    {:0.4f}s wall {:0.4f}s cpu line {}: {}'.format(
+                        wall, cpu, lineno, text
+                    )
+                )
         if verbose >= 2:
             barrier = self._color('====== </exec> ======', 'white')
             print(barrier)
@@ -21,6 +21,36 @@ class ExistingEventLoopError(Exception):
     """
 
 
+class BudgetExceededError(Exception):
+    """
+    Exception raised when a doctest (or one of its parts) exceeds the time or
+    memory budget given by a ``MAX_TIME`` or ``MAX_MEMORY`` directive.
+    """
+
+    def __init__(
+        self,
+        msg: str,
+        key: str | None = None,
+        limit: float | None = None,
+        measured: float | None = None,
+        scale: float = 1.0,
+    ) -> None:
+        """
+        Args:
+            msg (str): error message
+            key (str | None): the budget directive that was exceeded
+            limit (float | None): the scaled budget (seconds or bytes)
+            measured (float | None): the measured value (seconds or bytes)
+            scale (float): the factor the budget in the directive was scaled by
+        """
+        super(BudgetExceededError, self).__init__(msg)
+        self.msg = msg
+        self.key = key
+        self.limit = limit
+        self.measured = measured
+        self.scale = scale
+
+
 class DoctestParseError(Exception):
     """
     Exception raised when doctest code has an error.
@@ -0,0 +1,509 @@
+"""
+Select doctests by the library code they execute (test-impact analysis).
+
+Editing implementation code does not touch any docstring, but it can still
+break doctests. With ``--record-impact`` the native runner records which
+lines of first-party files each doctest executes (see
+:mod:`xdoctest.monitoring`) and stores this footprint in the cache directory
+together with the git commit it was recorded at. A later run with
+``--impacted`` diffs that commit against the working tree and only runs:
+
+    * doctests whose footprint contains a changed line
+    * doctests whose own text changed
+    * doctests without a recorded footprint (e.g. new doctests)
+    * every doctest that executed a file, if a changed line of that file was
+      never executed by a function body (e.g. module-level code that runs at
+      import time, or new lines)
+
+If the footprint is stale (it is missing, was recorded in a checkout with
+uncommitted changes, or its commit no longer exists) everything is run.
+
+First-party files are the files inside the package (or for a single module,
+the directory) under test.
+
+CommandLine:
+    xdoctest -m xdoctest all --record-impact
+    # ... edit the implementation ...
+    xdoctest -m xdoctest all --impacted
+"""
+
+from __future__ import annotations
+
+import os
+import typing
+import warnings
+
+if typing.TYPE_CHECKING:
+    from xdoctest.changes import ChangeSet
+    from xdoctest.doctest_example import DocTest
+    from xdoctest.monitoring import LineRecorder
+
+
+def compress_lines(lines: typing.Iterable[int]) -> list[list[int]]:
+    """
+    Args:
+        lines (Iterable[int]): line numbers
+
+    Returns:
+        List[List[int]]: sorted inclusive ranges that cover the lines
+
+    Example:
+        >>> from xdoctest.impact import compress_lines, expand_lines
+        >>> compress_lines([7, 1, 2, 3, 5, 6])
+        [[1, 3], [5, 7]]
+        >>> sorted(expand_lines([[1, 3], [5, 7]]))
+        [1, 2, 3, 5, 6, 7]
+    """
+    spans: list[list[int]] = []
+    for lineno in sorted(set(lines)):
+        if spans and spans[-1][1] + 1 == lineno:
+            spans[-1][1] = lineno
+        else:
+            spans.append([lineno, lineno])
+    return spans
+
+
+def expand_lines(spans: typing.Iterable[typing.Sequence[int]]) -> set[int]:
+    """
+    Args:
+        spans (Iterable[Sequence[int]]): inclusive ranges of lines
+
+    Returns:
+        Set[int]: the line numbers in the ranges
+    """
+    return {lineno for start, end in spans for lineno in range(start, end + 1)}
+
+
+class ImpactMap:
+    """
+    The first-party lines executed by each doctest.
+
+    Doctests are keyed by :func:`xdoctest.sharding.shard_key` and paths are
+    stored relative to the root of the git checkout, so the map can be shared
+    between checkouts of the same repository.
+
+    Attributes:
+        fpath (str): the JSON file the map is stored in
+        commit (str | None): the commit the footprints were recorded at
+        dirty (bool): if the checkout had uncommitted changes
+        nodes (Dict[str, Dict[str, List[List[int]]]]): maps the keys of
+            doctests to the executed line ranges of each file
+        module_lines (Dict[str, List[List[int]]]): the executed line ranges
+            of module-level code in each file
+
+    Example:
+        >>> from xdoctest.impact import ImpactMap
+        >>> from xdoctest.changes import ChangeSet
+        >>> from xdoctest.doctest_example import DocTest
+        >>> self = ImpactMap('/does/not/exist')
+        >>> self.commit = 'abc123'
+        >>> self.nodes = {
+        ...     'mod::a:0': {'lib.py': [[10, 12]]},
+        ...     'mod::b:0': {'lib.py': [[20, 22]], 'other.py': [[2, 3]]},
+        ... }
+        >>> self.module_lines = {'lib.py': [[1, 3]]}
+        >>> # lib.py: module-level code, then a() on 9-13 and b() on 19-23
+        >>> body = ['    x = 1'] * 4
+        >>> sources = {
+        ...     'lib.py': '\\n'.join(['X = 1'] * 3 + [''] * 5 + ['def a():']
+        ...                         + body + [''] * 5 + ['def b():'] + body),
+        ...     'other.py': 'def other():\\n    x = 1\\n    y = 2\\n',
+        ... }
+        >>> def select(old_ranges):
+        ...     old = ChangeSet({'/repo/' + k: v for k, v in old_ranges.items()})
+        ...     new = ChangeSet({})
+        ...     examples = [DocTest('>>> pass', callname=n) for n in 'abc']
+        ...     for e in examples:
+        ...         e.modpath = e.fpath = 'mod.py'
+        ...         e.modname = 'mod'
+        ...     chosen = self.select(examples, old, new, '/repo', sources.get)
+        ...     return [e.callname for e in chosen]
+        >>> # c is always selected because it has no footprint
+        >>> select({'lib.py': [(11, 11)]})
+        ['a', 'c']
+        >>> # Changing the signature of a function selects its users
+        >>> select({'lib.py': [(9, 9)]})
+        ['a', 'c']
+        >>> select({'other.py': [(2, 3)]})
+        ['b', 'c']
+        >>> # A change to code that ran at import time selects everything
+        >>> select({'lib.py': [(2, 2)]})
+        ['a', 'b', 'c']
+        >>> select({'lib.py': [(5, 5)]})
+        ['c']
+        >>> select({'unused.py': [(1, 5)]})
+        ['c']
+        >>> # The import of other.py was not recorded
+        >>> select({'other.py': [(4, 4)]})
+        ['a', 'b', 'c']
+    """
+
+    fname = 'impact.json'
+    # Version 1 keyed the footprints on node ids, which contain the module path
+    version = 2
+
+    def __init__(self, dpath: str | None = None) -> None:
+        """
+        Args:
+            dpath (str | None): the cache directory. Defaults to
+                :func:`xdoctest.cache.default_cache_dpath`.
+        """
+        from xdoctest import cache
+
+        if dpath is None:
+            dpath = cache.default_cache_dpath()
+        self.fpath = os.path.join(dpath, self.fname)
+        data = cache.read_json(self.fpath, default={})
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            data = {}
+        self.commit: str | None = data.get('commit', None)
+        self.dirty: bool = data.get('dirty', False)
+        self.nodes: dict[str, dict[str, list[list[int]]]] = data.get(
+            'nodes', {}
+        )
+        self.module_lines: dict[str, list[list[int]]] = data.get(
+            'module_lines', {}
+        )
+
+    def staleness(self) -> str | None:
+        """
+        Returns:
+            str | None: the reason the map cannot be used or None if it is
+                usable
+        """
+        if not self.nodes:
+            return 'no footprints were recorded'
+        if self.commit is None:
+            return 'the footprints were not recorded in a git checkout'
+        if self.dirty:
+            return 'the footprints were recorded with uncommitted changes'
+        return None
+
+    def start_recording(self, commit: str | None, dirty: bool) -> None:
+        """
+        Prepare to record footprints at a commit. Footprints recorded at a
+        different commit are discarded.
+
+        Args:
+            commit (str | None): the current commit
+            dirty (bool): if the checkout has uncommitted changes
+        """
+        if commit != self.commit or dirty or self.dirty:
+            self.nodes = {}
+            self.module_lines = {}
+        self.commit = commit
+        self.dirty = dirty
+
+    def record(
+        self,
+        key: str,
+        lines: dict[str, set[int]],
+        module_lines: dict[str, set[int]],
+        root: str,
+    ) -> None:
+        """
+        Args:
+            key (str): the key of a doctest (see
+                :func:`xdoctest.sharding.shard_key`)
+            lines (Dict[str, Set[int]]): the lines its functions executed
+            module_lines (Dict[str, Set[int]]): the lines executed by
+                module-level code while it ran
+            root (str): the root of the git checkout
+        """
+        self.nodes[key] = {
+            os.path.relpath(fpath, root): compress_lines(linenos)
+            for fpath, linenos in lines.items()
+        }
+        for fpath, linenos in module_lines.items():
+            relpath = os.path.relpath(fpath, root)
+            known = expand_lines(self.module_lines.get(relpath, []))
+            self.module_lines[relpath] = compress_lines(known | linenos)
+
+    def save(self) -> None:
+        from xdoctest import cache
+
+        cache._save_json(
+            self.fpath,
+            {
+                'version': self.version,
+                'commit': self.commit,
+                'dirty': self.dirty,
+                'nodes': self.nodes,
+                'module_lines': self.module_lines,
+            },
+        )
+
+    def select(
+        self,
+        examples: list[DocTest],
+        old_changes: ChangeSet,
+        new_changes: ChangeSet,
+        root: str,
+        read_old: typing.Callable[[str], str | None],
+    ) -> list[DocTest]:
+        """
+        Select the doctests that may be affected by a change.
+
+        A changed line inside a function (including its decorators and
+        signature) affects the doctests that executed any line of the
+        outermost function around it. A changed line of module-level code
+        that ran at import time affects every doctest. If the file was
+        imported before the recording started, its import-time lines are
+        unknown and any change outside its functions affects every doctest.
+
+        Args:
+            examples (List[DocTest]): candidate doctests
+            old_changes (ChangeSet): changed lines numbered as in the
+                recorded commit
+            new_changes (ChangeSet): changed lines numbered as in the
+                working tree
+            root (str): the root of the git checkout
+            read_old (Callable[[str], str | None]): returns the source of a
+                file (given relative to the root) at the recorded commit
+
+        Returns:
+            List[DocTest]: the affected doctests in their original order
+        """
+        from xdoctest.changes import ChangeSet
+        from xdoctest.sharding import shard_key
+
+        root = ChangeSet._normalize(root)
+        affected: set[str] = set()
+        for fpath, spans in old_changes.ranges.items():
+            relpath = os.path.relpath(fpath, root)
+            key_lines = {
+                key: expand_lines(files[relpath])
+                for key, files in self.nodes.items()
+                if relpath in files
+            }
+            import_lines = expand_lines(self.module_lines.get(relpath, []))
+            if not key_lines and not import_lines:
+                continue
+            source = read_old(relpath)
+            func_spans = None if source is None else _function_spans(source)
+            if spans is None or func_spans is None:
+                affected.update(key_lines)
+                if import_lines:
+                    return list(examples)
+                continue
+            for lineno in expand_lines(spans):
+                for start, end in func_spans:
+                    if start <= lineno <= end:
+                        affected.update(
+                            key
+                            for key, linenos in key_lines.items()
+                            if any(start <= n <= end for n in linenos)
+                        )
+                        break
+                else:
+                    if not import_lines or lineno in import_lines:
+                        return list(examples)
+
+        own_changes = set(map(id, new_changes.select(examples)))
+        selected = [
+            example
+            for example in examples
+            if shard_key(example) not in self.nodes
+            or shard_key(example) in affected
+            or id(example) in own_changes
+        ]
+        return selected
+
+
+def _function_spans(source: str) -> list[tuple[int, int]] | None:
+    """
+    Find the lines of the outermost functions (and methods) in a module.
+
+    Args:
+        source (str): python source code
+
+    Returns:
+        List[Tuple[int, int]] | None: inclusive line ranges including the
+            decorators, or None if the code cannot be parsed
+
+    Example:
+        >>> from xdoctest.impact import _function_spans
+        >>> from xdoctest import utils
+        >>> source = utils.codeblock(
+        ...     '''
+        ...     X = 1
+        ...     @property
+        ...     def func():
+        ...         def inner():
+        ...             pass
+        ...     class Class:
+        ...         Y = 2
+        ...         def method(self):
+        ...             pass
+        ...     ''')
+        >>> _function_spans(source)
+        [(2, 5), (8, 9)]
+    """
+    import ast
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    spans = []
+    todo: list[ast.AST] = [tree]
+    while todo:
+        node = todo.pop()
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = min(
+                    [child.lineno] + [d.lineno for d in child.decorator_list]
+                )
+                end = getattr(child, 'end_lineno', None) or child.lineno
+                spans.append((start, end))
+            elif isinstance(child, ast.ClassDef):
+                todo.append(child)
+    return sorted(spans)
+
+
+class ImpactRecorder:
+    """
+    An example hook for the native runner that records the footprint of
+    each doctest into an :class:`ImpactMap`.
+    """
+
+    def __init__(self, impact_map: ImpactMap, include_dpath: str) -> None:
+        """
+        Args:
+            impact_map (ImpactMap): receives the footprints
+            include_dpath (str): only the files in this directory are
+                recorded
+        """
+        from xdoctest.changes import _git
+
+        self.impact_map = impact_map
+        self.include_dpath = os.path.realpath(include_dpath) + os.sep
+        try:
+            self.root = _git(
+                ['rev-parse', '--show-toplevel'], cwd=include_dpath
+            ).strip()
+            commit = _git(['rev-parse', 'HEAD'], cwd=self.root).strip()
+            status = _git(
+                ['status', '--porcelain', '--untracked-files=no'],
+                cwd=self.root,
+            )
+        except RuntimeError:
+            self.root = include_dpath
+            commit = None
+            status = ''
+        impact_map.start_recording(commit, dirty=bool(status.strip()))
+        self.recorder: LineRecorder | None = None
+
+    def _include(self, fpath: str) -> bool:
+        if fpath.startswith('<'):
+            return False
+        return os.path.realpath(fpath).startswith(self.include_dpath)
+
+    def start(self) -> None:
+        from xdoctest.monitoring import LineRecorder
+
+        self.recorder = LineRecorder(self._include)
+        if not self.recorder.start():
+            warnings.warn(
+                'Cannot record the impact of doctests while another trace '
+                'function is active'
+            )
+            self.recorder = None
+
+    def finish(self) -> None:
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+            self.impact_map.save()
+
+    def before_example(self, example: DocTest) -> None:
+        if self.recorder is not None:
+            self.recorder.reset()
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        if self.recorder is None:
+            return
+        from xdoctest.sharding import shard_key
+
+        lines, module_lines = self.recorder.reset()
+        self.impact_map.record(
+            shard_key(example), lines, module_lines, self.root
+        )
+
+
+def first_party_dpath(modpath: str) -> str:
+    """
+    Args:
+        modpath (str): the path to the module or package under test
+
+    Returns:
+        str: the top-level package directory of the module, or the directory
+            of a module that is not in a package
+
+    Example:
+        >>> import xdoctest
+        >>> from xdoctest.impact import first_party_dpath
+        >>> from xdoctest import runner
+        >>> from os.path import dirname
+        >>> assert first_party_dpath(runner.__file__) == dirname(xdoctest.__file__)
+    """
+    from xdoctest import static_analysis as static
+
+    modpath = os.path.abspath(modpath)
+    root, relpath = static.split_modpath(modpath, check=False)
+    parts = relpath.replace(os.sep, '/').split('/')
+    if len(parts) > 1 or os.path.isdir(modpath):
+        return os.path.join(root, parts[0])
+    return os.path.dirname(modpath)
+
+
+def select_impacted(
+    examples: list[DocTest], cwd: str, dpath: str | None = None
+) -> tuple[list[DocTest], str | None]:
+    """
+    Select the doctests affected by the changes since the footprints in the
+    cache directory were recorded.
+
+    Args:
+        examples (List[DocTest]): candidate doctests
+        cwd (str): a directory inside the git checkout
+        dpath (str | None): the cache directory
+
+    Returns:
+        Tuple[List[DocTest], str | None]: the selected doctests and, if all
+            doctests were selected because the footprints are stale, the
+            reason why
+    """
+    from xdoctest.changes import ChangeSet, _git
+
+    impact_map = ImpactMap(dpath)
+    reason = impact_map.staleness()
+    if reason is not None:
+        return list(examples), reason
+    assert impact_map.commit is not None
+    try:
+        root = _git(['rev-parse', '--show-toplevel'], cwd=cwd).strip()
+        old_changes = ChangeSet.from_git(impact_map.commit, root, side='old')
+        new_changes = ChangeSet.from_git(impact_map.commit, root, side='new')
+    except RuntimeError as ex:
+        return list(examples), str(ex)
+
+    def read_old(relpath: str) -> str | None:
+        try:
+            return _git(
+                ['show', '{}:{}'.format(impact_map.commit, relpath)], cwd=root
+            )
+        except RuntimeError:
+            return None
+
+    selected = impact_map.select(
+        examples, old_changes, new_changes, root, read_old
+    )
+    return selected, None
@@ -0,0 +1,220 @@
+"""
+Record finished doctests so an interrupted run can be resumed.
+
+With ``--journal PATH`` the runner appends one JSON line per finished doctest
+(its node id, status, duration, and failure report) to the journal. Each
+line is flushed and fsync'd before the next doctest starts, so the journal
+survives the process being killed (e.g. by the OOM killer or a preempted
+machine). A line that was only partially written when the process died is
+ignored.
+
+With ``--resume`` the doctests in the journal are not run again. Their
+recorded results are merged into the summary of the new run, which appends
+to the same journal. Without ``--resume`` the journal is started over.
+
+CommandLine:
+    xdoctest -m xdoctest all --journal nightly.jsonl
+    # After an interruption only the remaining doctests run
+    xdoctest -m xdoctest all --journal nightly.jsonl --resume
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+
+def load(fpath: str) -> dict[str, dict[str, typing.Any]]:
+    """
+    Read the results recorded in a journal.
+
+    Args:
+        fpath (str): the journal
+
+    Returns:
+        Dict[str, Dict]: maps node ids to the last recorded result. Empty if
+            the journal does not exist.
+
+    Example:
+        >>> from xdoctest.journal import load
+        >>> from xdoctest import utils
+        >>> from os.path import join
+        >>> with utils.TempDir() as temp:
+        ...     fpath = join(temp.dpath, 'journal.jsonl')
+        ...     with open(fpath, 'w') as file:
+        ...         _ = file.write('{"node": "a", "status": "passed"}\\n')
+        ...         _ = file.write('{"node": "b", "stat')
+        ...     records = load(fpath)
+        >>> list(records)
+        ['a']
+    """
+    records: dict[str, dict[str, typing.Any]] = {}
+    if not os.path.exists(fpath):
+        return records
+    with open(fpath, encoding='utf8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The process died while it wrote this line
+                continue
+            if isinstance(record, dict) and 'node' in record:
+                records[record['node']] = record
+    return records
+
+
+class Journal:
+    """
+    Appends the result of each doctest to a journal.
+
+    This is an example hook for the native runner.
+
+    Attributes:
+        fpath (str): the journal
+        resume (bool): if True, append to the journal, otherwise start over
+
+    Example:
+        >>> from xdoctest.journal import Journal, load
+        >>> from xdoctest.doctest_example import DocTest
+        >>> from xdoctest import utils
+        >>> from os.path import join
+        >>> example = DocTest('>>> pass', callname='func')
+        >>> with utils.TempDir() as temp:
+        ...     self = Journal(join(temp.dpath, 'journal.jsonl'))
+        ...     self.start()
+        ...     self.before_example(example)
+        ...     summary = example.run(verbose=0)
+        ...     self.after_example(example, summary)
+        ...     self.finish()
+        ...     records = load(self.fpath)
+        >>> records[example.node]['status']
+        'passed'
+    """
+
+    def __init__(self, fpath: str, resume: bool = False) -> None:
+        """
+        Args:
+            fpath (str): the journal
+            resume (bool): if True, append to an existing journal
+        """
+        self.fpath = fpath
+        self.resume = resume
+        self._file: typing.TextIO | None = None
+        self._tic: float | None = None
+
+    def start(self) -> None:
+        dpath = os.path.dirname(self.fpath)
+        if dpath:
+            os.makedirs(dpath, exist_ok=True)
+        self._file = open(
+            self.fpath, 'a' if self.resume else 'w', encoding='utf8'
+        )
+
+    def finish(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(
+        self,
+        node: str,
+        status: str,
+        duration: float,
+        failure: list[str] | None = None,
+    ) -> None:
+        """
+        Durably append a result.
+
+        Args:
+            node (str): the node id of the doctest
+            status (str): ``'passed'``, ``'failed'``, or ``'skipped'``
+            duration (float): seconds the doctest took
+            failure (List[str] | None): the failure report
+        """
+        assert self._file is not None
+        record: dict[str, typing.Any] = {
+            'node': node,
+            'status': status,
+            'duration': duration,
+        }
+        if failure:
+            record['failure'] = failure
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def before_example(self, example: DocTest) -> None:
+        self._tic = time.perf_counter()
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`, or in
+                queue mode a result from a worker, which includes the
+                ``failure`` report of a failed doctest
+        """
+        if summary is None:
+            # The doctest raised instead of reporting a result
+            return
+        if 'duration' in summary:
+            duration = summary['duration']
+        elif self._tic is not None:
+            duration = time.perf_counter() - self._tic
+        else:
+            duration = 0.0
+        self._tic = None
+        failure = None
+        if summary['failed']:
+            status = 'failed'
+            failure = summary.get('failure', None)
+            if failure is None:
+                failure = example.repr_failure()
+        elif summary['skipped']:
+            status = 'skipped'
+        else:
+            status = 'passed'
+        self.record(example.node, status, duration, failure)
+
+
+def merge(
+    run_summary: dict[str, typing.Any],
+    examples: list[DocTest],
+    records: dict[str, dict[str, typing.Any]],
+) -> dict[str, typing.Any]:
+    """
+    Add the results of doctests completed by an earlier run to a run summary.
+
+    Args:
+        run_summary (Dict[str, Any]): the summary of the doctests that ran
+        examples (List[DocTest]): the doctests that were not run again
+        records (Dict[str, Dict]): the results from :func:`load`
+
+    Returns:
+        Dict[str, Any]: counts of the merged results by status
+    """
+    from xdoctest.workqueue import RemoteFailure
+
+    counts = {'passed': 0, 'failed': 0, 'skipped': 0}
+    for example in examples:
+        record = records[example.node]
+        status = record['status']
+        counts[status] = counts.get(status, 0) + 1
+        if status == 'failed':
+            run_summary['failed'].append(
+                RemoteFailure(example, record.get('failure', []))
+            )
+    run_summary['n_passed'] = run_summary.get('n_passed', 0) + counts['passed']
+    run_summary['n_failed'] = run_summary.get('n_failed', 0) + counts['failed']
+    run_summary['n_skipped'] = (
+        run_summary.get('n_skipped', 0) + counts['skipped']
+    )
+    run_summary['n_total'] = run_summary.get('n_total', 0) + len(examples)
+    return counts
@@ -0,0 +1,221 @@
+"""
+Record which source lines run while a doctest executes.
+
+On Python 3.12+ the :class:`LineRecorder` uses :mod:`sys.monitoring` line
+events. Each location reports once and then disables itself, so code that
+runs in a loop costs (almost) nothing after its first iteration.
+:func:`LineRecorder.reset` re-enables all locations, which is done between
+doctests so each doctest sees its own footprint. Older versions fall back to
+:func:`sys.settrace`, which only installs a line tracer in the frames of
+included files, but is considerably slower. The fallback is not used when
+another trace function (e.g. a debugger or coverage) is active.
+
+Lines executed by module-level and class-level code (i.e. while a module is
+imported) are kept apart from the others, because they only run for the
+first doctest that imports the module.
+
+With :mod:`sys.monitoring` the recorder can also record which way each
+conditional branch went. A branch location is disabled once both of its
+directions were seen.
+
+Example:
+    >>> from xdoctest.monitoring import LineRecorder
+    >>> from xdoctest import utils
+    >>> import xdoctest.demo as demo
+    >>> self = LineRecorder(lambda fpath: fpath == demo.__file__, branches=True)
+    >>> started = self.start()
+    >>> try:
+    ...     with utils.CaptureStdout():
+    ...         demo.myfunc()
+    ... finally:
+    ...     self.stop()
+    >>> lines, module_lines = self.reset()
+    >>> # Recording is not possible under a debugger or coverage tool
+    >>> assert not started or len(lines[demo.__file__]) > 0
+    >>> assert self.backend == 'monitoring' or not self.arcs
+"""
+
+from __future__ import annotations
+
+import inspect
+import sys
+import threading
+import typing
+
+
+class LineRecorder:
+    """
+    Collects the lines executed in included files.
+
+    Attributes:
+        include (Callable[[str], bool]): decides if the lines of a file (given
+            by the ``co_filename`` of the executing code) are recorded
+        backend (str): ``'monitoring'`` or ``'settrace'``
+        lines (Dict[str, Set[int]]): executed lines of function bodies
+        module_lines (Dict[str, Set[int]]): executed lines of module-level
+            and class-level code
+        arcs (Dict[CodeType, Set[Tuple[int, int]]]): maps code objects to the
+            (instruction offset, destination offset) pairs of the branches
+            they took. Only recorded by the ``'monitoring'`` backend.
+    """
+
+    def __init__(
+        self,
+        include: typing.Callable[[str], bool],
+        backend: str = 'auto',
+        branches: bool = False,
+    ) -> None:
+        """
+        Args:
+            include (Callable[[str], bool]): filter on the file names
+            backend (str): ``'monitoring'``, ``'settrace'``, or ``'auto'``,
+                which uses :mod:`sys.monitoring` when it is available
+            branches (bool): if True, also record branches (only supported
+                by the ``'monitoring'`` backend)
+        """
+        if backend == 'auto':
+            backend = 'monitoring' if hasattr(sys, 'monitoring') else 'settrace'
+        if backend not in {'monitoring', 'settrace'}:
+            raise KeyError(backend)
+        self.include = include
+        self.backend = backend
+        self.branches = branches and backend == 'monitoring'
+        self.lines: dict[str, set[int]] = {}
+        self.module_lines: dict[str, set[int]] = {}
+        self.arcs: dict[typing.Any, set[tuple[int, int]]] = {}
+        self._included: dict[str, bool] = {}
+        self._tool_id: int | None = None
+        self._tracing = False
+
+    def _is_included(self, fpath: str) -> bool:
+        flag = self._included.get(fpath, None)
+        if flag is None:
+            flag = bool(self.include(fpath))
+            self._included[fpath] = flag
+        return flag
+
+    def _record(self, code: typing.Any, lineno: int) -> None:
+        # Only function bodies use fast locals
+        if not code.co_flags & inspect.CO_OPTIMIZED:
+            target = self.module_lines
+        else:
+            target = self.lines
+        fpath = code.co_filename
+        if fpath in target:
+            target[fpath].add(lineno)
+        else:
+            target[fpath] = {lineno}
+
+    def start(self) -> bool:
+        """
+        Start recording in all threads.
+
+        Returns:
+            bool: False if recording is not possible because all
+                :mod:`sys.monitoring` tool ids are taken or another trace
+                function is active
+        """
+        if self.backend == 'monitoring':
+            from xdoctest import timing
+
+            mon = sys.monitoring  # type: ignore[attr-defined]
+            tool_id = timing._free_monitoring_tool_id()
+            if tool_id is None:
+                return False
+            mon.use_tool_id(tool_id, 'xdoctest.monitoring')
+            mon.register_callback(tool_id, mon.events.LINE, self._on_line)
+            events = mon.events.LINE
+            for event in self._branch_events():
+                mon.register_callback(tool_id, event, self._on_branch)
+                events |= event
+            mon.set_events(tool_id, events)
+            mon.restart_events()
+            self._tool_id = tool_id
+        else:
+            if sys.gettrace() is not None:
+                # Do not clobber a debugger or coverage tool
+                return False
+            threading.settrace(self._on_call)
+            sys.settrace(self._on_call)
+            self._tracing = True
+        return True
+
+    def stop(self) -> None:
+        """
+        Stop recording. The recorded lines are kept.
+        """
+        if self.backend == 'monitoring':
+            if self._tool_id is not None:
+                mon = sys.monitoring  # type: ignore[attr-defined]
+                mon.set_events(self._tool_id, 0)
+                mon.register_callback(self._tool_id, mon.events.LINE, None)
+                for event in self._branch_events():
+                    mon.register_callback(self._tool_id, event, None)
+                mon.free_tool_id(self._tool_id)
+                self._tool_id = None
+        elif self._tracing:
+            sys.settrace(None)
+            threading.settrace(None)  # type: ignore[arg-type]
+            self._tracing = False
+
+    def reset(self) -> tuple[dict[str, set[int]], dict[str, set[int]]]:
+        """
+        Return the recorded lines, forget them, and re-enable the reporting
+        of every location. Recorded branches are kept.
+
+        Returns:
+            Tuple[Dict[str, Set[int]], Dict[str, Set[int]]]: the executed lines
+                of functions and of module-level and class-level code
+        """
+        lines, module_lines = self.lines, self.module_lines
+        self.lines = {}
+        self.module_lines = {}
+        if self._tool_id is not None:
+            sys.monitoring.restart_events()  # type: ignore[attr-defined]
+        return lines, module_lines
+
+    def _branch_events(self) -> list[int]:
+        if not self.branches:
+            return []
+        events = sys.monitoring.events  # type: ignore[attr-defined]
+        if hasattr(events, 'BRANCH_LEFT'):
+            # Python 3.14+ reports each direction as a separate location
+            return [events.BRANCH_LEFT, events.BRANCH_RIGHT]
+        return [events.BRANCH]
+
+    def _on_branch(
+        self, code: typing.Any, offset: int, dest: int
+    ) -> typing.Any:
+        # sys.monitoring callback
+        if not self._is_included(code.co_filename):
+            return sys.monitoring.DISABLE  # type: ignore[attr-defined]
+        arcs = self.arcs.get(code, None)
+        if arcs is None:
+            arcs = self.arcs[code] = set()
+        arcs.add((offset, dest))
+        if len(self._branch_events()) > 1:
+            return sys.monitoring.DISABLE  # type: ignore[attr-defined]
+        # Before 3.14 both directions share one location, which can only be
+        # disabled once both were seen.
+        n_seen = sum(1 for arc in arcs if arc[0] == offset)
+        if n_seen > 1:
+            return sys.monitoring.DISABLE  # type: ignore[attr-defined]
+        return None
+
+    def _on_line(self, code: typing.Any, lineno: int) -> typing.Any:
+        # sys.monitoring callback
+        if self._is_included(code.co_filename):
+            self._record(code, lineno)
+        return sys.monitoring.DISABLE  # type: ignore[attr-defined]
+
+    def _on_call(self, frame, event, arg) -> typing.Any:
+        # settrace global trace function
+        if event == 'call' and self._is_included(frame.f_code.co_filename):
+            return self._on_local
+        return None
+
+    def _on_local(self, frame, event, arg) -> typing.Any:
+        # settrace local trace function
+        if event == 'line':
+            self._record(frame.f_code, frame.f_lineno)
+        return self._on_local
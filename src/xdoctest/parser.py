@@ -50,7 +50,14 @@ import sys
 import tokenize
 import typing
 
-from xdoctest import directive, doctest_part, exceptions, global_state, utils
+from xdoctest import (
+    directive,
+    doctest_part,
+    exceptions,
+    global_state,
+    timing,
+    utils,
+)
 from xdoctest import static_analysis as static
 
 INDENT_RE = re.compile(r'^([ ]*)(?=\S)', re.MULTILINE)
@@ -186,10 +193,14 @@ class DoctestParser:
         labeled_lines = None
         grouped_lines = None
         all_parts = None
+        span_key = None
+        if info is not None:
+            span_key = info.get('modpath', None) or info.get('fpath', None)
         try:
-            labeled_lines = self._label_docsrc_lines(string)
-            grouped_lines = self._group_labeled_lines(labeled_lines)
-            all_parts = list(self._package_groups(grouped_lines))
+            with timing.span('parse', span_key):
+                labeled_lines = self._label_docsrc_lines(string)
+                grouped_lines = self._group_labeled_lines(labeled_lines)
+                all_parts = list(self._package_groups(grouped_lines))
         except Exception as orig_ex:
             if labeled_lines is None:
                 failpoint = '_label_docsrc_lines'
@@ -17,6 +17,7 @@ https://github.com/pytest-dev/pytest
 
 from __future__ import annotations
 
+import time
 import typing
 from typing import cast
 
@@ -87,6 +88,161 @@ def pytest_configure(config) -> None:
         for incompatible in _INCOMPATIBLE_PLUGINS.intersection(all_plugins):
             manager.unregister(all_plugins[incompatible])
 
+    # Only run one shard of the doctests
+    config._xdoctest_shard = None
+    config._xdoctest_shard_info = None
+    shard = getattr(config.option, 'xdoctest_shard', None)
+    if shard is not None:
+        from xdoctest import sharding
+
+        try:
+            config._xdoctest_shard = sharding.parse_shard(shard)
+        except ValueError as ex:
+            raise pytest.UsageError(str(ex))
+
+    # Share the duration history of the native runner
+    config._xdoctest_history = None
+    shard_by_duration = shard is not None and (
+        getattr(config.option, 'xdoctest_shard_strategy', 'hash') == 'duration'
+    )
+    if (
+        getattr(config.option, 'xdoctest_duration_history', False)
+        or getattr(config.option, 'xdoctest_longest_first', False)
+        or shard_by_duration
+    ):
+        from xdoctest import cache
+
+        config._xdoctest_history = cache.DurationHistory(
+            config.getoption('xdoctest_cache_dir')
+        )
+
+    # Only collect the doctests that changed since a git revision
+    config._xdoctest_changes = None
+    changed_since = getattr(config.option, 'xdoctest_changed_since', None)
+    if changed_since is not None:
+        from xdoctest.changes import ChangeSet
+
+        try:
+            config._xdoctest_changes = ChangeSet.from_git(
+                changed_since, cwd=str(config.rootdir)
+            )
+        except RuntimeError as ex:
+            raise pytest.UsageError(str(ex))
+
+    # Example hooks that are called around each doctest
+    config._xdoctest_hooks = []
+    profile_dir = getattr(config.option, 'xdoctest_profile_dir', None)
+    if getattr(config.option, 'xdoctest_profile', False) or profile_dir:
+        from xdoctest import profiling
+
+        profiler = profiling.DoctestProfiler(
+            profile_dir or 'prof', tag=_xdist_worker_id(config)
+        )
+        profiler.start()
+        config._xdoctest_hooks.append(profiler)
+
+    # Write a timeline, one file per xdist worker
+    config._xdoctest_trace_writer = None
+    trace_fpath = getattr(config.option, 'xdoctest_trace_events', None)
+    if trace_fpath is not None:
+        from xdoctest import trace_events
+
+        config._xdoctest_trace_writer = trace_events.TraceEventWriter(
+            trace_fpath, tag=_xdist_worker_id(config)
+        )
+        config._xdoctest_trace_writer.start()
+
+
+def _xdist_worker_id(config) -> str | None:
+    """
+    Returns:
+        str | None: the id of the pytest-xdist worker (e.g. ``gw0``) this
+            process runs or None if it is not a worker
+    """
+    workerinput = getattr(config, 'workerinput', None)
+    if workerinput is None:
+        return None
+    return workerinput.get('workerid', None)
+
+
+def pytest_unconfigure(config) -> None:
+    history = getattr(config, '_xdoctest_history', None)
+    if history is not None:
+        history.save()
+    for hook in getattr(config, '_xdoctest_hooks', []):
+        hook.finish()
+    trace_writer = getattr(config, '_xdoctest_trace_writer', None)
+    if trace_writer is not None:
+        trace_writer.finish()
+
+
+def pytest_collection_modifyitems(session, config, items) -> None:
+    """
+    Deselect the xdoctest items of other shards and reorder xdoctest items so
+    the longest expected run first. Other items keep their positions.
+    """
+    shard = getattr(config, '_xdoctest_shard', None)
+    if shard is not None:
+        _select_shard(config, items, *shard)
+    history = getattr(config, '_xdoctest_history', None)
+    if history is None or not config.getoption('xdoctest_longest_first'):
+        return
+    slots = [
+        i for i, item in enumerate(items) if isinstance(item, XDoctestItem)
+    ]
+    dtest_to_item = {items[i].dtest: items[i] for i in slots}
+    ordered = history.order([items[i].dtest for i in slots])
+    for i, dtest in zip(slots, ordered):
+        items[i] = dtest_to_item[dtest]
+
+
+def _select_shard(config, items, index: int, count: int) -> None:
+    from xdoctest import sharding
+
+    strategy = config.getoption('xdoctest_shard_strategy')
+    dtests = [item.dtest for item in items if isinstance(item, XDoctestItem)]
+    assignment = sharding.assign(
+        dtests, count, strategy, config._xdoctest_history
+    )
+    keep = {id(d) for d, s in zip(dtests, assignment) if s == index}
+    selected = []
+    deselected = []
+    for item in items:
+        if isinstance(item, XDoctestItem) and id(item.dtest) not in keep:
+            deselected.append(item)
+        else:
+            selected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+    info = sharding.make_report(
+        dtests,
+        [d for d in dtests if id(d) in keep],
+        index,
+        count,
+        strategy,
+    )
+    report_fpath = config.getoption('xdoctest_shard_report')
+    if report_fpath is not None:
+        sharding.dump_report(info, report_fpath)
+        info['fpath'] = report_fpath
+    config._xdoctest_shard_info = info
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config) -> None:
+    info = getattr(config, '_xdoctest_shard_info', None)
+    if info is None:
+        return
+    text = 'xdoctest shard {}: {} of {} doctests, suite digest {}'.format(
+        info['shard'],
+        len(info['nodes']),
+        info['n_suite'],
+        info['suite_digest'][:12],
+    )
+    if 'fpath' in info:
+        text += ', report: {}'.format(info['fpath'])
+    terminalreporter.write_line(text)
+
 
 def pytest_addoption(parser) -> None:
     # TODO: make this programmatically mirror the argparse in __main__
@@ -156,6 +312,131 @@ def pytest_addoption(parser) -> None:
         dest='xdoctest_analysis',
     )
 
+    group.addoption(
+        '--xdoctest-cache-dir',
+        '--xdoc-cache-dir',
+        type=str,
+        default=None,
+        help=(
+            'Directory that stores information between runs. '
+            'Defaults to .xdoctest_cache or $XDOCTEST_CACHE_DIR'
+        ),
+        dest='xdoctest_cache_dir',
+    )
+
+    group.addoption(
+        '--xdoctest-duration-history',
+        '--xdoc-duration-history',
+        action='store_true',
+        default=False,
+        help=(
+            'Keep a moving average of the duration of each doctest in the '
+            'cache directory (shared with the native runner)'
+        ),
+        dest='xdoctest_duration_history',
+    )
+
+    group.addoption(
+        '--xdoctest-longest-first',
+        '--xdoc-longest-first',
+        action='store_true',
+        default=False,
+        help=(
+            'Run the doctests that took longest in previous runs first. '
+            'Implies --xdoctest-duration-history'
+        ),
+        dest='xdoctest_longest_first',
+    )
+
+    group.addoption(
+        '--xdoctest-changed-since',
+        '--xdoc-changed-since',
+        type=str,
+        default=None,
+        metavar='REV',
+        help=(
+            'Only collect doctests with lines that differ between the git '
+            'revision REV and the working tree'
+        ),
+        dest='xdoctest_changed_since',
+    )
+
+    group.addoption(
+        '--xdoctest-shard',
+        '--xdoc-shard',
+        type=str,
+        default=None,
+        metavar='INDEX/COUNT',
+        help=(
+            'Split the doctests into COUNT deterministic shards and only run '
+            'shard INDEX (counting from 1)'
+        ),
+        dest='xdoctest_shard',
+    )
+
+    group.addoption(
+        '--xdoctest-shard-strategy',
+        '--xdoc-shard-strategy',
+        type=str_lower,
+        default='hash',
+        choices=['hash', 'duration'],
+        help=(
+            'Assign doctests to shards by a stable hash of their name or by '
+            'balancing their recorded durations'
+        ),
+        dest='xdoctest_shard_strategy',
+    )
+
+    group.addoption(
+        '--xdoctest-shard-report',
+        '--xdoc-shard-report',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='Write the doctests covered by the shard to a JSON file',
+        dest='xdoctest_shard_report',
+    )
+
+    group.addoption(
+        '--xdoctest-profile',
+        '--xdoc-profile',
+        action='store_true',
+        default=False,
+        help=(
+            'Profile the user code of each doctest with cProfile. Each '
+            'pytest-xdist worker merges its profiles into a file named after '
+            'its worker id'
+        ),
+        dest='xdoctest_profile',
+    )
+
+    group.addoption(
+        '--xdoctest-profile-dir',
+        '--xdoc-profile-dir',
+        type=str,
+        default=None,
+        metavar='DIR',
+        help=(
+            'Directory for --xdoctest-profile results. Defaults to prof. '
+            'Implies --xdoctest-profile'
+        ),
+        dest='xdoctest_profile_dir',
+    )
+
+    group.addoption(
+        '--xdoctest-trace-events',
+        '--xdoc-trace-events',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help=(
+            'Write a timeline of the doctests in the Chrome trace event '
+            'format. pytest-xdist workers insert their worker id before the '
+            'extension. See xdoctest.trace_events.merge_traces'
+        ),
+        dest='xdoctest_trace_events',
+    )
+
     from xdoctest import doctest_example
 
     doctest_example.DoctestConfig()._update_argparse_cli(
@@ -188,6 +469,9 @@ else:
 
 def _pytest_collect_file(file_path, parent, **path_args):
     config = parent.config
+    changes = getattr(config, '_xdoctest_changes', None)
+    if changes is not None and str(file_path) not in changes:
+        return None
     if _suffix(file_path) == '.py':
         if config.option.xdoctestmodules:
             if hasattr(XDoctestModule, 'from_parent'):
@@ -313,7 +597,23 @@ class XDoctestItem(pytest.Item):
         if self.dtest.is_disabled(pytest=True):
             pytest.skip('doctest encountered global skip directive')
         # verbose = self.dtest.config['verbose']
-        self.dtest.run(on_error='raise')
+        history = getattr(self.config, '_xdoctest_history', None)
+        hooks = getattr(self.config, '_xdoctest_hooks', [])
+        for hook in hooks:
+            hook.before_example(self.dtest)
+        tic = time.perf_counter()
+        summary = None
+        try:
+            summary = self.dtest.run(on_error='raise')
+        finally:
+            for hook in hooks:
+                hook.after_example(self.dtest, summary)
+            if history is not None and self.dtest.anything_ran():
+                from xdoctest import sharding
+
+                history.update(
+                    sharding.shard_key(self.dtest), time.perf_counter() - tic
+                )
         if not self.dtest.anything_ran():
             pytest.skip('doctest is empty or all parts were skipped')
 
@@ -389,15 +689,19 @@ class XDoctestTextfile(_XDoctestBase):
         _example_iter = core.parse_docstr_examples(
             text, name, fpath=filename, style=style
         )
+        changes = getattr(self.config, '_xdoctest_changes', None)
+        if changes is not None:
+            _example_iter = iter(changes.select(_example_iter))
 
         for dtest in _example_iter:
             dtest.global_namespace.update(global_namespace)
             dtest.config.update(self._examp_conf)
             if hasattr(XDoctestItem, 'from_parent'):
-                yield XDoctestItem.from_parent(self, name=name, dtest=dtest)
+                item = XDoctestItem.from_parent(self, name=name, dtest=dtest)
             else:
                 # direct construction is deprecated
-                yield XDoctestItem(name, self, dtest=dtest)
+                item = XDoctestItem(name, self, dtest=dtest)
+            yield _mark_static_skip(item)
 
 
 class XDoctestModule(_XDoctestBase):
@@ -410,9 +714,12 @@ class XDoctestModule(_XDoctestBase):
         analysis = self.config.getvalue('xdoctest_analysis')
         self._prepare_internal_config()
 
+        changes = getattr(self.config, '_xdoctest_changes', None)
         try:
             examples = list(
-                core.parse_doctestables(modpath, style=style, analysis=analysis)
+                core.parse_doctestables(
+                    modpath, style=style, analysis=analysis, changes=changes
+                )
             )
         except SyntaxError:
             if self.config.getvalue('xdoctest_ignore_syntax_errors'):
@@ -424,10 +731,22 @@ class XDoctestModule(_XDoctestBase):
             dtest.config.update(self._examp_conf)
             name = dtest.unique_callname
             if hasattr(XDoctestItem, 'from_parent'):
-                yield XDoctestItem.from_parent(self, name=name, dtest=dtest)
+                item = XDoctestItem.from_parent(self, name=name, dtest=dtest)
             else:
                 # direct construction is deprecated
-                yield XDoctestItem(name, self, dtest=dtest)
+                item = XDoctestItem(name, self, dtest=dtest)
+            yield _mark_static_skip(item)
+
+
+def _mark_static_skip(item: XDoctestItem) -> XDoctestItem:
+    """
+    Mark an item as skipped if the directives of its doctest skip all of it,
+    so it is skipped before its fixtures are set up.
+    """
+    reason = item.dtest.static_skip_reason()
+    if reason is not None:
+        item.add_marker(pytest.mark.skip(reason=reason))
+    return item
 
 
 def _setup_fixtures(xdoctest_item: XDoctestItem) -> fixtures.FixtureRequest:
@@ -0,0 +1,502 @@
+"""
+Profiling support for the native xdoctest runner.
+
+The :class:`DoctestProfiler` uses :mod:`cProfile` to profile only the user
+code executed by each doctest. The profiler is enabled when a doctest part
+starts executing and disabled when it finishes, so time spent by xdoctest
+itself (parsing, compiling, checking) does not appear in the results.
+
+Each doctest gets its own ``.prof`` file and all of them are merged into a
+single ``combined.prof`` that can be inspected with :mod:`pstats`, snakeviz,
+or similar tools. Per-doctest file names include the process id and the
+merged file name can be tagged, so several worker processes can safely write
+into the same directory. Queue workers (see :mod:`xdoctest.workqueue`) tag
+their files with the worker name and pytest-xdist workers with their worker
+id.
+
+Deterministic profiling adds overhead to every function call, which distorts
+timings of numeric code. The :class:`SamplingProfiler` instead periodically
+records the stack of the running doctest from a background thread and writes
+collapsed stacks that can be rendered with standard flamegraph tools.
+
+CommandLine:
+    xdoctest -m xdoctest.profiling all --profile --profile-dir=prof
+    xdoctest -m xdoctest.profiling all --sample-profile=1000
+    flamegraph.pl prof/samples.collapsed > flamegraph.svg
+    xdoctest worker --connect coordinator-host:7878 --profile
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import re
+import typing
+from os.path import join
+
+if typing.TYPE_CHECKING:
+    import cProfile
+
+    from xdoctest.doctest_example import DocTest
+
+
+def _safe_fname(text: str) -> str:
+    """
+    Convert a doctest node into something usable as a file name.
+
+    Args:
+        text (str): a doctest node or callname
+
+    Returns:
+        str
+
+    Example:
+        >>> from xdoctest.profiling import _safe_fname
+        >>> print(_safe_fname('/path/to/mod.py::Foo.bar:0'))
+        path_to_mod.py_Foo.bar_0
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', text).strip('_')
+
+
+class DoctestProfiler:
+    """
+    Profiles the user code of each doctest separately.
+
+    This is a :mod:`xdoctest.timing` span listener: it enables the current
+    :class:`cProfile.Profile` on entering an ``exec`` span and disables it on
+    exit.
+
+    Attributes:
+        dpath (str): directory where ``.prof`` files are written
+        profiles (Dict[DocTest, cProfile.Profile]): profile for each doctest
+        fpaths (Dict[DocTest, str]): the ``.prof`` file for each doctest
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.core import parse_docstr_examples
+        >>> from xdoctest.profiling import DoctestProfiler
+        >>> docstr = utils.codeblock(
+        ...     '''
+        ...     >>> def work():
+        ...     ...     return sum(range(1000))
+        ...     >>> work()
+        ...     499500
+        ...     ''')
+        >>> example = next(parse_docstr_examples(docstr, 'work'))
+        >>> with utils.TempDir() as temp:
+        ...     self = DoctestProfiler(temp.dpath)
+        ...     self.start()
+        ...     self.before_example(example)
+        ...     summary = example.run(verbose=0)
+        ...     self.after_example(example)
+        ...     merged_fpath = self.finish()
+        ...     import os
+        ...     assert os.path.exists(merged_fpath)
+        ...     assert os.path.exists(self.fpaths[example])
+        >>> text = self.format_stats(example)
+        >>> assert 'work' in text
+    """
+
+    def __init__(
+        self,
+        dpath: str = 'prof',
+        n_entries: int = 10,
+        tag: str | None = None,
+    ) -> None:
+        """
+        Args:
+            dpath (str): directory to write ``.prof`` files to
+            n_entries (int): number of cumulative entries shown per doctest
+            tag (str | None): if specified, included in the name of the merged
+                file so several worker processes can share one directory.
+        """
+        self.dpath = dpath
+        self.tag = tag
+        self.n_entries = n_entries
+        self.profiles: dict[DocTest, cProfile.Profile] = {}
+        self.fpaths: dict[DocTest, str] = {}
+        self.merged_fpath: str | None = None
+        self._current: cProfile.Profile | None = None
+
+    def start(self) -> None:
+        """
+        Start listening to doctest execution spans
+        """
+        from xdoctest import timing
+        from xdoctest.utils import util_path
+
+        util_path.ensuredir(self.dpath, mode=0o755)
+        timing.add_listener(self)
+
+    def stop(self) -> None:
+        """
+        Stop listening to doctest execution spans
+        """
+        from xdoctest import timing
+
+        timing.remove_listener(self)
+
+    def enter(self, span: typing.Any) -> None:
+        if span.phase == 'exec' and self._current is not None:
+            try:
+                self._current.enable()
+            except ValueError:
+                # Another profiler is already active (e.g. a doctest that
+                # runs doctests). Leave the outer profiler in charge.
+                pass
+
+    def exit(self, span: typing.Any) -> None:
+        if span.phase == 'exec' and self._current is not None:
+            self._current.disable()
+
+    def before_example(self, example: DocTest) -> None:
+        """
+        Args:
+            example (DocTest): the doctest about to run
+        """
+        import cProfile
+
+        self._current = cProfile.Profile()
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Write the profile of the doctest that just finished.
+
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        profile = self._current
+        self._current = None
+        if profile is None:
+            return
+        profile.create_stats()
+        if not profile.stats:  # type: ignore[attr-defined]
+            # Nothing was recorded (e.g. every part was skipped)
+            return
+        self.profiles[example] = profile
+        fname = '{}.{}.prof'.format(_safe_fname(example.node), os.getpid())
+        fpath = join(self.dpath, fname)
+        profile.dump_stats(fpath)
+        self.fpaths[example] = fpath
+
+    def finish(self) -> str | None:
+        """
+        Stop profiling and merge all per-doctest profiles.
+
+        Returns:
+            str | None: path to the merged pstats file if anything ran
+        """
+        import pstats
+
+        self.stop()
+        fpaths = list(self.fpaths.values())
+        if not fpaths:
+            return None
+        merged = pstats.Stats(fpaths[0], stream=io.StringIO())
+        for fpath in fpaths[1:]:
+            merged.add(fpath)
+        if self.tag is None:
+            fname = 'combined.prof'
+        else:
+            fname = 'combined.{}.prof'.format(_safe_fname(str(self.tag)))
+        self.merged_fpath = join(self.dpath, fname)
+        merged.dump_stats(self.merged_fpath)
+        return self.merged_fpath
+
+    def format_stats(self, example: DocTest) -> str:
+        """
+        Args:
+            example (DocTest): a doctest that was profiled
+
+        Returns:
+            str: the top cumulative entries of the doctest's profile
+        """
+        import pstats
+
+        profile = self.profiles.get(example, None)
+        if profile is None:
+            return ''
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.n_entries)
+        return stream.getvalue().strip('\n')
+
+    def summary(
+        self, times: dict[DocTest, float], n_slowest: int = 3
+    ) -> dict[str, typing.Any]:
+        """
+        Args:
+            times (Dict[DocTest, float]): durations of each doctest
+            n_slowest (int): number of slow doctests to include stats for
+
+        Returns:
+            Dict[str, Any]: the merged file and stats for the slowest doctests
+        """
+        profiled = [ex for ex in times if ex in self.fpaths]
+        slowest = sorted(profiled, key=lambda ex: times[ex], reverse=True)
+        slowest = slowest[:n_slowest]
+        summary = {
+            'dpath': self.dpath,
+            'merged_fpath': self.merged_fpath,
+            'fpaths': {ex.node: self.fpaths[ex] for ex in profiled},
+            'slowest': [
+                (ex.node, times[ex], self.format_stats(ex)) for ex in slowest
+            ],
+        }
+        return summary
+
+
+class SamplingProfiler:
+    """
+    Low overhead statistical profiler for the user code of doctests.
+
+    A background thread wakes up ``hz`` times per second and records the
+    stack of the thread currently executing a doctest part. Unlike
+    :class:`DoctestProfiler` the profiled code is not instrumented, so
+    timings are not distorted.
+
+    Each sample is rooted at the doctest node and part number that was
+    executing, and samples are written in the "collapsed stack" format
+    understood by ``flamegraph.pl``, speedscope, and similar tools, e.g.::
+
+        /path/mod.py::func:0;part1;<module>;work (mod.py:3) 12
+
+    Attributes:
+        hz (float): number of samples per second
+        dpath (str): directory where the collapsed stacks are written
+        counts (Dict[Tuple[str, ...], int]): number of samples per stack
+        fpath (str | None): the written collapsed stack file
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.core import parse_docstr_examples
+        >>> from xdoctest.profiling import SamplingProfiler
+        >>> docstr = utils.codeblock(
+        ...     '''
+        ...     >>> import time
+        ...     >>> def busy():
+        ...     ...     start = time.perf_counter()
+        ...     ...     while time.perf_counter() - start < 0.05:
+        ...     ...         pass
+        ...     >>> busy()
+        ...     ''')
+        >>> example = next(parse_docstr_examples(docstr, 'busy'))
+        >>> with utils.TempDir() as temp:
+        ...     self = SamplingProfiler(hz=1000, dpath=temp.dpath)
+        ...     self.start()
+        ...     self.before_example(example)
+        ...     summary = example.run(verbose=0)
+        ...     self.after_example(example)
+        ...     fpath = self.finish()
+        ...     text = open(fpath).read()
+        >>> assert self.n_samples > 0
+        >>> assert 'busy' in text
+        >>> assert text.startswith(example.node)
+    """
+
+    def __init__(
+        self,
+        hz: float = 100,
+        dpath: str = 'prof',
+        tag: str | None = None,
+    ) -> None:
+        """
+        Args:
+            hz (float): sampling frequency in samples per second
+            dpath (str): directory to write the collapsed stacks to
+            tag (str | None): if specified, included in the name of the output
+                file so several worker processes can share one directory.
+        """
+        if hz <= 0:
+            raise ValueError('hz must be positive, got {!r}'.format(hz))
+        self.hz = hz
+        self.dpath = dpath
+        self.tag = tag
+        self.counts: dict[tuple[str, ...], int] = {}
+        self.fpath: str | None = None
+        self.n_samples = 0
+        # The node, part, and thread of the doctest part being executed.
+        # These are replaced atomically from the executing thread and read by
+        # the sampling thread.
+        self._node: str | None = None
+        self._active: tuple[str, typing.Any, int] | None = None
+        self._stop_event: typing.Any = None
+        self._thread: typing.Any = None
+
+    def start(self) -> None:
+        """
+        Start the sampling thread and listen to doctest execution spans
+        """
+        import threading
+
+        from xdoctest import timing
+        from xdoctest.utils import util_path
+
+        util_path.ensuredir(self.dpath, mode=0o755)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample_loop, name='xdoctest-sampler', daemon=True
+        )
+        self._thread.start()
+        timing.add_listener(self)
+
+    def stop(self) -> None:
+        """
+        Stop the sampling thread and stop listening to spans
+        """
+        from xdoctest import timing
+
+        timing.remove_listener(self)
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def enter(self, span: typing.Any) -> None:
+        if span.phase == 'exec' and self._node is not None:
+            import threading
+
+            self._active = (self._node, span.info, threading.get_ident())
+
+    def exit(self, span: typing.Any) -> None:
+        if span.phase == 'exec':
+            self._active = None
+
+    def before_example(self, example: DocTest) -> None:
+        """
+        Args:
+            example (DocTest): the doctest about to run
+        """
+        self._node = example.node
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        self._node = None
+        self._active = None
+
+    def _sample_loop(self) -> None:
+        import sys
+
+        interval = 1.0 / self.hz
+        wait = self._stop_event.wait
+        current_frames = sys._current_frames
+        while not wait(interval):
+            active = self._active
+            if active is None:
+                continue
+            node, partx, ident = active
+            frame = current_frames().get(ident, None)
+            if frame is None:
+                continue
+            stack = _collapse_frame(frame)
+            if stack is None:
+                # The span has been entered, but user code is not running yet
+                continue
+            key = (node, 'part{}'.format(partx)) + stack
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.n_samples += 1
+
+    def finish(self) -> str | None:
+        """
+        Stop sampling and write the collapsed stacks.
+
+        Returns:
+            str | None: path to the collapsed stack file if anything was sampled
+        """
+        self.stop()
+        if not self.counts:
+            return None
+        if self.tag is None:
+            fname = 'samples.collapsed'
+        else:
+            fname = 'samples.{}.collapsed'.format(_safe_fname(str(self.tag)))
+        self.fpath = join(self.dpath, fname)
+        with open(self.fpath, 'w') as file:
+            for stack, count in sorted(self.counts.items()):
+                file.write('{} {}\n'.format(';'.join(stack), count))
+        return self.fpath
+
+    def summary(self, top: int = 5) -> dict[str, typing.Any]:
+        """
+        Args:
+            top (int): number of doctests and functions to report
+
+        Returns:
+            Dict[str, Any]: the output file, and the doctests and leaf
+                functions with the most samples.
+        """
+        from collections import Counter
+
+        per_node: Counter[str] = Counter()
+        per_func: Counter[str] = Counter()
+        for stack, count in self.counts.items():
+            per_node[stack[0]] += count
+            per_func[stack[-1]] += count
+        summary = {
+            'hz': self.hz,
+            'fpath': self.fpath,
+            'n_samples': self.n_samples,
+            'top_nodes': per_node.most_common(top),
+            'top_funcs': per_func.most_common(top),
+        }
+        return summary
+
+
+def _collapse_frame(frame: typing.Any) -> tuple[str, ...] | None:
+    """
+    Convert a frame into a root-first stack of function labels, starting at
+    the outermost frame of doctest code.
+
+    Args:
+        frame (types.FrameType): the innermost frame of a thread
+
+    Returns:
+        Tuple[str, ...] | None:
+            the stack, or None if no doctest code is on the stack.
+
+    Example:
+        >>> import sys
+        >>> from xdoctest.profiling import _collapse_frame
+        >>> ns = {'sys': sys}
+        >>> exec(compile('g = lambda: sys._getframe()', 'lib.py', 'exec'), ns)
+        >>> exec(compile('f = lambda: g()', '<doctest:x>', 'exec'), ns)
+        >>> stack = _collapse_frame(ns['f']())
+        >>> print(stack[-2:])
+        ('<lambda> (<doctest:x>:1)', '<lambda> (lib.py:1)')
+        >>> assert _collapse_frame(ns['g']()) is not None
+    """
+    labels = []
+    root_index = None
+    while frame is not None:
+        code = frame.f_code
+        fname = code.co_filename
+        if fname.startswith('<doctest:'):
+            root_index = len(labels)
+            if code.co_name == '<module>':
+                labels.append('<module>')
+            else:
+                labels.append(
+                    '{} ({}:{})'.format(
+                        code.co_name, fname, code.co_firstlineno
+                    )
+                )
+        else:
+            labels.append(
+                '{} ({}:{})'.format(
+                    code.co_name, os.path.basename(fname), code.co_firstlineno
+                )
+            )
+        frame = frame.f_back
+    if root_index is None:
+        return None
+    stack = labels[root_index::-1]
+    return tuple(label.replace(';', ':') for label in stack)
@@ -0,0 +1,585 @@
+"""
+Per-doctest resource accounting for the native xdoctest runner.
+
+The :class:`ResourceMonitor` records how much memory and CPU each doctest
+uses, which helps find the doctest responsible when a long run is killed for
+running out of memory. For each doctest it measures:
+
+    * the peak of Python allocations (via :mod:`tracemalloc`)
+    * the resident set size before and after (via ``/proc`` or
+      :func:`resource.getrusage`)
+    * user and system CPU time
+    * voluntary and involuntary context switches
+
+Measurements that are not supported on the current platform are None.
+
+The :class:`LeakDetector` finds doctests that leave objects, threads, or open
+files behind after their namespace is cleared (e.g. through module globals,
+caches, or registered callbacks).
+
+CommandLine:
+    xdoctest -m xdoctest.checker all --resource-report
+    xdoctest -m xdoctest.checker all --detect-leaks --leak-reruns=3
+"""
+
+from __future__ import annotations
+
+import os
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+try:
+    import resource
+except ImportError:  # nocover
+    # Not available on Windows
+    resource = None  # type: ignore[assignment]
+
+
+def _current_rss() -> int | None:
+    """
+    Returns:
+        int | None: the current resident set size of this process in bytes,
+            or None if it is unknown. Only ``/proc`` is supported, because
+            :func:`resource.getrusage` only reports the peak, which never
+            shrinks.
+
+    Example:
+        >>> from xdoctest.resources import _current_rss
+        >>> rss = _current_rss()
+        >>> assert rss is None or rss > 0
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            n_pages = int(file.read().split()[1])
+        return n_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _rusage() -> typing.Any:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+
+def format_nbytes(nbytes: int | float | None) -> str:
+    """
+    Args:
+        nbytes (int | float | None): a number of bytes
+
+    Returns:
+        str: a human readable size
+
+    Example:
+        >>> from xdoctest.resources import format_nbytes
+        >>> format_nbytes(123)
+        '123B'
+        >>> format_nbytes(-3 * 1024 ** 2)
+        '-3.0MB'
+        >>> format_nbytes(None)
+        '?'
+    """
+    if nbytes is None:
+        return '?'
+    size = float(nbytes)
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(size) < 1024 or unit == 'GB':
+            break
+        size /= 1024
+    if unit == 'B':
+        return '{}B'.format(int(size))
+    return '{:.1f}{}'.format(size, unit)
+
+
+class AllocTracer:
+    """
+    Context manager that measures the peak of Python allocations made while
+    it is active, relative to the allocated size when it was entered.
+
+    This is used to enforce ``MAX_MEMORY`` budgets for doctest parts.
+
+    Attributes:
+        peak (int | None): the measured number of bytes (None until exited or
+            if not enabled)
+
+    Example:
+        >>> from xdoctest.resources import AllocTracer
+        >>> with AllocTracer() as tracer:
+        ...     data = [0] * 100000
+        ...     del data
+        >>> assert tracer.peak >= 100000 * 8
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        """
+        Args:
+            enabled (bool): if False, nothing is measured
+        """
+        self.enabled = enabled
+        self.peak: int | None = None
+        self._start = 0
+        self._owns_tracemalloc = False
+
+    def __enter__(self) -> AllocTracer:
+        import tracemalloc
+
+        if self.enabled:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:  # nocover
+                # Python < 3.9
+                tracemalloc.clear_traces()
+            self._start = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        import tracemalloc
+
+        if self.enabled:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak = max(peak - self._start, 0)
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+
+
+class ResourceMonitor:
+    """
+    Records memory, CPU, and context switch usage of each doctest.
+
+    Attributes:
+        records (Dict[DocTest, Dict[str, Any]]): measurements for each doctest
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.core import parse_docstr_examples
+        >>> from xdoctest.resources import ResourceMonitor
+        >>> docstr = utils.codeblock(
+        ...     '''
+        ...     >>> data = [0] * 1000000
+        ...     ''')
+        >>> example = next(parse_docstr_examples(docstr, 'alloc'))
+        >>> self = ResourceMonitor()
+        >>> self.start()
+        >>> self.before_example(example)
+        >>> summary = example.run(verbose=0)
+        >>> self.after_example(example)
+        >>> self.finish()
+        >>> record = self.records[example]
+        >>> assert record['peak_alloc'] >= 8 * 1000000
+        >>> assert record['node'] == example.node
+    """
+
+    def __init__(self) -> None:
+        self.records: dict[DocTest, dict[str, typing.Any]] = {}
+        self._owns_tracemalloc = False
+        self._before: dict[str, typing.Any] = {}
+
+    def start(self) -> None:
+        """
+        Start tracing Python allocations
+        """
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    def finish(self) -> None:
+        """
+        Stop tracing allocations if this monitor started it
+        """
+        import tracemalloc
+
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    def before_example(self, example: DocTest) -> None:
+        """
+        Args:
+            example (DocTest): the doctest about to run
+        """
+        import tracemalloc
+
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:  # nocover
+            # Python < 3.9
+            tracemalloc.clear_traces()
+        self._before = {
+            'alloc': tracemalloc.get_traced_memory()[0],
+            'rss': _current_rss(),
+            'rusage': _rusage(),
+        }
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        import tracemalloc
+
+        peak = tracemalloc.get_traced_memory()[1]
+        rss_after = _current_rss()
+        usage_after = _rusage()
+        before = self._before
+        peak_alloc = max(peak - before['alloc'], 0)
+        if example.part_allocs:
+            # The peak was reset to measure a MAX_MEMORY budget
+            peak_alloc = max([peak_alloc] + list(example.part_allocs.values()))
+        record: dict[str, typing.Any] = {
+            'node': example.node,
+            'peak_alloc': peak_alloc,
+            'rss_before': before['rss'],
+            'rss_after': rss_after,
+            'rss_delta': None,
+            'user_cpu': None,
+            'sys_cpu': None,
+            'voluntary_ctx': None,
+            'involuntary_ctx': None,
+        }
+        if rss_after is not None and before['rss'] is not None:
+            record['rss_delta'] = rss_after - before['rss']
+        usage_before = before['rusage']
+        if usage_after is not None and usage_before is not None:
+            record['user_cpu'] = usage_after.ru_utime - usage_before.ru_utime
+            record['sys_cpu'] = usage_after.ru_stime - usage_before.ru_stime
+            record['voluntary_ctx'] = (
+                usage_after.ru_nvcsw - usage_before.ru_nvcsw
+            )
+            record['involuntary_ctx'] = (
+                usage_after.ru_nivcsw - usage_before.ru_nivcsw
+            )
+        self.records[example] = record
+
+    def summary(self, top: int = 5) -> dict[str, typing.Any]:
+        """
+        Args:
+            top (int): number of top offenders to include
+
+        Returns:
+            Dict[str, Any]: json-friendly measurements for every doctest and
+                the nodes with the largest peak allocations and RSS growth.
+        """
+        records = list(self.records.values())
+        by_peak = sorted(records, key=lambda r: r['peak_alloc'], reverse=True)
+        by_rss = sorted(
+            [r for r in records if (r['rss_delta'] or 0) > 0],
+            key=lambda r: r['rss_delta'],
+            reverse=True,
+        )
+        summary = {
+            'records': records,
+            'top_peak_alloc': [r['node'] for r in by_peak[:top]],
+            'top_rss_delta': [r['node'] for r in by_rss[:top]],
+        }
+        return summary
+
+
+def format_record(record: dict[str, typing.Any]) -> str:
+    """
+    Args:
+        record (Dict[str, Any]): a measurement from :class:`ResourceMonitor`
+
+    Returns:
+        str: a one line human readable summary
+
+    Example:
+        >>> from xdoctest.resources import format_record
+        >>> print(format_record({
+        ...     'node': 'mod.py::func:0', 'peak_alloc': 2048,
+        ...     'rss_delta': 0, 'user_cpu': 0.5, 'sys_cpu': 0.25,
+        ...     'voluntary_ctx': 3, 'involuntary_ctx': 1}))
+        peak: 2.0KB, rss: +0B, cpu: 0.50s user 0.25s sys, ctx: 3/1, mod.py::func:0
+    """
+    rss_delta = record['rss_delta']
+    rss_text = format_nbytes(rss_delta)
+    if rss_delta is not None and rss_delta >= 0:
+        rss_text = '+' + rss_text
+    if record['user_cpu'] is None:
+        cpu_text = '?'
+        ctx_text = '?'
+    else:
+        cpu_text = '{:0.2f}s user {:0.2f}s sys'.format(
+            record['user_cpu'], record['sys_cpu']
+        )
+        ctx_text = '{}/{}'.format(
+            record['voluntary_ctx'], record['involuntary_ctx']
+        )
+    return 'peak: {}, rss: {}, cpu: {}, ctx: {}, {}'.format(
+        format_nbytes(record['peak_alloc']),
+        rss_text,
+        cpu_text,
+        ctx_text,
+        record['node'],
+    )
+
+
+def _count_fds() -> int | None:
+    """
+    Returns:
+        int | None: the number of open file descriptors if it can be measured
+
+    Example:
+        >>> from xdoctest.resources import _count_fds
+        >>> n_fds = _count_fds()
+        >>> assert n_fds is None or n_fds > 0
+    """
+    for dpath in ['/proc/self/fd', '/dev/fd']:
+        try:
+            return len(os.listdir(dpath))
+        except OSError:
+            pass
+    return None
+
+
+def _footprint() -> dict[str, typing.Any]:
+    """
+    Collect garbage, then count live objects by type, threads, and open
+    files.
+
+    Returns:
+        Dict[str, Any]
+    """
+    import gc
+    import threading
+    from collections import Counter
+
+    gc.collect()
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    footprint = {
+        'objects': counts,
+        'threads': threading.active_count(),
+        'fds': _count_fds(),
+    }
+    return footprint
+
+
+def _footprint_growth(
+    before: dict[str, typing.Any], after: dict[str, typing.Any], top: int = 5
+) -> dict[str, typing.Any]:
+    """
+    Args:
+        before (Dict[str, Any]): a :func:`_footprint`
+        after (Dict[str, Any]): a later :func:`_footprint`
+        top (int): number of growing types to include
+
+    Returns:
+        Dict[str, Any]: the growth in objects, threads, and file descriptors
+
+    Example:
+        >>> from collections import Counter
+        >>> from xdoctest.resources import _footprint_growth
+        >>> before = {'objects': Counter(dict=10, list=5), 'threads': 1, 'fds': 3}
+        >>> after = {'objects': Counter(dict=30, list=4), 'threads': 2, 'fds': 3}
+        >>> growth = _footprint_growth(before, after)
+        >>> print(growth['n_objects'], growth['top_types'])
+        19 [('dict', 20)]
+        >>> print(growth['threads'], growth['fds'])
+        1 0
+    """
+    deltas = after['objects'].copy()
+    deltas.subtract(before['objects'])
+    growing = [(name, n) for name, n in deltas.most_common(top) if n > 0]
+    fds = None
+    if before['fds'] is not None and after['fds'] is not None:
+        fds = after['fds'] - before['fds']
+    growth = {
+        'n_objects': sum(deltas.values()),
+        'top_types': growing,
+        'threads': after['threads'] - before['threads'],
+        'fds': fds,
+    }
+    return growth
+
+
+class LeakDetector:
+    """
+    Finds doctests that leave objects, threads, or open files behind.
+
+    Before and after each doctest, garbage is collected and the live objects
+    (by type), threads, and file descriptors are counted. Doctests that grow
+    any of these are "suspects". Because the first run of a doctest often
+    fills caches, suspects can be re-run several times with :func:`confirm`
+    and are only "confirmed" if they grow on every re-run.
+
+    Attributes:
+        min_objects (int): object growth needed to make a doctest a suspect
+        n_reruns (int): number of times to re-run each suspect
+        records (Dict[DocTest, Dict[str, Any]]): growth of each doctest
+
+    Example:
+        >>> from xdoctest import utils
+        >>> from xdoctest.core import parse_docstr_examples
+        >>> from xdoctest.resources import LeakDetector
+        >>> docstr = utils.codeblock(
+        ...     '''
+        ...     >>> import xdoctest
+        ...     >>> if not hasattr(xdoctest, '_demo_leak'):
+        ...     ...     xdoctest._demo_leak = []
+        ...     >>> xdoctest._demo_leak.extend([[] for _ in range(200)])
+        ...     ''')
+        >>> example = next(parse_docstr_examples(docstr, 'leaky'))
+        >>> self = LeakDetector(n_reruns=2)
+        >>> self.start()
+        >>> self.before_example(example)
+        >>> summary = example.run(verbose=0)
+        >>> self.after_example(example, summary)
+        >>> self.finish()
+        >>> assert self.suspects() == [example]
+        >>> self.confirm()
+        >>> assert self.records[example]['confirmed']
+        >>> import xdoctest
+        >>> del xdoctest._demo_leak
+    """
+
+    def __init__(self, min_objects: int = 100, n_reruns: int = 0) -> None:
+        """
+        Args:
+            min_objects (int): a doctest whose number of live objects grows
+                by at least this much is a suspect
+            n_reruns (int): number of times :func:`confirm` re-runs suspects
+        """
+        self.min_objects = min_objects
+        self.n_reruns = n_reruns
+        self.records: dict[DocTest, dict[str, typing.Any]] = {}
+        self._failed: set[DocTest] = set()
+        self._before: dict[str, typing.Any] = {}
+
+    def start(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+    def before_example(self, example: DocTest) -> None:
+        """
+        Args:
+            example (DocTest): the doctest about to run
+        """
+        self._before = _footprint()
+
+    def after_example(
+        self, example: DocTest, summary: typing.Any = None
+    ) -> None:
+        """
+        Args:
+            example (DocTest): the doctest that just ran
+            summary (Dict | None): the result of :func:`DocTest.run`
+        """
+        record = _footprint_growth(self._before, _footprint())
+        record['node'] = example.node
+        record['confirmed'] = None
+        record['rerun_objects'] = []
+        self.records[example] = record
+        if summary is None or summary.get('failed', False):
+            self._failed.add(example)
+        self._before = {}
+
+    def _is_suspect(self, record: dict[str, typing.Any]) -> bool:
+        return (
+            record['n_objects'] >= self.min_objects
+            or record['threads'] > 0
+            or (record['fds'] or 0) > 0
+        )
+
+    def suspects(self) -> list[DocTest]:
+        """
+        Returns:
+            List[DocTest]: doctests whose footprint grew
+        """
+        return [
+            example
+            for example, record in self.records.items()
+            if self._is_suspect(record)
+        ]
+
+    def confirm(self) -> None:
+        """
+        Re-run each suspect ``n_reruns`` times and mark it as confirmed if its
+        footprint grows on every re-run.
+
+        Failed doctests are not re-run because doing so would overwrite the
+        failure information that is reported at the end of the run.
+        """
+        if self.n_reruns <= 0:
+            return
+        for example in self.suspects():
+            if example in self._failed:
+                continue
+            record = self.records[example]
+            confirmed = True
+            for _ in range(self.n_reruns):
+                before = _footprint()
+                example.run(verbose=0, on_error='return')
+                growth = _footprint_growth(before, _footprint())
+                record['rerun_objects'].append(growth['n_objects'])
+                grew = (
+                    growth['n_objects'] > 0
+                    or growth['threads'] > 0
+                    or (growth['fds'] or 0) > 0
+                )
+                confirmed = confirmed and grew
+            record['confirmed'] = confirmed
+
+    def summary(self) -> dict[str, typing.Any]:
+        """
+        Returns:
+            Dict[str, Any]: json-friendly growth records of the suspects
+        """
+        suspects = self.suspects()
+        records = sorted(
+            [self.records[example] for example in suspects],
+            key=lambda r: r['n_objects'],
+            reverse=True,
+        )
+        summary = {
+            'min_objects': self.min_objects,
+            'n_reruns': self.n_reruns,
+            'suspects': records,
+        }
+        return summary
+
+
+def format_growth(record: dict[str, typing.Any]) -> str:
+    """
+    Args:
+        record (Dict[str, Any]): a growth record from :class:`LeakDetector`
+
+    Returns:
+        str: a one line human readable summary
+
+    Example:
+        >>> from xdoctest.resources import format_growth
+        >>> print(format_growth({
+        ...     'node': 'mod.py::func:0', 'n_objects': 250,
+        ...     'top_types': [('dict', 200), ('list', 50)],
+        ...     'threads': 1, 'fds': 0, 'confirmed': True,
+        ...     'rerun_objects': [250, 250]}))
+        objects: +250 (dict +200, list +50), threads: +1, fds: +0, mod.py::func:0 [confirmed: +250, +250]
+    """
+    types_text = ', '.join(
+        '{} +{}'.format(name, n) for name, n in record['top_types']
+    )
+    fds = record['fds']
+    text = 'objects: {:+d} ({}), threads: {:+d}, fds: {}, {}'.format(
+        record['n_objects'],
+        types_text,
+        record['threads'],
+        '?' if fds is None else '{:+d}'.format(fds),
+        record['node'],
+    )
+    if record['confirmed'] is not None:
+        reruns = ', '.join('{:+d}'.format(n) for n in record['rerun_objects'])
+        status = 'confirmed' if record['confirmed'] else 'not confirmed'
+        text += ' [{}: {}]'.format(status, reruns)
+    return text
@@ -63,6 +63,7 @@ from xdoctest import (
     doctest_example,
     dynamic_analysis,
     global_state,
+    timing,
     utils,
 )
 
@@ -133,6 +134,46 @@ def doctest_module(
     config: dict[str, typing.Any] | None = None,
     durations: int | None = None,
     analysis: str = 'auto',
+    timing_breakdown: bool = False,
+    profile: bool = False,
+    profile_dir: str | None = None,
+    sample_profile: float | None = None,
+    trace_events: str | None = None,
+    resource_report: bool = False,
+    detect_leaks: bool = False,
+    leak_reruns: int = 0,
+    repeat: int | None = None,
+    warmup: int = 0,
+    benchmark_json: str | None = None,
+    cache_dir: str | None = None,
+    duration_history: bool = False,
+    longest_first: bool = False,
+    progress: bool = False,
+    save_baseline: str | None = None,
+    compare_baseline: str | None = None,
+    baseline_rtol: float = 0.2,
+    baseline_atol: float = 0.005,
+    cache_failures: bool = False,
+    last_failed: bool = False,
+    failed_first: bool = False,
+    maxfail: int | None = None,
+    cache_results: bool = False,
+    no_cache: bool = False,
+    changed_since: str | None = None,
+    record_impact: bool = False,
+    impacted: bool = False,
+    coverage: str | None = None,
+    shard: str | None = None,
+    shard_strategy: str = 'hash',
+    shard_report: str | None = None,
+    serve_queue: str | None = None,
+    queue_workers: int = 0,
+    time_budget: float | None = None,
+    sample: str | None = None,
+    journal: str | None = None,
+    resume: bool = False,
+    keyword: str | None = None,
+    dedup: bool = False,
 ) -> dict[str, typing.Any]:
     """
     Executes requestsed google-style doctests in a package or module.
@@ -181,6 +222,161 @@ def doctest_module(
         analysis (str): determines if doctests are found using static or
             dynamic analysis.
 
+        timing_breakdown (bool): if True, measure how much time is spent in
+            each phase (discovery, parsing, importing, compiling, executing,
+            and checking) and report it in the summary.
+
+        profile (bool): if True, profile the user code of each doctest with
+            :mod:`cProfile`, write one ``.prof`` file per doctest plus a
+            merged ``combined.prof``, and report the top cumulative entries
+            of the slowest doctests. With ``serve_queue`` the local workers
+            profile the doctests they run and name their merged files after
+            themselves, e.g. ``combined.local-0.prof``.
+
+        profile_dir (str | None): directory for profiling results. Defaults
+            to ``prof``. Specifying this implies ``profile=True`` unless
+            ``sample_profile`` is given.
+
+        sample_profile (float | None): if specified, sample the stacks of
+            running doctests this many times per second from a background
+            thread and write them as collapsed stacks for flamegraph tools.
+
+        trace_events (str | None): if specified, write a timeline of the run
+            (discovery, parsing, imports, doctests, and parts) to this path
+            in the Chrome trace event format. With ``serve_queue`` the
+            timelines of the local workers are merged into it, one track
+            per worker.
+
+        resource_report (bool): if True, record the peak Python allocations,
+            RSS growth, CPU time, and context switches of each doctest and
+            report the top offenders.
+
+        detect_leaks (bool): if True, count live objects by type, threads,
+            and open file descriptors around each doctest and report the
+            doctests that grow them.
+
+        leak_reruns (int): when detecting leaks, re-run each suspect this
+            many times to confirm that it keeps growing.
+
+        repeat (int | None): if specified, re-execute each passing doctest
+            until this many timings of its user code are collected, and
+            report the min, median, and standard deviation. Only the first
+            execution checks the output.
+
+        warmup (int): number of leading executions to discard when
+            ``repeat`` is specified.
+
+        benchmark_json (str | None): if specified with ``repeat``, write the
+            benchmark results to this JSON file.
+
+        cache_dir (str | None): directory that stores information between
+            runs. Defaults to ``.xdoctest_cache`` or the
+            ``XDOCTEST_CACHE_DIR`` environment variable.
+
+        duration_history (bool): if True, update a moving average of the
+            duration of each doctest in the cache directory.
+
+        longest_first (bool): if True, run the doctests with the longest
+            expected duration first. Implies ``duration_history``.
+
+        progress (bool): if True, print a progress line with an estimate of
+            the remaining time before each doctest. Implies
+            ``duration_history``.
+
+        save_baseline (str | None): if specified, store the duration (and
+            peak allocations with ``resource_report``) of each passing
+            doctest under this name in the cache directory.
+
+        compare_baseline (str | None): if specified, compare the run against
+            the baseline with this name and report the regressions.
+
+        baseline_rtol (float): relative slowdown tolerated when comparing
+            against a baseline.
+
+        baseline_atol (float): slowdown in seconds tolerated when comparing
+            against a baseline.
+
+        cache_failures (bool): if True, record which doctests failed in the
+            cache directory. The command line interface does this when
+            ``--cache-dir``, ``--lf``, ``--ff``, or ``--maxfail`` is given.
+
+        last_failed (bool): if True, only run the doctests that failed last
+            time (or all doctests if none failed). Implies
+            ``cache_failures``.
+
+        failed_first (bool): if True, run the doctests that failed last time
+            before the others. Implies ``cache_failures``.
+
+        maxfail (int | None): if specified, stop after this many failures.
+
+        cache_results (bool): if True, skip the doctests that passed in a
+            previous run and whose fingerprint (the source of the doctest,
+            its module, the first-party modules they import, and the
+            configuration) did not change. They are reported as cached.
+
+        no_cache (bool): if True with ``cache_results``, run every doctest,
+            but still update the cache with the results.
+
+        changed_since (str | None): if specified, only run the doctests
+            with lines that differ between this git revision and the working
+            tree. Modules without changes are not parsed.
+
+        record_impact (bool): if True, record the first-party lines that
+            each doctest executes in the cache directory.
+
+        impacted (bool): if True, only run the doctests that executed code
+            that changed since the footprints were recorded with
+            ``record_impact``, the doctests that changed, and the doctests
+            without a footprint. Everything runs if the footprints are stale.
+
+        coverage (str | None): if specified, measure the line and branch
+            coverage of first-party code (including the docstrings of the
+            doctests) and write an lcov report, or a JSON report if the path
+            ends with ``.json``, to this path.
+
+        shard (str | None): if specified as ``INDEX/COUNT``, split the
+            doctests into COUNT deterministic shards and only run shard INDEX
+            (counting from 1).
+
+        shard_strategy (str): how doctests are assigned to shards. Either
+            ``hash`` for a stable hash of their name or ``duration`` to
+            balance the durations recorded by ``duration_history``.
+
+        shard_report (str | None): if specified, write the doctests covered
+            by the shard to this JSON file, so the union of all shards can be
+            checked with :func:`xdoctest.sharding.verify_reports`.
+
+        serve_queue (str | None): if specified as ``HOST:PORT`` or
+            ``unix:PATH``, do not run the doctests, but hand them out to
+            workers (``xdoctest worker --connect ADDR``) that connect to this
+            address. See :mod:`xdoctest.workqueue`.
+
+        queue_workers (int): the number of local worker processes to start
+            for ``serve_queue``.
+
+        time_budget (float | None): if specified, stop starting doctests
+            after this many seconds and skip doctests that are expected to
+            exceed the remaining time. See :mod:`xdoctest.smoke`.
+
+        sample (str | None): if specified as a fraction in ``(0, 1]`` or a
+            number of doctests, only run a sample of this size, which puts
+            recently failed doctests first and spreads over the modules.
+
+        journal (str | None): if specified, durably append the result of each
+            doctest to this file as soon as it finishes.
+
+        resume (bool): if True, do not run the doctests that already have a
+            result in the ``journal`` and merge these results into the
+            summary. See :mod:`xdoctest.journal`.
+
+        keyword (str | None): if specified, only run doctests whose callname
+            or module name matches this ``-k`` style expression, e.g.
+            ``"parse and not static"``. See :mod:`xdoctest.selection`.
+
+        dedup (bool): if True, run doctests of a module whose source and
+            config are identical only once and report the others as
+            aliases. See :mod:`xdoctest.dedup`.
+
     Returns:
         Dict[str, Any]: run_summary
 
@@ -217,6 +413,72 @@ def doctest_module(
     _debug('config = {!r}'.format(config))
     _debug('verbose = {!r}'.format(verbose))
     _debug('style = {!r}'.format(style))
+    _debug('timing_breakdown = {!r}'.format(timing_breakdown))
+    _debug('profile = {!r}'.format(profile))
+    _debug('profile_dir = {!r}'.format(profile_dir))
+    _debug('sample_profile = {!r}'.format(sample_profile))
+    _debug('trace_events = {!r}'.format(trace_events))
+    _debug('resource_report = {!r}'.format(resource_report))
+    _debug('detect_leaks = {!r}'.format(detect_leaks))
+    _debug('leak_reruns = {!r}'.format(leak_reruns))
+    _debug('repeat = {!r}'.format(repeat))
+    _debug('warmup = {!r}'.format(warmup))
+    _debug('benchmark_json = {!r}'.format(benchmark_json))
+    _debug('cache_dir = {!r}'.format(cache_dir))
+    _debug('duration_history = {!r}'.format(duration_history))
+    _debug('longest_first = {!r}'.format(longest_first))
+    _debug('progress = {!r}'.format(progress))
+    _debug('save_baseline = {!r}'.format(save_baseline))
+    _debug('compare_baseline = {!r}'.format(compare_baseline))
+    _debug('baseline_rtol = {!r}'.format(baseline_rtol))
+    _debug('baseline_atol = {!r}'.format(baseline_atol))
+    _debug('cache_failures = {!r}'.format(cache_failures))
+    _debug('last_failed = {!r}'.format(last_failed))
+    _debug('failed_first = {!r}'.format(failed_first))
+    _debug('maxfail = {!r}'.format(maxfail))
+    _debug('cache_results = {!r}'.format(cache_results))
+    _debug('no_cache = {!r}'.format(no_cache))
+    _debug('changed_since = {!r}'.format(changed_since))
+    _debug('record_impact = {!r}'.format(record_impact))
+    _debug('impacted = {!r}'.format(impacted))
+    _debug('coverage = {!r}'.format(coverage))
+    _debug('shard = {!r}'.format(shard))
+    _debug('shard_strategy = {!r}'.format(shard_strategy))
+    _debug('shard_report = {!r}'.format(shard_report))
+    _debug('serve_queue = {!r}'.format(serve_queue))
+    _debug('queue_workers = {!r}'.format(queue_workers))
+    _debug('time_budget = {!r}'.format(time_budget))
+    _debug('sample = {!r}'.format(sample))
+    _debug('journal = {!r}'.format(journal))
+    _debug('resume = {!r}'.format(resume))
+    _debug('keyword = {!r}'.format(keyword))
+    _debug('dedup = {!r}'.format(dedup))
+
+    if resume and journal is None:
+        raise ValueError('resume requires a journal')
+
+    if serve_queue is not None:
+        # Profiles and traces are recorded by the workers (see
+        # ``xdoctest worker``)
+        local_only = {
+            'resource_report': resource_report,
+            'detect_leaks': detect_leaks,
+            'repeat': repeat is not None,
+            'progress': progress,
+            'record_impact': record_impact,
+            'coverage': coverage,
+            'time_budget': time_budget is not None,
+            'save_baseline': save_baseline is not None,
+            'compare_baseline': compare_baseline is not None,
+            'timing_breakdown': timing_breakdown,
+            'line_timing': bool(config and config.get('line_timing')),
+        }
+        conflicts = [key for key, value in local_only.items() if value]
+        if conflicts:
+            raise ValueError(
+                'serve_queue cannot be combined with {}, because doctests '
+                'run in worker processes'.format(', '.join(conflicts))
+            )
     _debug('------+ /DEBUG +------')
 
     modinfo: dict[str, typing.Any] = {
@@ -287,8 +549,200 @@ def doctest_module(
     # change to this function.
     gather_all = command == 'all' or command == 'dump'
 
+    # Remember the previous state in case doctest_module is called from
+    # within a doctest that is already being timed.
+    prev_timing_enabled = timing.TIMER.enabled
+    if timing_breakdown:
+        timing.TIMER.reset()
+        timing.TIMER.enabled = True
+
+    if profile_dir is not None and not sample_profile:
+        profile = True
+    if profile_dir is None:
+        profile_dir = 'prof'
+
+    trace_writer = None
+    if trace_events is not None:
+        from xdoctest import trace_events as trace_events_mod
+
+        trace_writer = trace_events_mod.TraceEventWriter(trace_events)
+        trace_writer.start()
+
+    try:
+        with timing.span('run', parsable_identifier):
+            run_summary = _doctest_module(
+                parsable_identifier,
+                command=command,
+                gather_all=gather_all,
+                exclude=exclude,
+                style=style,
+                verbose=verbose,
+                config=config,
+                durations=durations,
+                analysis=analysis,
+                profile=profile,
+                profile_dir=profile_dir,
+                sample_profile=sample_profile,
+                resource_report=resource_report,
+                detect_leaks=detect_leaks,
+                leak_reruns=leak_reruns,
+                repeat=repeat,
+                warmup=warmup,
+                benchmark_json=benchmark_json,
+                cache_dir=cache_dir,
+                duration_history=duration_history,
+                longest_first=longest_first,
+                progress=progress,
+                save_baseline=save_baseline,
+                compare_baseline=compare_baseline,
+                baseline_rtol=baseline_rtol,
+                baseline_atol=baseline_atol,
+                cache_failures=cache_failures,
+                last_failed=last_failed,
+                failed_first=failed_first,
+                maxfail=maxfail,
+                cache_results=cache_results,
+                no_cache=no_cache,
+                changed_since=changed_since,
+                record_impact=record_impact,
+                impacted=impacted,
+                coverage=coverage,
+                shard=shard,
+                shard_strategy=shard_strategy,
+                shard_report=shard_report,
+                serve_queue=serve_queue,
+                queue_workers=queue_workers,
+                trace_events=trace_events,
+                time_budget=time_budget,
+                sample=sample,
+                journal=journal,
+                resume=resume,
+                keyword=keyword,
+                dedup=dedup,
+                _log=_log,
+            )
+    finally:
+        timing.TIMER.enabled = prev_timing_enabled
+        if trace_writer is not None:
+            trace_fpath = trace_writer.finish()
+            if serve_queue is not None:
+                _merge_worker_traces(trace_fpath, queue_workers)
+            _log('wrote trace events to {}'.format(trace_fpath))
+    if trace_writer is not None:
+        run_summary['trace_events'] = trace_fpath
+    return run_summary
+
+
+def _merge_worker_traces(trace_fpath: str, n_workers: int) -> None:
+    """
+    Merge the traces of the local queue workers into the trace of the
+    coordinator and remove them.
+
+    Args:
+        trace_fpath (str): the trace of the coordinator
+        n_workers (int): the number of local workers that were started
+    """
+    import os
+
+    from xdoctest import trace_events as trace_events_mod
+
+    worker_fpaths = [
+        trace_events_mod.tagged_fpath(trace_fpath, 'local-{}'.format(index))
+        for index in range(n_workers)
+    ]
+    worker_fpaths = [fpath for fpath in worker_fpaths if os.path.exists(fpath)]
+    if worker_fpaths:
+        trace_events_mod.merge_traces(
+            [trace_fpath] + worker_fpaths, trace_fpath
+        )
+        for fpath in worker_fpaths:
+            os.remove(fpath)
+
+
+# Commands that run the dummy doctests of functions without arguments
+ZERO_ARG_COMMANDS = ['zero-all', 'zero', 'zero_all', 'zero-args']
+
+
+def _doctest_module(
+    parsable_identifier,
+    command,
+    gather_all,
+    exclude,
+    style,
+    verbose,
+    config,
+    durations,
+    analysis,
+    profile,
+    profile_dir,
+    sample_profile,
+    resource_report,
+    detect_leaks,
+    leak_reruns,
+    repeat,
+    warmup,
+    benchmark_json,
+    cache_dir,
+    duration_history,
+    longest_first,
+    progress,
+    save_baseline,
+    compare_baseline,
+    baseline_rtol,
+    baseline_atol,
+    cache_failures,
+    last_failed,
+    failed_first,
+    maxfail,
+    cache_results,
+    no_cache,
+    changed_since,
+    record_impact,
+    impacted,
+    coverage,
+    shard,
+    shard_strategy,
+    shard_report,
+    serve_queue,
+    queue_workers,
+    trace_events,
+    time_budget,
+    sample,
+    journal,
+    resume,
+    keyword,
+    dedup,
+    _log,
+) -> dict[str, typing.Any]:
+    """
+    Collects, runs, and reports on doctests for :func:`doctest_module`.
+    """
     tic = time.time()
 
+    changes = None
+    if changed_since is not None:
+        import os
+
+        from xdoctest.changes import ChangeSet
+
+        if isinstance(parsable_identifier, types.ModuleType):
+            raise ValueError('changed_since requires a module path')
+        git_dpath = parsable_identifier
+        if not os.path.isdir(git_dpath):
+            git_dpath = os.path.dirname(os.path.abspath(git_dpath))
+        changes = ChangeSet.from_git(changed_since, cwd=git_dpath)
+
+    # A callname given as the command (or a keyword expression) is applied
+    # before docstrings are parsed, so unselected doctests are never parsed
+    pattern = None
+    if not gather_all and command not in ['list', *ZERO_ARG_COMMANDS]:
+        pattern = command
+    selector = None
+    if pattern is not None or keyword is not None:
+        from xdoctest.selection import Selector
+
+        selector = Selector(pattern, keyword)
+
     # Parse all valid examples
     with warnings.catch_warnings(record=True) as parse_warnlist:
         examples: list[doctest_example.DocTest] = list(
@@ -297,8 +751,16 @@ def doctest_module(
                 exclude=exclude,
                 style=style,
                 analysis=analysis,
+                changes=changes,
+                selector=selector,
             )
         )
+        if changes is not None:
+            _log(
+                'found {} doctests that changed since {}'.format(
+                    len(examples), changed_since
+                )
+            )
         # Set each example mode to native to signal that we are using the
         # native xdoctest runner instead of the pytest runner
         for example in examples:
@@ -321,9 +783,15 @@ def doctest_module(
     else:
         _log('gathering tests', level=2)
         enabled_examples = []
+        from xdoctest.selection import is_pattern
+
+        # Explicitly named doctests run even if they are disabled
+        skip_disabled = gather_all or (
+            pattern is not None and is_pattern(pattern)
+        )
         for example in examples:
-            if gather_all or command in example.valid_testnames:
-                if gather_all and example.is_disabled():
+            if gather_all or pattern is not None:
+                if skip_disabled and example.is_disabled():
                     continue
                 enabled_examples.append(example)
 
@@ -333,7 +801,7 @@ def doctest_module(
                 if command in example.valid_testnames:
                     enabled_examples.append(example)
 
-                elif command in ['zero-all', 'zero', 'zero_all', 'zero-args']:
+                elif command in ZERO_ARG_COMMANDS:
                     enabled_examples.append(example)
 
         if config:
@@ -357,13 +825,471 @@ def doctest_module(
 
                 random.shuffle(enabled_examples)
 
-            run_summary = _run_examples(
-                enabled_examples, verbose, config, _log=_log
-            )
+            n_deselected = 0
+            shard_info = None
+            if shard is not None:
+                from xdoctest import sharding
+
+                shard_index, shard_count = sharding.parse_shard(shard)
+                shard_history = None
+                if shard_strategy == 'duration':
+                    from xdoctest import cache
+
+                    shard_history = cache.DurationHistory(cache_dir)
+                assignment = sharding.assign(
+                    enabled_examples,
+                    shard_count,
+                    shard_strategy,
+                    shard_history,
+                )
+                selected = [
+                    example
+                    for example, index in zip(enabled_examples, assignment)
+                    if index == shard_index
+                ]
+                shard_info = sharding.make_report(
+                    enabled_examples,
+                    selected,
+                    shard_index,
+                    shard_count,
+                    shard_strategy,
+                )
+                if shard_report is not None:
+                    sharding.dump_report(shard_info, shard_report)
+                    shard_info['fpath'] = shard_report
+                _log(
+                    'running shard {}: {} of {} doctests'.format(
+                        shard, len(selected), len(enabled_examples)
+                    )
+                )
+                n_deselected += len(enabled_examples) - len(selected)
+                enabled_examples = selected
+
+            # Smoke runs choose doctests by their recorded durations and
+            # failures, so they also keep these records up to date
+            smoke_run = sample is not None or time_budget is not None
+
+            history = None
+            if duration_history or longest_first or progress or smoke_run:
+                from xdoctest import cache
+
+                history = cache.DurationHistory(cache_dir)
+                if longest_first:
+                    enabled_examples = history.order(enabled_examples)
+
+            failure_cache = None
+            if cache_failures or last_failed or failed_first or smoke_run:
+                from xdoctest import cache
+
+                failure_cache = cache.FailureCache(cache_dir)
+                if last_failed:
+                    selected = failure_cache.select(enabled_examples)
+                    if selected:
+                        _log(
+                            'running {} of {} doctests that failed last '
+                            'time'.format(len(selected), len(enabled_examples))
+                        )
+                        n_deselected += len(enabled_examples) - len(selected)
+                        enabled_examples = selected
+                    else:
+                        _log('no previously failed doctests, running all')
+                if failed_first:
+                    enabled_examples = failure_cache.order(enabled_examples)
+
+            first_party_dpath = None
+            if (record_impact or impacted or coverage) and isinstance(
+                parsable_identifier, str
+            ):
+                from xdoctest import impact
+
+                first_party_dpath = impact.first_party_dpath(
+                    parsable_identifier
+                )
+
+            if impacted and first_party_dpath is not None:
+                from xdoctest import impact
+
+                selected, reason = impact.select_impacted(
+                    enabled_examples, first_party_dpath, cache_dir
+                )
+                if reason is not None:
+                    _log('running all doctests: {}'.format(reason))
+                else:
+                    _log(
+                        'running {} of {} doctests impacted by changes'.format(
+                            len(selected), len(enabled_examples)
+                        )
+                    )
+                n_deselected += len(enabled_examples) - len(selected)
+                enabled_examples = selected
+
+            # Doctests whose directives skip every part are not run at all
+            static_skips: dict[str, list[str]] = {}
+            runnable = []
+            for example in enabled_examples:
+                reason = example.static_skip_reason()
+                if reason is None:
+                    runnable.append(example)
+                else:
+                    static_skips.setdefault(reason, []).append(example.node)
+                    _log('* SKIPPED: {} ({})'.format(example.node, reason))
+            enabled_examples = runnable
+
+            result_cache = None
+            n_cached = 0
+            if cache_results:
+                from xdoctest import cache
+
+                result_cache = cache.ResultCache(cache_dir)
+                with timing.span('fingerprint'):
+                    cached, uncached = result_cache.partition(enabled_examples)
+                if not no_cache:
+                    n_cached = len(cached)
+                    enabled_examples = uncached
+                    for example in cached:
+                        _log('cached: {}'.format(example.node), level=2)
+
+            resumed = []
+            journal_records = {}
+            if resume:
+                from xdoctest import journal as journal_mod
+
+                journal_records = journal_mod.load(journal)
+                resumed = [
+                    e for e in enabled_examples if e.node in journal_records
+                ]
+                enabled_examples = [
+                    e for e in enabled_examples if e.node not in journal_records
+                ]
+                _log(
+                    'resuming: {} doctests finished in an earlier run'.format(
+                        len(resumed)
+                    )
+                )
+
+            deduplicator = None
+            if dedup:
+                from xdoctest.dedup import Deduplicator
+
+                deduplicator = Deduplicator(enabled_examples)
+                n_duplicates = len(enabled_examples) - len(
+                    deduplicator.representatives
+                )
+                if n_duplicates:
+                    _log('deduplicated {} doctests'.format(n_duplicates))
+                enabled_examples = deduplicator.representatives
+
+            smoke_info = None
+            budget = None
+            if smoke_run:
+                from xdoctest import sharding, smoke
+
+                n_candidates = len(enabled_examples)
+                assert failure_cache is not None
+                failed_keys = failure_cache.failed
+                ordered = smoke.prioritize(
+                    enabled_examples, history, failed_keys
+                )
+                not_sampled = []
+                sample_value = None
+                if sample is not None:
+                    sample_value = smoke.parse_sample(sample)
+                    n_sample = smoke.sample_size(sample_value, len(ordered))
+                    ordered, not_sampled = (
+                        ordered[:n_sample],
+                        ordered[n_sample:],
+                    )
+                    _log(
+                        'running a sample of {} of {} doctests'.format(
+                            n_sample, n_candidates
+                        )
+                    )
+                    n_deselected += len(not_sampled)
+                enabled_examples = ordered
+                if time_budget is not None:
+                    budget = smoke.TimeBudget(time_budget, history)
+                smoke_info = {
+                    'n_candidates': n_candidates,
+                    'not_sampled': not_sampled,
+                    'n_failed_first': sum(
+                        sharding.shard_key(e) in failed_keys
+                        for e in enabled_examples
+                    ),
+                    'sample': sample_value,
+                }
+
+            # Objects notified before and after each example is run
+            example_hooks = []
+
+            if progress:
+                from xdoctest import cache
+
+                assert history is not None
+                progress_reporter = cache.ProgressReporter(
+                    enabled_examples, history, _log
+                )
+                progress_reporter.start()
+                example_hooks.append(progress_reporter)
+
+            benchmark = None
+            if repeat is not None:
+                from xdoctest import benchmark as benchmark_mod
+
+                benchmark = benchmark_mod.Benchmark(repeat, warmup)
+                benchmark.start()
+                example_hooks.append(benchmark)
+
+            leak_detector = None
+            if detect_leaks:
+                from xdoctest import resources
+
+                leak_detector = resources.LeakDetector(n_reruns=leak_reruns)
+                leak_detector.start()
+                # Inserted first so its garbage collection and counting
+                # surround the other hooks, e.g. the progress timings
+                example_hooks.insert(0, leak_detector)
+
+            monitor = None
+            if resource_report:
+                from xdoctest import resources
+
+                monitor = resources.ResourceMonitor()
+                monitor.start()
+                example_hooks.append(monitor)
+
+            profiler = None
+            if profile and serve_queue is None:
+                from xdoctest import profiling
+
+                profiler = profiling.DoctestProfiler(profile_dir)
+                profiler.start()
+                example_hooks.append(profiler)
+
+            sampler = None
+            if sample_profile and serve_queue is None:
+                from xdoctest import profiling
+
+                sampler = profiling.SamplingProfiler(
+                    sample_profile, profile_dir
+                )
+                sampler.start()
+                example_hooks.append(sampler)
+
+            if failure_cache is not None:
+                failure_cache.start()
+                example_hooks.append(failure_cache)
+
+            if result_cache is not None:
+                result_cache.start()
+                example_hooks.append(result_cache)
+
+            impact_recorder = None
+            if record_impact and first_party_dpath is not None:
+                from xdoctest import impact
+
+                impact_recorder = impact.ImpactRecorder(
+                    impact.ImpactMap(cache_dir), first_party_dpath
+                )
+                impact_recorder.start()
+                example_hooks.append(impact_recorder)
+
+            coverage_hook = None
+            if coverage and first_party_dpath is not None:
+                from xdoctest import coverage as coverage_mod
+
+                coverage_hook = coverage_mod.DoctestCoverage(first_party_dpath)
+                coverage_hook.start()
+                example_hooks.append(coverage_hook)
+
+            if deduplicator is not None:
+                example_hooks.append(deduplicator)
+
+            journal_hook = None
+            if journal is not None:
+                from xdoctest import journal as journal_mod
+
+                journal_hook = journal_mod.Journal(journal, resume=resume)
+                journal_hook.start()
+                example_hooks.append(journal_hook)
+
+            if history is not None:
+                history.start()
+                # Added last so it only times the example itself
+                example_hooks.append(history)
+
+            try:
+                if serve_queue is not None:
+                    from xdoctest import workqueue
+
+                    worker_args = []
+                    if profile or sample_profile:
+                        worker_args += ['--profile-dir', profile_dir]
+                    if profile:
+                        worker_args += ['--profile']
+                    if sample_profile:
+                        worker_args += ['--sample-profile', str(sample_profile)]
+                    if trace_events is not None:
+                        worker_args += ['--trace-events', trace_events]
+                    run_summary = workqueue.run_queue(
+                        enabled_examples,
+                        serve_queue,
+                        n_workers=queue_workers,
+                        style=style,
+                        analysis=analysis,
+                        config=config,
+                        _log=_log,
+                        hooks=[
+                            hook
+                            for hook in [
+                                failure_cache,
+                                result_cache,
+                                journal_hook,
+                                deduplicator,
+                            ]
+                            if hook is not None
+                        ],
+                        history=history,
+                        maxfail=maxfail,
+                        worker_args=worker_args,
+                    )
+                    if profile or sample_profile:
+                        _log(
+                            'The local workers wrote their profiles to '
+                            '{}'.format(profile_dir)
+                        )
+                else:
+                    if budget is not None:
+                        budget.start()
+                    run_summary = _run_examples(
+                        enabled_examples,
+                        verbose,
+                        config,
+                        _log=_log,
+                        hooks=example_hooks,
+                        maxfail=maxfail,
+                        budget=budget,
+                    )
+                run_summary['n_deselected'] = n_deselected
+                run_summary['n_cached'] = n_cached
+                if static_skips:
+                    n_static = sum(map(len, static_skips.values()))
+                    run_summary['n_skipped'] = (
+                        run_summary.get('n_skipped', 0) + n_static
+                    )
+                    run_summary['n_total'] = (
+                        run_summary.get('n_total', 0) + n_static
+                    )
+                    run_summary['static_skips'] = static_skips
+                if shard_info is not None:
+                    run_summary['shard'] = shard_info
+                if journal is not None:
+                    from xdoctest import journal as journal_mod
+
+                    run_summary['journal'] = {
+                        'fpath': journal,
+                        'resumed': journal_mod.merge(
+                            run_summary, resumed, journal_records
+                        ),
+                    }
+                if deduplicator is not None:
+                    run_summary['dedup'] = deduplicator.summary()
+                    run_summary['n_deduplicated'] = run_summary['dedup'][
+                        'n_duplicates'
+                    ]
+                if smoke_info is not None:
+                    from xdoctest import smoke
+
+                    run_summary['smoke'] = smoke.summary(
+                        smoke_info['n_candidates'],
+                        enabled_examples,
+                        smoke_info['not_sampled'],
+                        smoke_info['n_failed_first'],
+                        smoke_info['sample'],
+                        budget,
+                    )
+            finally:
+                if profiler is not None:
+                    profiler.finish()
+                if sampler is not None:
+                    sampler.finish()
+                if monitor is not None:
+                    monitor.finish()
+                if leak_detector is not None:
+                    leak_detector.finish()
+                if benchmark is not None:
+                    benchmark.finish()
+                if history is not None:
+                    history.finish()
+                if failure_cache is not None:
+                    failure_cache.finish()
+                if result_cache is not None:
+                    result_cache.finish()
+                if impact_recorder is not None:
+                    impact_recorder.finish()
+                if coverage_hook is not None:
+                    coverage_hook.finish()
+                if journal_hook is not None:
+                    journal_hook.finish()
+
+            if profiler is not None:
+                run_summary['profile'] = profiler.summary(run_summary['times'])
+            if sampler is not None:
+                run_summary['sample_profile'] = sampler.summary()
+            if monitor is not None:
+                run_summary['resources'] = monitor.summary()
+            if coverage_hook is not None:
+                run_summary['coverage'] = coverage_hook.summary(coverage)
+            if benchmark is not None:
+                _log('Benchmarking passing doctests')
+                benchmark.run()
+                run_summary['benchmark'] = benchmark.summary()
+                if benchmark_json is not None:
+                    benchmark.dump_json(benchmark_json)
+                    run_summary['benchmark']['fpath'] = benchmark_json
+            if leak_detector is not None:
+                if leak_reruns > 0 and leak_detector.suspects():
+                    _log(
+                        'Re-running leak suspects {} times'.format(leak_reruns)
+                    )
+                    leak_detector.confirm()
+                run_summary['leaks'] = leak_detector.summary()
+            if save_baseline is not None or compare_baseline is not None:
+                from xdoctest import baseline
+
+                measurements = baseline.measure(run_summary)
+                if compare_baseline is not None:
+                    reference = baseline.load(compare_baseline, cache_dir)
+                    if reference is None:
+                        comparison = {'name': compare_baseline, 'found': False}
+                    else:
+                        comparison = baseline.compare(
+                            reference,
+                            measurements,
+                            rtol=baseline_rtol,
+                            atol=baseline_atol,
+                        )
+                        comparison.update(
+                            {'name': compare_baseline, 'found': True}
+                        )
+                    run_summary['baseline'] = comparison
+                if save_baseline is not None:
+                    fpath = baseline.save(
+                        save_baseline, measurements, cache_dir
+                    )
+                    _log(
+                        'saved baseline {!r} to {}'.format(save_baseline, fpath)
+                    )
 
             toc = time.time()
             n_seconds = toc - tic
 
+            if result_cache is not None:
+                run_summary['result_cache'] = result_cache.stats()
+                run_summary['result_cache']['enabled'] = not no_cache
+
+            if timing.TIMER.enabled:
+                run_summary['timing'] = timing.TIMER.summary()
+
             #### TODO: callback and plugin system.
             # Can probably reuse some other library for this.
 
@@ -680,10 +1606,29 @@ def _print_summary_report(
     n_passed = run_summary.get('n_passed', 0)
     n_failed = run_summary.get('n_failed', 0)
     n_skipped = run_summary.get('n_skipped', 0)
+    n_not_run = run_summary.get('n_not_run', 0)
+    n_cached = run_summary.get('n_cached', 0)
+    n_deduplicated = run_summary.get('n_deduplicated', 0)
     n_warnings = len(warned) + len(parse_warnlist)
     pairs = zip(
-        [n_failed, n_passed, n_skipped, n_warnings],
-        ['failed', 'passed', 'skipped', 'warnings'],
+        [
+            n_failed,
+            n_passed,
+            n_cached,
+            n_deduplicated,
+            n_skipped,
+            n_not_run,
+            n_warnings,
+        ],
+        [
+            'failed',
+            'passed',
+            'cached',
+            'deduplicated',
+            'skipped',
+            'not run',
+            'warnings',
+        ],
     )
     parts = ['{n} {t}'.format(n=n, t=t) for n, t in pairs if n > 0]
     _fmtstr = '=== ' + ', '.join(parts) + ' in {n_seconds:.2f} seconds ==='
@@ -692,7 +1637,7 @@ def _print_summary_report(
     # color text based on worst type of error
     if n_failed > 0:
         cprint(summary_line, 'red')
-    elif n_warnings > 0 or (n_passed == 0 and n_skipped > 0):
+    elif n_warnings > 0 or (n_passed + n_cached == 0 and n_skipped > 0):
         cprint(summary_line, 'yellow')
     else:
         cprint(summary_line, 'green')
@@ -705,6 +1650,255 @@ def _print_summary_report(
         for example, n_secs in test_time_tups:
             _log('time: {:0.8f}, test: {}'.format(n_secs, example.cmdline))
 
+        # The individual lines (or parts) that dominate the runtime
+        n_lines = durations if durations > 0 else 10
+        line_rows = [
+            (wall, cpu, example.fpath, lineno, text)
+            for example in times.keys()
+            for lineno, wall, cpu, text in example.slowest_lines(n_lines)
+        ]
+        line_rows = sorted(line_rows, key=lambda t: t[0], reverse=True)
+        if line_rows:
+            _log('slowest lines:')
+        for wall, cpu, fpath, lineno, text in line_rows[:n_lines]:
+            _log(
+                'wall: {:0.8f}, cpu: {:0.8f}, line: {}:{}: {}'.format(
+                    wall, cpu, fpath, lineno, text
+                )
+            )
+
+    if 'profile' in run_summary:
+        profile_info = run_summary['profile']
+        cprint('\n=== Profile ===', 'white')
+        if profile_info['merged_fpath'] is not None:
+            _log('merged profile: {}'.format(profile_info['merged_fpath']))
+        for node, n_secs, stats_text in profile_info['slowest']:
+            cprint('--- {} ({:0.4f}s) ---'.format(node, n_secs), 'white')
+            _log(utils.indent(stats_text))
+
+    if 'sample_profile' in run_summary:
+        sample_info = run_summary['sample_profile']
+        n_samples = sample_info['n_samples']
+        cprint('\n=== Sampling profile ===', 'white')
+        _log('{} samples at {:g} Hz'.format(n_samples, sample_info['hz']))
+        if sample_info['fpath'] is not None:
+            _log('collapsed stacks: {}'.format(sample_info['fpath']))
+        if n_samples:
+            _log('doctests with the most samples:')
+            for node, count in sample_info['top_nodes']:
+                _log('    {:5.1f}% {}'.format(100 * count / n_samples, node))
+            _log('functions with the most samples:')
+            for func, count in sample_info['top_funcs']:
+                _log('    {:5.1f}% {}'.format(100 * count / n_samples, func))
+
+    if 'resources' in run_summary:
+        from xdoctest import resources
+
+        resource_info = run_summary['resources']
+        records = {r['node']: r for r in resource_info['records']}
+        cprint('\n=== Resource report ===', 'white')
+        _log('largest peak allocations:')
+        for node in resource_info['top_peak_alloc']:
+            _log('    ' + resources.format_record(records[node]))
+        if resource_info['top_rss_delta']:
+            _log('largest RSS growth:')
+            for node in resource_info['top_rss_delta']:
+                _log('    ' + resources.format_record(records[node]))
+
+    if 'shard' in run_summary:
+        shard_info = run_summary['shard']
+        cprint('\n=== Shard {} ==='.format(shard_info['shard']), 'white')
+        _log(
+            'covered {} of {} doctests ({} strategy), suite digest {}'.format(
+                len(shard_info['nodes']),
+                shard_info['n_suite'],
+                shard_info['strategy'],
+                shard_info['suite_digest'][:12],
+            )
+        )
+        if 'fpath' in shard_info:
+            _log('wrote shard report to {}'.format(shard_info['fpath']))
+
+    if 'static_skips' in run_summary:
+        cprint('\n=== Skipped at collection ===', 'yellow')
+        for reason, nodes in run_summary['static_skips'].items():
+            _log('{} doctests: {}'.format(len(nodes), reason))
+
+    if 'journal' in run_summary:
+        journal_info = run_summary['journal']
+        cprint('\n=== Journal ===', 'white')
+        _log('recorded results in {}'.format(journal_info['fpath']))
+        resumed_counts = journal_info['resumed']
+        if sum(resumed_counts.values()):
+            _log(
+                'resumed {} doctests from an earlier run: {}'.format(
+                    sum(resumed_counts.values()),
+                    ', '.join(
+                        '{} {}'.format(n, status)
+                        for status, n in resumed_counts.items()
+                        if n > 0
+                    ),
+                )
+            )
+
+    if 'dedup' in run_summary:
+        dedup_info = run_summary['dedup']
+        cprint('\n=== Deduplicated ===', 'white')
+        for group in dedup_info['groups']:
+            _log('{} ({})'.format(group['node'], group['status']))
+            for node in group['aliases']:
+                _log('    alias: {}'.format(node))
+        if dedup_info['groups']:
+            _log(
+                'did not run {} duplicates of {} doctests, saving about '
+                '{:.2f}s'.format(
+                    dedup_info['n_duplicates'],
+                    len(dedup_info['groups']),
+                    dedup_info['n_seconds_saved'],
+                )
+            )
+        else:
+            _log('found no duplicate doctests')
+
+    if 'smoke' in run_summary:
+        smoke_info = run_summary['smoke']
+        cprint('\n=== Smoke run ===', 'white')
+        text = 'ran {} of {} doctests from {} of {} modules'.format(
+            smoke_info['n_admitted'],
+            smoke_info['n_candidates'],
+            smoke_info['n_modules_covered'],
+            smoke_info['n_modules'],
+        )
+        if smoke_info['n_failed_first']:
+            text += ', {} recently failed first'.format(
+                smoke_info['n_failed_first']
+            )
+        _log(text)
+        if smoke_info['time_budget'] is not None:
+            _log(
+                'used {:.2f}s of a {:.2f}s time budget'.format(
+                    smoke_info['elapsed'], smoke_info['time_budget']
+                )
+            )
+        for reason, nodes in smoke_info['skipped'].items():
+            cprint('skipped {}: {}'.format(len(nodes), reason), 'yellow')
+
+    if 'coverage' in run_summary:
+        coverage_info = run_summary['coverage']
+        totals = coverage_info['totals']
+        cprint('\n=== Coverage ===', 'white')
+        if coverage_info['backend'] is None:
+            cprint('coverage was not measured', 'yellow')
+        else:
+            text = 'lines: {} of {} ({:0.1f}%)'.format(
+                totals['n_executed'],
+                totals['n_statements'],
+                100 * totals['n_executed'] / max(totals['n_statements'], 1),
+            )
+            if coverage_info['backend'] == 'monitoring':
+                text += ', branches: {} of {} ({:0.1f}%)'.format(
+                    totals['n_branches_taken'],
+                    totals['n_branches'],
+                    100
+                    * totals['n_branches_taken']
+                    / max(totals['n_branches'], 1),
+                )
+            _log(text)
+            if coverage_info['least_covered']:
+                _log('least covered files:')
+                for percent, n_missing, fpath in coverage_info['least_covered']:
+                    _log(
+                        '    {:5.1f}% ({} missed) {}'.format(
+                            percent, n_missing, fpath
+                        )
+                    )
+            if coverage_info['fpath'] is not None:
+                _log(
+                    'wrote {} report to {}'.format(
+                        coverage_info['format'], coverage_info['fpath']
+                    )
+                )
+
+    if 'benchmark' in run_summary:
+        bench_info = run_summary['benchmark']
+        cprint(
+            '\n=== Benchmark (repeat={}, warmup={}) ==='.format(
+                bench_info['repeat'], bench_info['warmup']
+            ),
+            'white',
+        )
+        for row in bench_info['results']:
+            _log(
+                'min: {:0.8f}, median: {:0.8f}, stddev: {:0.8f}, '
+                'test: {}'.format(
+                    row['min'], row['median'], row['stddev'], row['node']
+                )
+            )
+        for node, msg in bench_info['errors'].items():
+            cprint('error: {}, test: {}'.format(msg, node), 'red')
+        if 'fpath' in bench_info:
+            _log('wrote benchmark results to {}'.format(bench_info['fpath']))
+
+    if 'leaks' in run_summary:
+        from xdoctest import resources
+
+        leak_info = run_summary['leaks']
+        cprint('\n=== Leak report ===', 'white')
+        if leak_info['suspects']:
+            _log('doctests whose footprint grew:')
+            for record in leak_info['suspects']:
+                _log('    ' + resources.format_growth(record))
+        else:
+            _log('no doctests left objects, threads, or files behind')
+
+    if 'baseline' in run_summary:
+        from xdoctest import baseline
+
+        comparison = run_summary['baseline']
+        cprint(
+            '\n=== Baseline comparison ({}) ==='.format(comparison['name']),
+            'white',
+        )
+        if not comparison['found']:
+            cprint(
+                'baseline {!r} does not exist'.format(comparison['name']),
+                'yellow',
+            )
+        else:
+            _log(
+                '{} regressions, {} improvements, {} unchanged, {} new, '
+                '{} missing'.format(
+                    len(comparison['regressions']),
+                    len(comparison['improvements']),
+                    comparison['n_unchanged'],
+                    len(comparison['new']),
+                    len(comparison['missing']),
+                )
+            )
+            for row in comparison['regressions']:
+                cprint(baseline.format_row(row), 'red')
+            for row in comparison['improvements']:
+                cprint(baseline.format_row(row), 'green')
+
+    if 'result_cache' in run_summary:
+        cache_info = run_summary['result_cache']
+        cprint('\n=== Result cache ===', 'white')
+        _log(
+            '{} hits, {} misses, {:.1f}% hit rate'.format(
+                cache_info['hits'],
+                cache_info['misses'],
+                100 * cache_info['hit_rate'],
+            )
+        )
+        if not cache_info['enabled']:
+            _log('--no-cache was given, so every doctest was run')
+
+    if 'timing' in run_summary:
+        report_lines = timing.TIMER.format_report(total_seconds=n_seconds)
+        cprint('\n' + report_lines[0], 'white')
+        for line in report_lines[1:]:
+            _log(line)
+
 
 def _gather_zero_arg_examples(modpath):
     """
@@ -729,10 +1923,33 @@ def _gather_zero_arg_examples(modpath):
                     yield example
 
 
-def _run_examples(enabled_examples, verbose, config=None, _log=None):
+def _run_examples(
+    enabled_examples,
+    verbose,
+    config=None,
+    _log=None,
+    hooks=None,
+    maxfail=None,
+    budget=None,
+):
     """
     Internal helper, loops over each example, runs it, returns a summary
+
+    Args:
+        hooks (List | None): objects with ``before_example(example)`` and
+            ``after_example(example, summary)`` methods that are called
+            around each example. The after methods are called in reverse
+            order.
+
+        maxfail (int | None): if specified, stop after this many failures.
+            The examples that were not run are counted in ``n_not_run``.
+
+        budget (xdoctest.smoke.TimeBudget | None): if specified, only
+            examples it admits are run. The others are counted in
+            ``n_not_run``.
     """
+    if hooks is None:
+        hooks = []
     n_total = len(enabled_examples)
     assert _log is not None
     _log('running %d test(s)' % n_total)
@@ -747,7 +1964,12 @@ def _run_examples(enabled_examples, verbose, config=None, _log=None):
     on_error = 'return'
 
     for example in enabled_examples:
+        if budget is not None and not budget.admit(example):
+            continue
         try:
+            for hook in hooks:
+                hook.before_example(example)
+            summary = None
             try:
                 tic = time.time()
                 summary = example.run(verbose=verbose, on_error=on_error)
@@ -757,6 +1979,9 @@ def _run_examples(enabled_examples, verbose, config=None, _log=None):
             except Exception:
                 _log('\n'.join(example.repr_failure(with_tb=False)))
                 raise
+            finally:
+                for hook in reversed(hooks):
+                    hook.after_example(example, summary)
 
             summaries.append(summary)
             if example.warn_list:
@@ -784,6 +2009,9 @@ def _run_examples(enabled_examples, verbose, config=None, _log=None):
                     _log('\n'.join(example.repr_failure()))
                     ex_value = example.exc_info[1]
                     raise ex_value
+                if maxfail is not None and len(failed) >= maxfail:
+                    _log('Stopping after {} failure(s)'.format(len(failed)))
+                    break
         except KeyboardInterrupt:
             _log('Caught CTRL+c: Stopping tests')
             break
@@ -797,6 +2025,7 @@ def _run_examples(enabled_examples, verbose, config=None, _log=None):
     n_passed = sum(s['passed'] for s in summaries)
     n_failed = sum(s['failed'] for s in summaries)
     n_skipped = sum(s['skipped'] for s in summaries)
+    n_not_run = n_total - len(summaries)
 
     if config is not None and config.get('colored', True):
         _log(utils.color_text('============', 'white'))
@@ -817,6 +2046,7 @@ def _run_examples(enabled_examples, verbose, config=None, _log=None):
         'n_passed': n_passed,
         'n_failed': n_failed,
         'n_total': n_total,
+        'n_not_run': n_not_run,
         'times': times,
     }
     return run_summary
@@ -881,6 +2111,19 @@ def _update_argparse_cli(add_argument, prefix=None) -> None:
         default=None,
     )
 
+    add_argument(
+        *('-k', '--keyword'),
+        dest='keyword',
+        default=None,
+        metavar='EXPRESSION',
+        help=(
+            'Only run doctests whose callname or module name matches the '
+            'expression, e.g. "parse and not static". Words match substrings '
+            '(ignoring case) and may be combined with and, or, not, and '
+            'parentheses'
+        ),
+    )
+
     add_argument(
         *('--style',),
         type=str,
@@ -914,6 +2157,410 @@ def _update_argparse_cli(add_argument, prefix=None) -> None:
         help=('Same as if durations=0'),
     )
 
+    add_argument(
+        *('--profile',),
+        dest='profile',
+        action='store_true',
+        help=(
+            'Profile the user code of each doctest with cProfile. Writes '
+            'one .prof file per doctest and a merged combined.prof'
+        ),
+    )
+
+    add_argument(
+        *('--profile-dir',),
+        dest='profile_dir',
+        type=str,
+        help=(
+            'Directory for --profile and --sample-profile results. '
+            'Implies --profile unless --sample-profile is given'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--sample-profile',),
+        dest='sample_profile',
+        type=float,
+        metavar='HZ',
+        help=(
+            'Sample the stacks of running doctests HZ times per second and '
+            'write them in collapsed-stack format for flamegraph tools'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--trace-events',),
+        dest='trace_events',
+        type=str,
+        metavar='PATH',
+        help=(
+            'Write a timeline of the run in the Chrome trace event format. '
+            'View it with https://ui.perfetto.dev or about:tracing'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--resource-report',),
+        dest='resource_report',
+        action='store_true',
+        help=(
+            'Record the peak memory, RSS growth, CPU time, and context '
+            'switches of each doctest and report the top offenders'
+        ),
+    )
+
+    add_argument(
+        *('--detect-leaks',),
+        dest='detect_leaks',
+        action='store_true',
+        help=(
+            'Report doctests that leave objects, threads, or open files '
+            'behind after they finish'
+        ),
+    )
+
+    add_argument(
+        *('--leak-reruns',),
+        dest='leak_reruns',
+        type=int,
+        metavar='N',
+        help=(
+            'With --detect-leaks, re-run suspects N times to confirm that '
+            'they keep growing'
+        ),
+        default=0,
+    )
+
+    add_argument(
+        *('--repeat',),
+        dest='repeat',
+        type=int,
+        metavar='N',
+        help=(
+            'Benchmark mode. Re-execute each passing doctest in a fresh '
+            'namespace until N timings are collected and report the min, '
+            'median, and stddev. Only the first execution is checked'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--warmup',),
+        dest='warmup',
+        type=int,
+        metavar='K',
+        help='With --repeat, discard the first K executions of each doctest',
+        default=0,
+    )
+
+    add_argument(
+        *('--benchmark-json',),
+        dest='benchmark_json',
+        type=str,
+        metavar='PATH',
+        help='With --repeat, write the benchmark results to a JSON file',
+        default=None,
+    )
+
+    add_argument(
+        *('--cache-dir',),
+        dest='cache_dir',
+        type=str,
+        metavar='DPATH',
+        help=(
+            'Directory that stores information between runs. '
+            'Defaults to .xdoctest_cache or $XDOCTEST_CACHE_DIR'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--duration-history',),
+        dest='duration_history',
+        action='store_true',
+        help=(
+            'Keep a moving average of the duration of each doctest in the '
+            'cache directory'
+        ),
+    )
+
+    add_argument(
+        *('--longest-first',),
+        dest='longest_first',
+        action='store_true',
+        help=(
+            'Run the doctests that took longest in previous runs first. '
+            'Implies --duration-history'
+        ),
+    )
+
+    add_argument(
+        *('--progress',),
+        dest='progress',
+        action='store_true',
+        help=(
+            'Print a progress line with the estimated time remaining before '
+            'each doctest. Implies --duration-history'
+        ),
+    )
+
+    add_argument(
+        *('--save-baseline',),
+        dest='save_baseline',
+        type=str,
+        metavar='NAME',
+        help=(
+            'Store the duration (and with --resource-report the peak memory) '
+            'of each passing doctest as a named baseline in the cache directory'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--compare-baseline',),
+        dest='compare_baseline',
+        type=str,
+        metavar='NAME',
+        help='Compare the run against a saved baseline and report regressions',
+        default=None,
+    )
+
+    add_argument(
+        *('--baseline-rtol',),
+        dest='baseline_rtol',
+        type=float,
+        help='Relative slowdown tolerated by --compare-baseline',
+        default=0.2,
+    )
+
+    add_argument(
+        *('--baseline-atol',),
+        dest='baseline_atol',
+        type=float,
+        help='Slowdown in seconds tolerated by --compare-baseline',
+        default=0.005,
+    )
+
+    add_argument(
+        *('--fail-on-regression',),
+        dest='fail_on_regression',
+        action='store_true',
+        help='Exit with a nonzero code if --compare-baseline finds regressions',
+    )
+
+    add_argument(
+        *('--lf', '--last-failed'),
+        dest='last_failed',
+        action='store_true',
+        help=(
+            'Only run the doctests that failed last time, or all doctests '
+            'if none failed'
+        ),
+    )
+
+    add_argument(
+        *('--ff', '--failed-first'),
+        dest='failed_first',
+        action='store_true',
+        help='Run the doctests that failed last time before the others',
+    )
+
+    add_argument(
+        *('--maxfail',),
+        dest='maxfail',
+        type=int,
+        metavar='N',
+        help='Stop after N failures',
+        default=None,
+    )
+
+    add_argument(
+        *('-x', '--exitfirst'),
+        dest='maxfail',
+        action='store_const',
+        const=1,
+        help='Stop after the first failure. Same as --maxfail 1',
+    )
+
+    add_argument(
+        *('--cache-results',),
+        dest='cache_results',
+        action='store_true',
+        help=(
+            'Skip doctests that passed before if neither they, their module, '
+            'the first-party modules they import, nor the configuration changed'
+        ),
+    )
+
+    add_argument(
+        *('--no-cache',),
+        dest='no_cache',
+        action='store_true',
+        help=(
+            'With --cache-results, run every doctest but still update the cache'
+        ),
+    )
+
+    add_argument(
+        *('--changed-since',),
+        dest='changed_since',
+        type=str,
+        metavar='REV',
+        help=(
+            'Only run doctests with lines that differ between the git '
+            'revision REV and the working tree'
+        ),
+        default=None,
+    )
+
+    add_argument(
+        *('--record-impact',),
+        dest='record_impact',
+        action='store_true',
+        help=(
+            'Record the first-party lines that each doctest executes, so '
+            '--impacted can select doctests by the code they run'
+        ),
+    )
+
+    add_argument(
+        *('--impacted',),
+        dest='impacted',
+        action='store_true',
+        help=(
+            'Only run doctests that executed code that changed since '
+            '--record-impact, changed doctests, and new doctests'
+        ),
+    )
+
+    add_argument(
+        *('--coverage',),
+        dest='coverage',
+        default=None,
+        metavar='PATH',
+        help=(
+            'Measure line and branch coverage of first-party code and write '
+            'an lcov report (or JSON if PATH ends with .json) to PATH'
+        ),
+    )
+
+    add_argument(
+        *('--shard',),
+        dest='shard',
+        default=None,
+        metavar='INDEX/COUNT',
+        help=(
+            'Split the doctests into COUNT deterministic shards and only run '
+            'shard INDEX (counting from 1)'
+        ),
+    )
+
+    add_argument(
+        *('--shard-strategy',),
+        dest='shard_strategy',
+        default='hash',
+        choices=['hash', 'duration'],
+        help=(
+            'Assign doctests to shards by a stable hash of their name or by '
+            'balancing their recorded durations'
+        ),
+    )
+
+    add_argument(
+        *('--shard-report',),
+        dest='shard_report',
+        default=None,
+        metavar='PATH',
+        help='Write the doctests covered by the shard to a JSON file',
+    )
+
+    add_argument(
+        *('--listen',),
+        dest='listen',
+        default=None,
+        metavar='ADDR',
+        help=(
+            'With "serve-queue", the address workers connect to: HOST:PORT '
+            'or unix:PATH. Defaults to a free port on 127.0.0.1'
+        ),
+    )
+
+    add_argument(
+        *('--workers',),
+        dest='workers',
+        type=int,
+        default=0,
+        help='With "serve-queue", the number of local workers to start',
+    )
+
+    add_argument(
+        *('--journal',),
+        dest='journal',
+        default=None,
+        metavar='PATH',
+        help=(
+            'Append the result of each doctest to this file as soon as it '
+            'finishes, so an interrupted run can be resumed'
+        ),
+    )
+
+    add_argument(
+        *('--resume',),
+        dest='resume',
+        action='store_true',
+        help=(
+            'Skip the doctests that already have a result in the --journal '
+            'and include these results in the summary'
+        ),
+    )
+
+    add_argument(
+        *('--dedup',),
+        dest='dedup',
+        action='store_true',
+        help=(
+            'Run doctests of a module with identical source and config once '
+            'and report the others as aliases'
+        ),
+    )
+
+    add_argument(
+        *('--time-budget',),
+        dest='time_budget',
+        type=float,
+        default=None,
+        metavar='SECONDS',
+        help=(
+            'Stop starting doctests after this many seconds. Recently failed '
+            'doctests run first, then a sample spread over the modules'
+        ),
+    )
+
+    add_argument(
+        *('--sample',),
+        dest='sample',
+        default=None,
+        metavar='FRACTION|N',
+        help=(
+            'Only run a fraction (e.g. 0.2) or a number of the doctests. '
+            'Recently failed doctests come first, then a sample spread over '
+            'the modules'
+        ),
+    )
+
+    add_argument(
+        *('--timing-breakdown',),
+        dest='timing_breakdown',
+        action='store_true',
+        help=(
+            'Report the time spent discovering, parsing, importing, '
+            'compiling, executing, and checking doctests'
+        ),
+    )
+
     add_argument_kws: list[tuple[list, dict]] = [
         # (['--style'], dict(dest='style',
         #                    type=str, help='choose your style',
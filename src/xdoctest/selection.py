@@ -0,0 +1,229 @@
+"""
+Select doctests by name before their docstrings are parsed.
+
+A :class:`Selector` decides from the name of a callable (and of its module)
+alone whether any of its doctests can be selected.
+:func:`xdoctest.core.package_calldefs` applies it to the callnames of the
+:class:`CallDefNode` objects of each module, so the docstrings of callables
+that do not match are never parsed. This makes running a single doctest of a
+large package fast.
+
+Two kinds of selection are supported and can be combined:
+
+    * A pattern given as the command, e.g. ``xdoctest pkg func`` or
+      ``xdoctest pkg func:1``. It is matched against the callname (and the
+      number after the colon) and may contain the glob wildcards ``*``,
+      ``?``, and ``[...]``, e.g. ``xdoctest pkg 'MyClass.*'``.
+
+    * A keyword expression given with ``-k``, like in pytest. Each word
+      matches a callname or module name that contains it (ignoring case),
+      and words can be combined with ``and``, ``or``, ``not``, and
+      parentheses, e.g. ``-k "parse and not static"``.
+
+CommandLine:
+    xdoctest -m xdoctest 'parse_*'
+    xdoctest -m xdoctest all -k "directive and not budget"
+"""
+
+from __future__ import annotations
+
+import re
+import typing
+from fnmatch import fnmatchcase
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+_GLOB_CHARS = re.compile(r'[*?\[]')
+_TOKEN_RE = re.compile(r'\s*(\(|\)|[^\s()]+)')
+
+
+def is_pattern(text: str) -> bool:
+    """
+    Args:
+        text (str): a command
+
+    Returns:
+        bool: True if the text contains glob wildcards
+
+    Example:
+        >>> from xdoctest.selection import is_pattern
+        >>> is_pattern('func'), is_pattern('Class.*')
+        (False, True)
+    """
+    return _GLOB_CHARS.search(text) is not None
+
+
+def compile_keyword(expr: str) -> typing.Callable[[list[str]], bool]:
+    """
+    Compile a ``-k`` style keyword expression.
+
+    Args:
+        expr (str): words combined with ``and``, ``or``, ``not``, and
+            parentheses
+
+    Returns:
+        Callable[[List[str]], bool]: checks if the expression holds for a
+            list of names, where a word holds if it is contained in one of
+            the names (ignoring case)
+
+    Raises:
+        ValueError: if the expression is malformed
+
+    Example:
+        >>> from xdoctest.selection import compile_keyword
+        >>> match = compile_keyword('parse and not (static or dynamic)')
+        >>> match(['parse_calldefs']), match(['parse_static_calldefs'])
+        (True, False)
+        >>> compile_keyword('parse and')
+        Traceback (most recent call last):
+        ValueError: invalid keyword expression 'parse and': expected a word at the end
+    """
+    tokens = _TOKEN_RE.findall(expr)
+    pos = 0
+
+    def error(msg: str) -> ValueError:
+        return ValueError(
+            'invalid keyword expression {!r}: {}'.format(expr, msg)
+        )
+
+    def peek() -> str | None:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take() -> str:
+        nonlocal pos
+        token = peek()
+        if token is None:
+            raise error('expected a word at the end')
+        pos += 1
+        return token
+
+    # Grammar: expr := term ('or' term)*, term := factor ('and' factor)*,
+    # factor := 'not' factor | '(' expr ')' | word
+    def parse_expr() -> typing.Callable[[str], bool]:
+        terms = [parse_term()]
+        while peek() == 'or':
+            take()
+            terms.append(parse_term())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda text: any(term(text) for term in terms)
+
+    def parse_term() -> typing.Callable[[str], bool]:
+        factors = [parse_factor()]
+        while peek() == 'and':
+            take()
+            factors.append(parse_factor())
+        if len(factors) == 1:
+            return factors[0]
+        return lambda text: all(factor(text) for factor in factors)
+
+    def parse_factor() -> typing.Callable[[str], bool]:
+        token = take()
+        if token == 'not':
+            inner = parse_factor()
+            return lambda text: not inner(text)
+        if token == '(':
+            inner = parse_expr()
+            if take() != ')':
+                raise error('expected ")"')
+            return inner
+        if token in {')', 'and', 'or'}:
+            raise error('unexpected {!r}'.format(token))
+        word = token.lower()
+        return lambda text: word in text
+
+    if not tokens:
+        raise error('it is empty')
+    matcher = parse_expr()
+    if pos != len(tokens):
+        raise error('unexpected {!r}'.format(tokens[pos]))
+
+    def match(names: list[str]) -> bool:
+        # Words match substrings, so search in the joined lowercase names
+        return matcher('\n'.join(names).lower())
+
+    return match
+
+
+class Selector:
+    """
+    Decides which doctests are selected by a pattern and keyword expression.
+
+    Attributes:
+        pattern (str | None): an exact or glob pattern for the callname,
+            optionally followed by ``:`` and the doctest number
+        keyword (str | None): a ``-k`` style keyword expression
+
+    Example:
+        >>> from xdoctest.selection import Selector
+        >>> self = Selector('Class.*:0', keyword='not slow')
+        >>> self.match_callname('Class.method', 'pkg.mod')
+        True
+        >>> self.match_callname('Class.slow_method', 'pkg.mod')
+        False
+        >>> self.match_callname('func', 'pkg.mod')
+        False
+        >>> from xdoctest.doctest_example import DocTest
+        >>> examples = [DocTest('>>> pass', callname='Class.f', num=num)
+        ...             for num in range(2)]
+        >>> [self.match(e) for e in examples]
+        [True, False]
+    """
+
+    def __init__(
+        self, pattern: str | None = None, keyword: str | None = None
+    ) -> None:
+        """
+        Args:
+            pattern (str | None): an exact or glob pattern
+            keyword (str | None): a keyword expression
+        """
+        self.pattern = pattern
+        self.keyword = keyword
+        self._callname_pattern: str | None = None
+        self._num_pattern: str | None = None
+        if pattern is not None:
+            # Callnames never contain a colon
+            callname_pattern, _, num_pattern = pattern.partition(':')
+            self._callname_pattern = callname_pattern
+            self._num_pattern = num_pattern or None
+        self._keyword_match = None
+        if keyword is not None:
+            self._keyword_match = compile_keyword(keyword)
+
+    def match_callname(self, callname: str, modname: str | None = None) -> bool:
+        """
+        Check if doctests of a callable can be selected.
+
+        Args:
+            callname (str): the name of the callable
+            modname (str | None): the name of its module
+
+        Returns:
+            bool
+        """
+        if self._callname_pattern is not None:
+            if not fnmatchcase(callname, self._callname_pattern):
+                return False
+        if self._keyword_match is not None:
+            names = [callname] if modname is None else [callname, modname]
+            if not self._keyword_match(names):
+                return False
+        return True
+
+    def match(self, example: DocTest) -> bool:
+        """
+        Check if a doctest is selected.
+
+        Args:
+            example (DocTest): a doctest
+
+        Returns:
+            bool
+        """
+        if not self.match_callname(example.callname, example.modname):
+            return False
+        if self._num_pattern is not None:
+            return fnmatchcase(str(example.num), self._num_pattern)
+        return True
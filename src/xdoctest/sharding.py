@@ -0,0 +1,281 @@
+"""
+Split the doctests of a suite into deterministic shards.
+
+Continuous integration jobs can split a suite across several machines with
+``--shard INDEX/COUNT``, where ``INDEX`` counts from 1. Every machine
+collects the full suite and independently computes the same assignment, so
+no coordination is needed.
+
+The ``hash`` strategy (the default) assigns each doctest by a stable hash of
+a path independent key (module name, callname, and number), so a doctest
+stays on its shard when others are added or removed. The ``duration``
+strategy balances the expected run time of the shards by greedy bin-packing
+with the durations from :class:`xdoctest.cache.DurationHistory`. Because
+every shard must see the same durations, the cache directory has to be
+shared between the machines (e.g. restored from a CI cache), otherwise use
+the ``hash`` strategy.
+
+Each shard can write a report of the doctests it covered. The reports of
+all shards can be checked with :func:`verify_reports`, which verifies that
+their union is exactly the full suite.
+
+CommandLine:
+    xdoctest -m xdoctest all --shard 1/4 --shard-report shard1.json
+    xdoctest -m xdoctest all --shard 2/4 --shard-strategy duration
+    pytest --xdoctest --xdoctest-shard 1/4
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.cache import DurationHistory
+    from xdoctest.doctest_example import DocTest
+
+SHARD_STRATEGIES = ['hash', 'duration']
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """
+    Args:
+        text (str): ``INDEX/COUNT`` where INDEX counts from 1
+
+    Returns:
+        Tuple[int, int]: the zero-based index and the number of shards
+
+    Raises:
+        ValueError: if the text is not a valid shard specification
+
+    Example:
+        >>> from xdoctest.sharding import parse_shard
+        >>> parse_shard('2/4')
+        (1, 4)
+        >>> parse_shard('5/4')
+        Traceback (most recent call last):
+        ValueError: shard index must be between 1 and 4, got '5/4'
+    """
+    try:
+        index_text, count_text = text.split('/')
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError('shard must be INDEX/COUNT, got {!r}'.format(text))
+    if count < 1:
+        raise ValueError('shard count must be positive, got {!r}'.format(text))
+    if not 1 <= index <= count:
+        raise ValueError(
+            'shard index must be between 1 and {}, got {!r}'.format(count, text)
+        )
+    return index - 1, count
+
+
+def shard_key(example: DocTest) -> str:
+    """
+    A name for a doctest that does not depend on where the code is checked
+    out.
+
+    Args:
+        example (DocTest): a doctest
+
+    Returns:
+        str
+
+    Example:
+        >>> from xdoctest.sharding import shard_key
+        >>> from xdoctest.doctest_example import DocTest
+        >>> print(shard_key(DocTest('>>> pass', callname='func', num=1)))
+        <modname?>::func:1
+    """
+    return '{}::{}:{}'.format(example.modname, example.callname, example.num)
+
+
+def _stable_hash(text: str) -> int:
+    # Unlike hash(), this is the same in every process
+    return int(hashlib.sha1(text.encode('utf8')).hexdigest()[:16], 16)
+
+
+def assign(
+    examples: list[DocTest],
+    count: int,
+    strategy: str = 'hash',
+    history: DurationHistory | None = None,
+) -> list[int]:
+    """
+    Assign each doctest to a shard.
+
+    Args:
+        examples (List[DocTest]): the full suite
+        count (int): the number of shards
+        strategy (str): ``'hash'`` or ``'duration'``
+        history (DurationHistory | None): expected durations, required by
+            the ``'duration'`` strategy. Doctests without a history are
+            expected to take the mean duration.
+
+    Returns:
+        List[int]: the zero-based shard of each doctest
+
+    Example:
+        >>> from xdoctest.sharding import assign
+        >>> from xdoctest.cache import DurationHistory
+        >>> from xdoctest.doctest_example import DocTest
+        >>> examples = [DocTest('>>> pass', callname=n) for n in 'abcdef']
+        >>> shards = assign(examples, 3)
+        >>> assert shards == assign(examples[::-1], 3)[::-1]
+        >>> history = DurationHistory('/does/not/exist')
+        >>> for e, seconds in zip(examples, [6, 1, 2, 3, 4, 5]):
+        ...     history.update(shard_key(e), seconds)
+        >>> # Each shard gets 7 seconds: {a, b}, {f, c}, and {e, d}
+        >>> assign(examples, 3, 'duration', history)
+        [0, 0, 1, 2, 2, 1]
+    """
+    if strategy == 'hash':
+        return [_stable_hash(shard_key(e)) % count for e in examples]
+    elif strategy == 'duration':
+        if history is None:
+            raise ValueError('the duration strategy requires a history')
+        estimates = [history.estimate(shard_key(e)) for e in examples]
+        known = [s for s in estimates if s is not None]
+        default = sum(known) / len(known) if known else 1.0
+        weights = [default if s is None else s for s in estimates]
+        keys = [shard_key(e) for e in examples]
+        # Place the longest doctests first on the least loaded shard. Ties
+        # are broken by the key, so every shard computes the same answer.
+        order = sorted(
+            range(len(examples)), key=lambda i: (-weights[i], keys[i])
+        )
+        totals = [0.0] * count
+        shards = [0] * len(examples)
+        for idx in order:
+            shard = min(range(count), key=lambda s: (totals[s], s))
+            shards[idx] = shard
+            totals[shard] += weights[idx]
+        return shards
+    else:
+        raise KeyError(strategy)
+
+
+def suite_digest(keys: typing.Iterable[str]) -> str:
+    """
+    Args:
+        keys (Iterable[str]): the shard keys of a suite
+
+    Returns:
+        str: a hash of the set of keys
+    """
+    hasher = hashlib.sha1()
+    for key in sorted(set(keys)):
+        hasher.update(key.encode('utf8') + b'\n')
+    return hasher.hexdigest()
+
+
+def make_report(
+    examples: list[DocTest],
+    selected: list[DocTest],
+    index: int,
+    count: int,
+    strategy: str,
+) -> dict[str, typing.Any]:
+    """
+    Describe what a shard covers.
+
+    Args:
+        examples (List[DocTest]): the full suite
+        selected (List[DocTest]): the doctests of this shard
+        index (int): the zero-based index of this shard
+        count (int): the number of shards
+        strategy (str): how the doctests were assigned
+
+    Returns:
+        Dict[str, Any]: the shard (counting from 1), the strategy, the size
+            and digest of the full suite, and the keys of the selected
+            doctests
+    """
+    return {
+        'version': 1,
+        'shard': '{}/{}'.format(index + 1, count),
+        'strategy': strategy,
+        'n_suite': len({shard_key(e) for e in examples}),
+        'suite_digest': suite_digest(shard_key(e) for e in examples),
+        'nodes': sorted(shard_key(e) for e in selected),
+    }
+
+
+def dump_report(report: dict[str, typing.Any], fpath: str) -> None:
+    """
+    Args:
+        report (Dict[str, Any]): the result of :func:`make_report`
+        fpath (str): output file
+    """
+    dpath = os.path.dirname(fpath)
+    if dpath:
+        os.makedirs(dpath, exist_ok=True)
+    with open(fpath, 'w') as file:
+        json.dump(report, file, indent=1)
+
+
+def verify_reports(reports: list[dict[str, typing.Any]]) -> list[str]:
+    """
+    Check that the shard reports of one run cover the suite exactly once.
+
+    Args:
+        reports (List[Dict[str, Any]]): the reports of every shard, e.g.
+            loaded from the files written by ``--shard-report``
+
+    Returns:
+        List[str]: the problems found. Empty if the shards are complete.
+
+    Example:
+        >>> from xdoctest.sharding import assign, make_report, verify_reports
+        >>> from xdoctest.doctest_example import DocTest
+        >>> examples = [DocTest('>>> pass', callname=n) for n in 'abcdef']
+        >>> shards = assign(examples, 2)
+        >>> reports = [
+        ...     make_report(examples, [e for e, s in zip(examples, shards)
+        ...                            if s == index], index, 2, 'hash')
+        ...     for index in range(2)]
+        >>> verify_reports(reports)
+        []
+        >>> verify_reports(reports[:1])
+        ['missing shards: 2/2', 'covered 4 of 6 doctests']
+    """
+    if not reports:
+        return ['no shard reports']
+    problems = []
+    first = reports[0]
+    count = int(first['shard'].split('/')[1])
+    for report in reports[1:]:
+        for key in ['strategy', 'n_suite', 'suite_digest']:
+            if report[key] != first[key]:
+                problems.append(
+                    'shards {} and {} disagree on the {}'.format(
+                        first['shard'], report['shard'], key
+                    )
+                )
+    seen_shards = [report['shard'] for report in reports]
+    missing = [
+        '{}/{}'.format(i + 1, count)
+        for i in range(count)
+        if '{}/{}'.format(i + 1, count) not in seen_shards
+    ]
+    if missing:
+        problems.append('missing shards: {}'.format(', '.join(missing)))
+    covered: dict[str, str] = {}
+    for report in reports:
+        for key in report['nodes']:
+            if key in covered:
+                problems.append(
+                    '{} ran in shards {} and {}'.format(
+                        key, covered[key], report['shard']
+                    )
+                )
+            covered[key] = report['shard']
+    if len(covered) != first['n_suite']:
+        problems.append(
+            'covered {} of {} doctests'.format(len(covered), first['n_suite'])
+        )
+    elif suite_digest(covered) != first['suite_digest']:
+        problems.append('the covered doctests differ from the suite')
+    return problems
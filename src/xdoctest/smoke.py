@@ -0,0 +1,304 @@
+"""
+Run a representative subset of the doctests within a time budget.
+
+Quick runs (e.g. in a pre-push hook) rarely have time for the full suite.
+``--sample FRACTION|N`` runs a fraction (e.g. ``0.2``) or a number (e.g.
+``50``) of the doctests and ``--time-budget SECONDS`` stops handing out
+doctests when the time is up. Both can be combined.
+
+The doctests are prioritized with what earlier runs recorded in the cache
+directory (see :mod:`xdoctest.cache`):
+
+    1. Doctests that failed the last time they ran come first.
+
+    2. The others are interleaved across modules, so the first doctests
+       cover as many distinct modules as possible. Within a module, the
+       doctests that ran the fewest times come first (so successive runs
+       rotate through the module) and then the fastest ones.
+
+With a time budget, a doctest whose expected duration exceeds the remaining
+time is skipped (a cheaper one later in the order may still fit), and once
+the budget is used up the remaining doctests are skipped. The summary
+reports how many doctests were skipped for each reason.
+
+CommandLine:
+    xdoctest -m xdoctest all --time-budget 30
+    xdoctest -m xdoctest all --sample 0.25
+    xdoctest -m xdoctest all --sample 50 --time-budget 30
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import math
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from xdoctest.cache import DurationHistory
+    from xdoctest.doctest_example import DocTest
+
+NOT_SAMPLED = 'not sampled'
+OVER_BUDGET = 'expected to exceed the remaining time budget'
+BUDGET_EXHAUSTED = 'time budget exhausted'
+
+
+def parse_sample(text: str) -> float | int:
+    """
+    Args:
+        text (str): a fraction in ``(0, 1]`` or a positive number of doctests
+
+    Returns:
+        float | int: the fraction or the number of doctests
+
+    Raises:
+        ValueError: if the text is not a valid sample size
+
+    Example:
+        >>> from xdoctest.smoke import parse_sample
+        >>> parse_sample('0.25'), parse_sample('40'), parse_sample('1.0')
+        (0.25, 40, 1.0)
+        >>> parse_sample('1.5')
+        Traceback (most recent call last):
+        ValueError: sample must be a fraction in (0, 1] or a positive integer, got '1.5'
+    """
+    msg = 'sample must be a fraction in (0, 1] or a positive integer, got {!r}'
+    try:
+        number: float | int = int(text)
+    except ValueError:
+        try:
+            number = float(text)
+        except ValueError:
+            raise ValueError(msg.format(text))
+        if not 0 < number <= 1:
+            raise ValueError(msg.format(text))
+    else:
+        if number < 1:
+            raise ValueError(msg.format(text))
+    return number
+
+
+def sample_size(sample: float | int, n_total: int) -> int:
+    """
+    Args:
+        sample (float | int): a result of :func:`parse_sample`
+        n_total (int): the number of candidate doctests
+
+    Returns:
+        int: the number of doctests to run
+
+    Example:
+        >>> from xdoctest.smoke import sample_size
+        >>> sample_size(0.25, 10), sample_size(40, 10), sample_size(3, 10)
+        (3, 10, 3)
+    """
+    if isinstance(sample, float):
+        return min(n_total, math.ceil(sample * n_total))
+    return min(n_total, sample)
+
+
+def _stable_hash(text: str) -> int:
+    return int(hashlib.sha1(text.encode('utf8')).hexdigest()[:16], 16)
+
+
+def prioritize(
+    examples: list[DocTest],
+    history: DurationHistory | None = None,
+    failed: typing.Container[str] = (),
+) -> list[DocTest]:
+    """
+    Order doctests so a prefix of any length is a good sample of the suite.
+
+    Args:
+        examples (List[DocTest]): the candidate doctests
+        history (DurationHistory | None): the recorded durations and number
+            of runs of each doctest
+        failed (Container[str]): the keys (see
+            :func:`xdoctest.sharding.shard_key`) of the doctests that failed
+            the last time they ran
+
+    Returns:
+        List[DocTest]: recently failed doctests, followed by the others
+            interleaved across modules
+
+    Example:
+        >>> from xdoctest.smoke import prioritize
+        >>> from xdoctest.cache import DurationHistory
+        >>> from xdoctest.doctest_example import DocTest
+        >>> examples = []
+        >>> for modname, name in ['a1', 'a2', 'a3', 'b1', 'b2', 'c1']:
+        ...     example = DocTest('>>> pass', callname=modname + name)
+        ...     example.modname = modname
+        ...     examples.append(example)
+        >>> from xdoctest.sharding import shard_key
+        >>> history = DurationHistory('/does/not/exist')
+        >>> history.update(shard_key(examples[0]), 5.0)
+        >>> history.update(shard_key(examples[1]), 1.0)
+        >>> history.update(shard_key(examples[2]), 1.0)
+        >>> history.update(shard_key(examples[2]), 1.0)
+        >>> failed = {shard_key(examples[4])}
+        >>> order = prioritize(examples, history, failed)
+        >>> # b2 failed, then one doctest of each module. The doctest of
+        >>> # module a that ran the fewest times and is fastest comes first.
+        >>> [e.callname for e in order]
+        ['b2', 'a2', 'b1', 'c1', 'a1', 'a3']
+    """
+    from xdoctest.sharding import shard_key
+
+    recent = [e for e in examples if shard_key(e) in failed]
+    known = []
+    if history is not None:
+        known = [history.estimate(shard_key(e)) for e in examples]
+    known = [s for s in known if s is not None]
+    default = sum(known) / len(known) if known else 0.0
+
+    def sortkey(example: DocTest) -> tuple[int, float, int]:
+        n_runs = 0
+        seconds = None
+        if history is not None:
+            n_runs = history.entries.get(shard_key(example), {}).get('n', 0)
+            seconds = history.estimate(shard_key(example))
+        if seconds is None:
+            seconds = default
+        return (n_runs, seconds, _stable_hash(shard_key(example)))
+
+    groups: dict[str, list[DocTest]] = collections.OrderedDict()
+    for example in examples:
+        if shard_key(example) not in failed:
+            groups.setdefault(str(example.modname), []).append(example)
+    queues = [
+        collections.deque(sorted(g, key=sortkey)) for g in groups.values()
+    ]
+    interleaved = []
+    while queues:
+        # Each round takes the next doctest of every module
+        for queue in queues:
+            interleaved.append(queue.popleft())
+        queues = [queue for queue in queues if queue]
+    return recent + interleaved
+
+
+class TimeBudget:
+    """
+    Decides which doctests still fit in a time budget while a run goes on.
+
+    Attributes:
+        seconds (float): the budget
+        skipped (List[Tuple[DocTest, str]]): the doctests that were not
+            admitted and why
+
+    Example:
+        >>> from xdoctest.smoke import TimeBudget
+        >>> from xdoctest.cache import DurationHistory
+        >>> from xdoctest.doctest_example import DocTest
+        >>> slow, fast = [DocTest('>>> pass', callname=n) for n in 'ab']
+        >>> from xdoctest.sharding import shard_key
+        >>> history = DurationHistory('/does/not/exist')
+        >>> history.update(shard_key(slow), 60.0)
+        >>> self = TimeBudget(30, history)
+        >>> self.start()
+        >>> self.admit(slow), self.admit(fast)
+        (False, True)
+        >>> self.skipped[0][1]
+        'expected to exceed the remaining time budget'
+    """
+
+    def __init__(
+        self, seconds: float, history: DurationHistory | None = None
+    ) -> None:
+        """
+        Args:
+            seconds (float): the budget
+            history (DurationHistory | None): the expected durations
+        """
+        if seconds <= 0:
+            raise ValueError(
+                'time budget must be positive, got {}'.format(seconds)
+            )
+        self.seconds = seconds
+        self.history = history
+        self.skipped: list[tuple[DocTest, str]] = []
+        self._start: float | None = None
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+
+    def elapsed(self) -> float:
+        """
+        Returns:
+            float: the seconds since :func:`start`
+        """
+        if self._start is None:
+            return 0.0
+        return time.perf_counter() - self._start
+
+    def admit(self, example: DocTest) -> bool:
+        """
+        Args:
+            example (DocTest): the next doctest in the run
+
+        Returns:
+            bool: True if the doctest should run. Otherwise it is added to
+                :attr:`skipped`.
+        """
+        remaining = self.seconds - self.elapsed()
+        reason = None
+        if remaining <= 0:
+            reason = BUDGET_EXHAUSTED
+        elif self.history is not None:
+            from xdoctest.sharding import shard_key
+
+            expected = self.history.estimate(shard_key(example))
+            if expected is not None and expected > remaining:
+                reason = OVER_BUDGET
+        if reason is None:
+            return True
+        self.skipped.append((example, reason))
+        return False
+
+
+def summary(
+    n_candidates: int,
+    selected: list[DocTest],
+    not_sampled: list[DocTest],
+    n_failed_first: int,
+    sample: float | int | None,
+    budget: TimeBudget | None,
+) -> dict[str, typing.Any]:
+    """
+    Describe what a smoke run covered and what it skipped.
+
+    Args:
+        n_candidates (int): the number of doctests before sampling
+        selected (List[DocTest]): the sampled doctests in the order of the run
+        not_sampled (List[DocTest]): the doctests left out by the sample
+        n_failed_first (int): the number of recently failed doctests that
+            were put first
+        sample (float | int | None): the requested sample size
+        budget (TimeBudget | None): the budget of the run
+
+    Returns:
+        Dict[str, Any]: the counts of run doctests and covered modules, and
+            the skipped node ids by reason
+    """
+    skipped: dict[str, list[str]] = collections.OrderedDict()
+    for example in not_sampled:
+        skipped.setdefault(NOT_SAMPLED, []).append(example.node)
+    skipped_during_run = set()
+    if budget is not None:
+        for example, reason in budget.skipped:
+            skipped.setdefault(reason, []).append(example.node)
+            skipped_during_run.add(example.node)
+    ran = [e for e in selected if e.node not in skipped_during_run]
+    return {
+        'n_candidates': n_candidates,
+        'n_admitted': len(ran),
+        'n_failed_first': n_failed_first,
+        'n_modules': len({e.modname for e in selected + not_sampled}),
+        'n_modules_covered': len({e.modname for e in ran}),
+        'sample': sample,
+        'time_budget': None if budget is None else budget.seconds,
+        'elapsed': None if budget is None else budget.elapsed(),
+        'skipped': skipped,
+    }
@@ -0,0 +1,539 @@
+"""
+Lightweight phase timing for the native xdoctest runner.
+
+When enabled via ``--timing-breakdown``, the runner accumulates
+:func:`time.perf_counter` measurements for each phase of a run. This answers
+the question "is my doctest run slow because of xdoctest or because of my
+code?".
+
+The phases are:
+
+    * ``discover`` - finding module paths in a package
+    * ``calldefs`` - statically (or dynamically) extracting docstrings
+    * ``parse`` - splitting docstrings into doctest parts
+    * ``import`` - importing the module that contains a doctest
+    * ``compile`` - compiling each doctest part
+    * ``exec`` - running user code (everything else is framework overhead)
+    * ``check`` - comparing got / want
+    * ``fingerprint`` - hashing doctests and their dependencies for
+      ``--cache-results``
+
+Instrumented code calls :func:`span`, which returns a shared no-op context
+when timing is disabled and no listeners are registered, so the cost of the
+hooks is a global lookup and an attribute check.
+
+The :class:`CodeTimer` measures the wall and CPU time of individual doctest
+parts and, optionally, of each line within a part.
+
+Instrumented caches call :func:`count` to record events such as hits and
+misses, which the breakdown reports next to the phases.
+
+Other tools (e.g. the per-doctest profiler in :mod:`xdoctest.profiling`) can
+observe the same spans by registering a listener with :func:`add_listener`.
+A listener is any object with ``enter(span)`` and ``exit(span)`` methods.
+
+Example:
+    >>> from xdoctest import timing
+    >>> timer = timing.PhaseTimer()
+    >>> timer.enabled = True
+    >>> with timer.span('parse', 'foo.py'):
+    ...     pass
+    >>> with timer.span('exec', 'foo.py'):
+    ...     pass
+    >>> timer.count('module_exists', 'hits')
+    >>> summary = timer.summary()
+    >>> assert summary['counts']['parse'] == 1
+    >>> assert summary['counters'] == {'module_exists': {'hits': 1}}
+    >>> assert 'foo.py' in summary['per_module']
+    >>> print('\\n'.join(timer.format_report()))
+    === Timing breakdown ===
+    ...
+"""
+
+from __future__ import annotations
+
+import contextlib
+import sys
+import time
+import types
+import typing
+from collections import defaultdict
+
+PHASES = [
+    'discover',
+    'calldefs',
+    'parse',
+    'import',
+    'compile',
+    'exec',
+    'check',
+    'fingerprint',
+]
+
+# The phases that correspond to work done by xdoctest rather than user code.
+FRAMEWORK_PHASES = [p for p in PHASES if p != 'exec']
+
+# Phases that count towards the cost of "parsing" a file
+PARSE_PHASES = ['calldefs', 'parse']
+
+# Spans that enclose other phases. These are only reported to listeners and
+# are not accumulated by the :class:`PhaseTimer`.
+#   * ``run`` - an entire call to :func:`xdoctest.runner.doctest_module`
+#   * ``doctest`` - a call to :func:`xdoctest.doctest_example.DocTest.run`
+OUTLINE_PHASES = ['run', 'doctest']
+
+_TIMED_PHASES = frozenset(PHASES)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+# Objects notified when a span is entered or exited
+_LISTENERS: list[typing.Any] = []
+
+
+class _Span:
+    """
+    Context manager that adds its elapsed time to a :class:`PhaseTimer` and
+    notifies any registered listeners.
+
+    Attributes:
+        phase (str): the phase being measured
+        key (Any): usually the path of the module the work is done for
+        info (Any): extra phase-specific information (e.g. the part number
+            for ``exec`` spans)
+        start (float): :func:`time.perf_counter` at entry
+        elapsed (float): seconds spent in the span (set on exit)
+    """
+
+    __slots__ = ('timer', 'phase', 'key', 'info', 'start', 'elapsed')
+
+    def __init__(
+        self,
+        timer: PhaseTimer,
+        phase: str,
+        key: typing.Any,
+        info: typing.Any = None,
+    ) -> None:
+        self.timer = timer
+        self.phase = phase
+        self.key = key
+        self.info = info
+        self.start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self) -> _Span:
+        for listener in _LISTENERS:
+            listener.enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.elapsed = time.perf_counter() - self.start
+        if self.timer.enabled and self.phase in _TIMED_PHASES:
+            self.timer.add(self.phase, self.elapsed, self.key)
+        for listener in reversed(_LISTENERS):
+            listener.exit(self)
+
+
+class PhaseTimer:
+    """
+    Accumulates time spent in each phase, in total and per module.
+
+    Attributes:
+        enabled (bool): if False, :func:`span` is a no-op
+        totals (Dict[str, float]): total seconds spent in each phase
+        counts (Dict[str, int]): number of times each phase was entered
+        per_module (Dict[str, Dict[str, float]]):
+            seconds spent in each phase keyed by module path
+        counters (Dict[str, Dict[str, int]]): the number of times each event
+            (e.g. ``'hits'``) happened, keyed by what counted it (e.g. a cache)
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget all previous measurements
+        """
+        self.totals: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+        self.per_module: dict[str, dict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self.counters: dict[str, dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+    def add(self, phase: str, seconds: float, key: typing.Any = None) -> None:
+        """
+        Record that ``seconds`` were spent in ``phase``.
+
+        Args:
+            phase (str): one of :data:`PHASES`
+            seconds (float): elapsed time
+            key (Any): usually the path of the module the work was done for
+        """
+        self.totals[phase] += seconds
+        self.counts[phase] += 1
+        if key is not None:
+            self.per_module[str(key)][phase] += seconds
+
+    def count(self, name: str, event: str, n: int = 1) -> None:
+        """
+        Record that an event happened.
+
+        Args:
+            name (str): what counts the event, e.g. the name of a cache
+            event (str): what happened, e.g. ``'hits'``
+            n (int): how many times it happened
+        """
+        self.counters[name][event] += n
+
+    def span(
+        self, phase: str, key: typing.Any = None, info: typing.Any = None
+    ) -> typing.ContextManager[typing.Any]:
+        """
+        Args:
+            phase (str): the phase being measured
+            key (Any): the module the work is done for
+            info (Any): extra information passed to listeners
+
+        Returns:
+            ContextManager: measures the enclosed block if enabled
+        """
+        if not self.enabled and not _LISTENERS:
+            return _NULL_SPAN
+        return _Span(self, phase, key, info)
+
+    def summary(self) -> dict[str, typing.Any]:
+        """
+        Returns:
+            Dict[str, Any]: json-friendly aggregated measurements
+        """
+        framework = sum(self.totals.get(p, 0.0) for p in FRAMEWORK_PHASES)
+        user = self.totals.get('exec', 0.0)
+        summary = {
+            'totals': {p: self.totals.get(p, 0.0) for p in PHASES},
+            'counts': {p: self.counts.get(p, 0) for p in PHASES},
+            'per_module': {k: dict(v) for k, v in self.per_module.items()},
+            'counters': {k: dict(v) for k, v in self.counters.items()},
+            'framework_seconds': framework,
+            'user_seconds': user,
+            'overhead_ratio': (framework / user) if user > 0 else None,
+        }
+        return summary
+
+    def slowest_to_parse(self, top: int = 5) -> list[tuple[str, float]]:
+        """
+        Args:
+            top (int): number of files to return
+
+        Returns:
+            List[Tuple[str, float]]: the files that took longest to parse
+        """
+        parse_times = [
+            (key, sum(phases.get(p, 0.0) for p in PARSE_PHASES))
+            for key, phases in self.per_module.items()
+        ]
+        parse_times = [t for t in parse_times if t[1] > 0]
+        parse_times = sorted(parse_times, key=lambda t: t[1], reverse=True)
+        return parse_times[:top]
+
+    def format_report(
+        self, total_seconds: float | None = None, top: int = 5
+    ) -> list[str]:
+        """
+        Args:
+            total_seconds (float | None):
+                wall time of the entire run, used to report time that was not
+                attributed to any phase.
+            top (int): number of slowest files to list
+
+        Returns:
+            List[str]: lines of a human readable report
+        """
+        summary = self.summary()
+        lines = ['=== Timing breakdown ===']
+        for phase in PHASES:
+            lines.append(
+                '{:>11}: {:0.4f}s ({} calls)'.format(
+                    phase, summary['totals'][phase], summary['counts'][phase]
+                )
+            )
+        if total_seconds is not None:
+            accounted = sum(summary['totals'].values())
+            lines.append(
+                '{:>11}: {:0.4f}s'.format(
+                    'other', max(total_seconds - accounted, 0.0)
+                )
+            )
+        ratio = summary['overhead_ratio']
+        if ratio is None:
+            lines.append(
+                'framework overhead: {:0.4f}s (no user code ran)'.format(
+                    summary['framework_seconds']
+                )
+            )
+        else:
+            lines.append(
+                'framework overhead: {:0.4f}s ({:0.1f}% of user code time)'.format(
+                    summary['framework_seconds'], ratio * 100
+                )
+            )
+        if summary['counters']:
+            lines.append('counters:')
+            for name, events in sorted(summary['counters'].items()):
+                lines.append(
+                    '    {}: {}'.format(
+                        name,
+                        ', '.join(
+                            '{} {}'.format(n, event)
+                            for event, n in sorted(events.items())
+                        ),
+                    )
+                )
+        slowest = self.slowest_to_parse(top=top)
+        if slowest:
+            lines.append('slowest files to parse:')
+            for key, seconds in slowest:
+                lines.append('    {:0.4f}s {}'.format(seconds, key))
+        return lines
+
+
+#: The process-wide timer used by the instrumented code paths
+TIMER = PhaseTimer()
+
+
+def span(
+    phase: str, key: typing.Any = None, info: typing.Any = None
+) -> typing.ContextManager[typing.Any]:
+    """
+    Measure a block of code with the global :data:`TIMER`.
+
+    Args:
+        phase (str): one of :data:`PHASES`
+        key (Any): usually the path of the module the work is done for
+        info (Any): extra information passed to listeners
+
+    Returns:
+        ContextManager
+
+    Example:
+        >>> from xdoctest import timing
+        >>> with timing.span('parse'):
+        ...     pass
+    """
+    if not TIMER.enabled and not _LISTENERS:
+        return _NULL_SPAN
+    return _Span(TIMER, phase, key, info)
+
+
+def count(name: str, event: str, n: int = 1) -> None:
+    """
+    Count an event with the global :data:`TIMER` if it is enabled.
+
+    Args:
+        name (str): what counts the event, e.g. the name of a cache
+        event (str): what happened, e.g. ``'hits'``
+        n (int): how many times it happened
+
+    Example:
+        >>> from xdoctest import timing
+        >>> timing.count('module_exists', 'misses')
+    """
+    if TIMER.enabled:
+        TIMER.count(name, event, n)
+
+
+def add_listener(listener: typing.Any) -> None:
+    """
+    Register an object to be notified when spans are entered and exited.
+
+    Args:
+        listener (Any): an object with ``enter(span)`` and ``exit(span)``
+            methods.
+
+    Example:
+        >>> from xdoctest import timing
+        >>> class PrintListener:
+        ...     def enter(self, span):
+        ...         if span.key == 'foo.py':
+        ...             print('enter', span.phase, span.info)
+        ...     def exit(self, span):
+        ...         if span.key == 'foo.py':
+        ...             print('exit', span.phase)
+        >>> listener = PrintListener()
+        >>> timing.add_listener(listener)
+        >>> try:
+        ...     with timing.span('exec', 'foo.py', 0):
+        ...         pass
+        ... finally:
+        ...     timing.remove_listener(listener)
+        enter exec 0
+        exit exec
+    """
+    _LISTENERS.append(listener)
+
+
+def remove_listener(listener: typing.Any) -> None:
+    """
+    Unregister a listener added with :func:`add_listener`.
+
+    Args:
+        listener (Any): a previously registered listener
+    """
+    if listener in _LISTENERS:
+        _LISTENERS.remove(listener)
+
+
+class CodeTimer:
+    """
+    Context manager that measures the wall and CPU time spent executing a
+    block, and optionally the time spent on each top-level line of a code
+    object executed inside of it.
+
+    Line timing only instruments the given code object (not the functions it
+    calls), so the time of a line includes any calls it makes. On Python 3.12+
+    this uses :mod:`sys.monitoring` local ``LINE`` events, which only fire for
+    that code object. On older versions it falls back to :func:`sys.settrace`,
+    unless another trace function (e.g. a debugger or coverage) is active, in
+    which case only the total time is measured.
+
+    Attributes:
+        wall (float): wall time in seconds
+        cpu (float): process CPU time in seconds
+        line_times (Dict[int, List[float]]):
+            maps line numbers in ``code`` to their accumulated wall and CPU
+            time.
+
+    Example:
+        >>> from xdoctest.timing import CodeTimer
+        >>> source = 'x = 0\\nfor i in range(1000):\\n    x += i\\n'
+        >>> code = compile(source, '<example>', 'exec')
+        >>> with CodeTimer(code, lines=True) as timer:
+        ...     exec(code, {})
+        >>> assert timer.wall >= 0 and timer.cpu >= 0
+        >>> assert set(timer.line_times).issubset({1, 2, 3})
+        >>> assert 3 in timer.line_times or not timer.lines
+    """
+
+    def __init__(
+        self, code: types.CodeType | None = None, lines: bool = False
+    ) -> None:
+        """
+        Args:
+            code (types.CodeType | None): the code object to time lines of
+            lines (bool): if True, measure time spent on each line of ``code``
+        """
+        self.code = code
+        self.lines = bool(lines and code is not None)
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.line_times: dict[int, list[float]] = {}
+        self._start_wall = 0.0
+        self._start_cpu = 0.0
+        self._line: int | None = None
+        self._line_wall = 0.0
+        self._line_cpu = 0.0
+        self._tool_id: int | None = None
+
+    def __enter__(self) -> CodeTimer:
+        if self.lines:
+            self.lines = self._start_lines()
+        self._start_cpu = time.process_time()
+        self._start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self.wall = wall - self._start_wall
+        self.cpu = cpu - self._start_cpu
+        if self.lines:
+            self._stop_lines()
+            self._close_line(wall, cpu)
+
+    def _on_line(self, lineno: int) -> None:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self._close_line(wall, cpu)
+        self._line = lineno
+        self._line_wall = wall
+        self._line_cpu = cpu
+
+    def _close_line(self, wall: float, cpu: float) -> None:
+        if self._line is not None:
+            times = self.line_times.setdefault(self._line, [0.0, 0.0])
+            times[0] += wall - self._line_wall
+            times[1] += cpu - self._line_cpu
+            self._line = None
+
+    def _start_lines(self) -> bool:
+        monitoring = getattr(sys, 'monitoring', None)
+        if monitoring is not None:
+            tool_id = _free_monitoring_tool_id()
+            if tool_id is None:
+                return False
+            monitoring.use_tool_id(tool_id, 'xdoctest.timing')
+
+            def on_line(code: types.CodeType, lineno: int) -> None:
+                self._on_line(lineno)
+
+            monitoring.register_callback(
+                tool_id, monitoring.events.LINE, on_line
+            )
+            monitoring.set_local_events(
+                tool_id, self.code, monitoring.events.LINE
+            )
+            self._tool_id = tool_id
+        else:
+            if sys.gettrace() is not None:
+                # Do not clobber a debugger or coverage tool
+                return False
+            target = self.code
+
+            def local_trace(frame, event, arg):
+                if event == 'line':
+                    self._on_line(frame.f_lineno)
+                return local_trace
+
+            def global_trace(frame, event, arg):
+                if frame.f_code is target:
+                    return local_trace
+                return None
+
+            sys.settrace(global_trace)
+        return True
+
+    def _stop_lines(self) -> None:
+        monitoring = getattr(sys, 'monitoring', None)
+        if monitoring is not None:
+            tool_id = self._tool_id
+            if tool_id is not None:
+                monitoring.set_local_events(tool_id, self.code, 0)
+                monitoring.register_callback(
+                    tool_id, monitoring.events.LINE, None
+                )
+                monitoring.free_tool_id(tool_id)
+                self._tool_id = None
+        else:
+            sys.settrace(None)
+
+
+def _free_monitoring_tool_id() -> int | None:
+    """
+    Find a :mod:`sys.monitoring` tool id that is not in use.
+
+    The debugger, coverage, and profiler ids are tried last so the tools
+    that normally own them can still be used alongside xdoctest.
+
+    Returns:
+        int | None: an unused tool id, or None if all are taken
+    """
+    monitoring = sys.monitoring  # type: ignore[attr-defined]
+    for tool_id in [4, 3, 5, 2, 1, 0]:
+        if monitoring.get_tool(tool_id) is None:
+            return tool_id
+    return None
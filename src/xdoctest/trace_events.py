@@ -0,0 +1,238 @@
+"""
+Export a timeline of an xdoctest run in the Chrome trace event format.
+
+The :class:`TraceEventWriter` is a :mod:`xdoctest.timing` span listener that
+records a "complete" event for every span (discovery, static docstring
+extraction, parsing, module import, each doctest, and each of its parts). The
+resulting JSON file can be opened in https://ui.perfetto.dev or
+``about:tracing`` to see where the time goes over the length of a run,
+including gaps and serial bottlenecks.
+
+Events are placed on one track per process and thread. Timestamps are
+relative to the unix epoch, so traces written by several worker processes
+can be merged into one timeline with :func:`merge_traces`. Queue workers
+(``xdoctest worker --trace-events PATH``) and pytest-xdist workers
+(``--xdoctest-trace-events PATH``) insert their name into the file name, and
+the coordinator of ``xdoctest serve-queue`` merges the traces of its local
+workers into its own.
+
+CommandLine:
+    xdoctest -m xdoctest.checker all --trace-events trace.json
+    xdoctest serve-queue xdoctest all --workers 4 --trace-events trace.json
+
+References:
+    https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import typing
+
+from xdoctest import timing
+
+# Convert :func:`time.perf_counter` values to microseconds since the epoch
+_EPOCH_OFFSET = time.time() - time.perf_counter()
+
+
+def _span_name(span: typing.Any) -> str:
+    """
+    Args:
+        span (xdoctest.timing._Span): a finished span
+
+    Returns:
+        str: a short human readable label for the span
+    """
+    if span.phase == 'doctest':
+        return str(span.info)
+    if span.phase == 'exec':
+        return 'part {}'.format(span.info)
+    if span.phase == 'run':
+        return 'xdoctest {}'.format(span.key)
+    if span.key is None:
+        return span.phase
+    return '{} {}'.format(span.phase, os.path.basename(str(span.key)))
+
+
+def tagged_fpath(fpath: str, tag: str | None) -> str:
+    """
+    Insert a tag before the extension of a path.
+
+    Args:
+        fpath (str): the requested output path
+        tag (str | None): worker specific tag
+
+    Returns:
+        str
+
+    Example:
+        >>> from xdoctest.trace_events import tagged_fpath
+        >>> tagged_fpath('out/trace.json', 'worker1')
+        'out/trace.worker1.json'
+        >>> tagged_fpath('out/trace.json', 'host:1234')
+        'out/trace.host_1234.json'
+        >>> tagged_fpath('out/trace.json', None)
+        'out/trace.json'
+    """
+    if tag is None:
+        return fpath
+    from xdoctest.profiling import _safe_fname
+
+    base, ext = os.path.splitext(fpath)
+    return '{}.{}{}'.format(base, _safe_fname(tag), ext)
+
+
+def merge_traces(fpaths: list[str], out_fpath: str) -> str:
+    """
+    Combine the traces of several processes into one timeline.
+
+    Args:
+        fpaths (List[str]): traces written by :class:`TraceEventWriter`
+        out_fpath (str): where to write the merged trace. This may be one of
+            the inputs.
+
+    Returns:
+        str: the path to the merged trace
+
+    Example:
+        >>> import json
+        >>> from xdoctest import utils
+        >>> from xdoctest.trace_events import merge_traces
+        >>> with utils.TempDir() as temp:
+        ...     fpaths = []
+        ...     for pid in [1, 2]:
+        ...         fpaths.append(temp.dpath + '/trace.{}.json'.format(pid))
+        ...         event = {'name': 'part 0', 'ph': 'X', 'pid': pid}
+        ...         with open(fpaths[-1], 'w') as file:
+        ...             json.dump({'traceEvents': [event]}, file)
+        ...     fpath = merge_traces(fpaths, temp.dpath + '/trace.json')
+        ...     data = json.load(open(fpath))
+        >>> [e['pid'] for e in data['traceEvents']]
+        [1, 2]
+    """
+    from xdoctest.utils import util_path
+
+    events: list[dict[str, typing.Any]] = []
+    for fpath in fpaths:
+        with open(fpath) as file:
+            events.extend(json.load(file)['traceEvents'])
+    dpath = os.path.dirname(out_fpath)
+    if dpath:
+        util_path.ensuredir(dpath)
+    data = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    with open(out_fpath, 'w') as file:
+        json.dump(data, file)
+    return out_fpath
+
+
+class TraceEventWriter:
+    """
+    Records spans as Chrome trace events.
+
+    Attributes:
+        fpath (str): where the JSON trace is written
+        events (List[Dict]): the recorded trace events
+
+    Example:
+        >>> import json
+        >>> from xdoctest import timing, utils
+        >>> from xdoctest.trace_events import TraceEventWriter
+        >>> with utils.TempDir() as temp:
+        ...     fpath = temp.dpath + '/trace.json'
+        ...     self = TraceEventWriter(fpath)
+        ...     self.start()
+        ...     try:
+        ...         with timing.span('parse', 'foo.py'):
+        ...             with timing.span('exec', 'foo.py', 0):
+        ...                 pass
+        ...     finally:
+        ...         self.finish()
+        ...     data = json.load(open(fpath))
+        >>> names = [e['name'] for e in data['traceEvents'] if e['ph'] == 'X']
+        >>> assert 'part 0' in names and 'parse foo.py' in names
+    """
+
+    def __init__(self, fpath: str, tag: str | None = None) -> None:
+        """
+        Args:
+            fpath (str): path to write the JSON trace to
+            tag (str | None): if specified, inserted into the file name so
+                several worker processes can write traces side by side.
+        """
+        self.fpath = tagged_fpath(fpath, tag)
+        self.tag = tag
+        self.events: list[dict[str, typing.Any]] = []
+        self._pid = os.getpid()
+        self._named_threads: set[int] = set()
+
+    def start(self) -> None:
+        """
+        Start recording spans
+        """
+        process_name = 'xdoctest'
+        if self.tag is not None:
+            process_name = 'xdoctest {}'.format(self.tag)
+        self.events.append(
+            {
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': self._pid,
+                'args': {'name': process_name},
+            }
+        )
+        timing.add_listener(self)
+
+    def enter(self, span: typing.Any) -> None:
+        pass
+
+    def exit(self, span: typing.Any) -> None:
+        tid = threading.get_native_id()
+        if tid not in self._named_threads:
+            self._named_threads.add(tid)
+            self.events.append(
+                {
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': self._pid,
+                    'tid': tid,
+                    'args': {'name': threading.current_thread().name},
+                }
+            )
+        args = {}
+        if span.key is not None:
+            args['key'] = str(span.key)
+        if span.info is not None:
+            args['info'] = str(span.info)
+        self.events.append(
+            {
+                'name': _span_name(span),
+                'cat': span.phase,
+                'ph': 'X',
+                'ts': (span.start + _EPOCH_OFFSET) * 1e6,
+                'dur': span.elapsed * 1e6,
+                'pid': self._pid,
+                'tid': tid,
+                'args': args,
+            }
+        )
+
+    def finish(self) -> str:
+        """
+        Stop recording and write the trace.
+
+        Returns:
+            str: the path to the written trace
+        """
+        from xdoctest.utils import util_path
+
+        timing.remove_listener(self)
+        dpath = os.path.dirname(self.fpath)
+        if dpath:
+            util_path.ensuredir(dpath)
+        data = {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+        with open(self.fpath, 'w') as file:
+            json.dump(data, file)
+        return self.fpath
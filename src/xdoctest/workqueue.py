@@ -0,0 +1,865 @@
+"""
+Run doctests on a pool of worker processes that pull work from a queue.
+
+Static sharding (see :mod:`xdoctest.sharding`) leaves machines idle when the
+durations of doctests vary. In queue mode the native runner collects and
+selects doctests as usual, but instead of running them it becomes a
+coordinator that hands them out one at a time over a TCP or Unix socket.
+Workers connect, pull a doctest, run it with :func:`DocTest.run`, and stream
+a compact result back. The coordinator prints the usual summary.
+
+Doctests with a ``# xdoctest: +LOCK(name)`` directive are never handed out
+while another doctest holding the same lock runs, and doctests with a
+``# xdoctest: +SERIAL`` directive run alone. Serial doctests are handed out
+after all others, so they only stall the workers at the end of the run.
+Everything else runs on every worker.
+
+If a worker dies (its connection closes) while it runs a doctest, the
+doctest is handed to another worker. A doctest that kills ``max_attempts``
+workers is reported as failed.
+
+Workers find a doctest by its module path (or, if that path does not exist
+on the worker machine, its module name), callname, and number, so they must
+see the same code as the coordinator, e.g. through a shared file system or
+the same checkout.
+
+Addresses are ``HOST:PORT`` for TCP (a port of 0 picks a free port) or
+``unix:PATH`` for a Unix socket.
+
+The messages are JSON objects, one per line. A worker sends ``hello``, then
+alternates between ``ready`` and ``result`` messages. The coordinator
+answers each ``ready`` with a ``task`` or, when there is no work left,
+``done``.
+
+CommandLine:
+    # Coordinator with 4 local worker processes
+    xdoctest serve-queue xdoctest all --workers 4
+
+    # Coordinator for remote workers
+    xdoctest serve-queue xdoctest all --listen 0.0.0.0:7878
+    xdoctest worker --connect coordinator-host:7878
+"""
+
+from __future__ import annotations
+
+import collections
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import typing
+
+from xdoctest import exceptions, sharding
+
+if typing.TYPE_CHECKING:
+    from xdoctest.doctest_example import DocTest
+
+
+def parse_address(text: str) -> tuple[int, typing.Any]:
+    """
+    Args:
+        text (str): ``HOST:PORT``, ``[IPV6]:PORT``, or ``unix:PATH``
+
+    Returns:
+        Tuple[int, Any]: the socket family and the address to bind or
+            connect to
+
+    Raises:
+        ValueError: if the address cannot be parsed
+
+    Example:
+        >>> from xdoctest.workqueue import parse_address
+        >>> import socket
+        >>> parse_address('localhost:7878')[1]
+        ('localhost', 7878)
+        >>> parse_address('[::1]:0')[1]
+        ('::1', 0)
+        >>> parse_address('unix:/tmp/xdoctest.sock')[1]
+        '/tmp/xdoctest.sock'
+        >>> parse_address('7878')
+        Traceback (most recent call last):
+        ValueError: address must be HOST:PORT or unix:PATH, got '7878'
+    """
+    if text.startswith('unix:'):
+        family = getattr(socket, 'AF_UNIX', None)
+        if family is None:
+            raise ValueError('Unix sockets are not supported on this platform')
+        return family, text[len('unix:') :]
+    host, sep, port_text = text.rpartition(':')
+    if not sep or not host or not port_text.isdigit():
+        raise ValueError(
+            'address must be HOST:PORT or unix:PATH, got {!r}'.format(text)
+        )
+    if host.startswith('[') and host.endswith(']'):
+        return socket.AF_INET6, (host[1:-1], int(port_text))
+    return socket.AF_INET, (host, int(port_text))
+
+
+def format_address(family: int, sockaddr: typing.Any) -> str:
+    """
+    Args:
+        family (int): the socket family
+        sockaddr (Any): the result of :func:`socket.socket.getsockname`
+
+    Returns:
+        str: an address that :func:`parse_address` understands
+    """
+    if family == getattr(socket, 'AF_UNIX', None):
+        return 'unix:' + sockaddr
+    elif family == socket.AF_INET6:
+        return '[{}]:{}'.format(sockaddr[0], sockaddr[1])
+    else:
+        return '{}:{}'.format(sockaddr[0], sockaddr[1])
+
+
+def _send(file: typing.BinaryIO, message: dict[str, typing.Any]) -> None:
+    file.write(json.dumps(message).encode('utf8') + b'\n')
+    file.flush()
+
+
+def _recv(file: typing.BinaryIO) -> dict[str, typing.Any] | None:
+    line = file.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf8'))
+
+
+class RemoteFailure:
+    """
+    Stands in for a :class:`DocTest` that failed on a worker (or in an
+    earlier run, see :mod:`xdoctest.journal`) in the summary report of the
+    runner.
+
+    Attributes:
+        example (DocTest): the doctest on the coordinator
+        lines (List[str]): the failure report from the worker
+    """
+
+    def __init__(self, example: DocTest, lines: list[str]) -> None:
+        self.example = example
+        self.lines = lines
+        self.warn_list: list = []
+
+    @property
+    def node(self) -> str:
+        return self.example.node
+
+    @property
+    def cmdline(self) -> str:
+        return self.example.cmdline
+
+    def repr_failure(self, with_tb: typing.Any = True) -> list[str]:
+        return list(self.lines)
+
+
+class QueueServer:
+    """
+    Hands out doctests to workers and collects their results.
+
+    Attributes:
+        examples (List[DocTest]): the doctests to run
+        address (str | None): the address the server listens on, after
+            :func:`bind`
+        results (Dict[int, Dict]): maps the index of each finished doctest to
+            its result
+        workers (Dict[str, int]): the number of results from each worker
+
+    Example:
+        >>> from xdoctest.workqueue import QueueServer, run_worker
+        >>> from xdoctest import core, sharding
+        >>> import threading
+        >>> examples = list(core.parse_doctestables(sharding.__file__))
+        >>> self = QueueServer(examples)
+        >>> address = self.bind()
+        >>> thread = threading.Thread(target=run_worker, args=(address,))
+        >>> thread.start()
+        >>> results = self.serve()
+        >>> thread.join()
+        >>> assert len(results) == len(examples)
+        >>> sorted({r['status'] for r in results.values()})
+        ['passed']
+    """
+
+    def __init__(
+        self,
+        examples: list[DocTest],
+        address: str = '127.0.0.1:0',
+        style: str = 'auto',
+        analysis: str = 'auto',
+        max_attempts: int = 2,
+        maxfail: int | None = None,
+        on_result: typing.Callable[[DocTest, dict], None] | None = None,
+    ) -> None:
+        """
+        Args:
+            examples (List[DocTest]): the doctests to run
+            address (str): where to listen, see :func:`parse_address`
+            style (str): the parsing style the workers must use
+            analysis (str): the analysis the workers must use
+            max_attempts (int): the number of workers a doctest may kill
+                before it is reported as failed
+            maxfail (int | None): stop handing out doctests after this many
+                failures
+            on_result (Callable[[DocTest, Dict], None] | None): called with
+                each result as it arrives
+        """
+        self.examples = list(examples)
+        self.style = style
+        self.analysis = analysis
+        self.max_attempts = max_attempts
+        self.maxfail = maxfail
+        self.on_result = on_result
+        self.address: str | None = None
+        self.results: dict[int, dict[str, typing.Any]] = {}
+        self.workers: dict[str, int] = {}
+        self._family, self._sockaddr = parse_address(address)
+        self._constraints = [_scheduling_constraints(e) for e in self.examples]
+        # Serial doctests go last, so they do not interrupt the others
+        self._pending: collections.deque[int] = collections.deque(
+            sorted(range(len(self.examples)), key=self._is_serial)
+        )
+        self._attempts = [0] * len(self.examples)
+        self._running: set[int] = set()
+        self._held_locks: set[str] = set()
+        self._n_failed = 0
+        self._n_connections = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._sock: socket.socket | None = None
+
+    def bind(self) -> str:
+        """
+        Start listening.
+
+        Returns:
+            str: the address workers should connect to
+        """
+        sock = socket.socket(self._family, socket.SOCK_STREAM)
+        if self._family != getattr(socket, 'AF_UNIX', None):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        elif os.path.exists(self._sockaddr):
+            os.unlink(self._sockaddr)
+        sock.bind(self._sockaddr)
+        sock.listen(128)
+        sock.settimeout(0.05)
+        self._sock = sock
+        self.address = format_address(self._family, sock.getsockname())
+        return self.address
+
+    def serve(
+        self, procs: list[subprocess.Popen] | None = None
+    ) -> dict[int, dict[str, typing.Any]]:
+        """
+        Hand out doctests until all of them finished.
+
+        Args:
+            procs (List[Popen] | None): local worker processes. If all of
+                them exited and no other worker is connected, the server
+                stops and the remaining doctests are not run.
+
+        Returns:
+            Dict[int, Dict]: maps the index of each finished doctest to its
+                result
+        """
+        if self._sock is None:
+            self.bind()
+        accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        accept_thread.start()
+        try:
+            with self._cond:
+                while not self._is_finished():
+                    self._cond.wait(timeout=0.1)
+                    if (
+                        procs
+                        and self._n_connections == 0
+                        and all(proc.poll() is not None for proc in procs)
+                    ):
+                        break
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            accept_thread.join()
+            self._close_socket()
+        return self.results
+
+    def _close_socket(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            if self._family == getattr(socket, 'AF_UNIX', None):
+                try:
+                    os.unlink(self._sockaddr)
+                except OSError:
+                    pass
+
+    def _is_serial(self, index: int) -> bool:
+        return self._constraints[index][0]
+
+    def _can_start(self, index: int) -> bool:
+        if any(self._is_serial(other) for other in self._running):
+            return False
+        if self._is_serial(index):
+            return not self._running
+        return self._held_locks.isdisjoint(self._constraints[index][1])
+
+    def _pop_startable(self) -> int | None:
+        """
+        Remove the first pending doctest that may start now.
+
+        Returns:
+            int | None: its index, or None if every pending doctest must wait
+        """
+        for pos, index in enumerate(self._pending):
+            if self._can_start(index):
+                del self._pending[pos]
+                return index
+            if self._is_serial(index):
+                # Do not let later doctests starve a serial one
+                return None
+        return None
+
+    def _release(self, index: int) -> None:
+        if index in self._running:
+            self._running.discard(index)
+            self._held_locks.difference_update(self._constraints[index][1])
+
+    def _is_stopping(self) -> bool:
+        return self.maxfail is not None and self._n_failed >= self.maxfail
+
+    def _is_finished(self) -> bool:
+        if len(self.results) == len(self.examples):
+            return True
+        # After maxfail failures, wait for the doctests that already run
+        return self._is_stopping() and not self._running
+
+    def _accept_loop(self) -> None:
+        while not self._closed:
+            assert self._sock is not None
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.settimeout(None)
+            with self._cond:
+                self._n_connections += 1
+            thread = threading.Thread(
+                target=self._handle, args=(conn,), daemon=True
+            )
+            thread.start()
+
+    def _next_task(self, worker: str) -> int | None:
+        """
+        Block until a doctest can be handed to a worker.
+
+        Returns:
+            int | None: the index of the doctest or None if there is no more
+                work
+        """
+        with self._cond:
+            while True:
+                if self._closed or self._is_finished():
+                    return None
+                if self._pending and not self._is_stopping():
+                    index = self._pop_startable()
+                    if index is not None:
+                        self._attempts[index] += 1
+                        self._running.add(index)
+                        self._held_locks.update(self._constraints[index][1])
+                        return index
+                self._cond.wait()
+
+    def _task_message(self, index: int) -> dict[str, typing.Any]:
+        example = self.examples[index]
+        return {
+            'type': 'task',
+            'id': index,
+            'modpath': os.fspath(example.modpath),
+            'modname': example.modname,
+            'callname': example.callname,
+            'num': example.num,
+            'style': self.style,
+            'analysis': self.analysis,
+            'config': dict(example.config),
+        }
+
+    def _finish(self, index: int, result: dict[str, typing.Any]) -> None:
+        with self._cond:
+            if index in self.results:
+                return
+            self._release(index)
+            self.results[index] = result
+            worker = result.get('worker', '?')
+            self.workers[worker] = self.workers.get(worker, 0) + 1
+            if result['status'] == 'failed':
+                self._n_failed += 1
+            self._cond.notify_all()
+        if self.on_result is not None:
+            self.on_result(self.examples[index], result)
+
+    def _requeue(self, index: int, worker: str) -> None:
+        with self._cond:
+            if index in self.results:
+                return
+            self._release(index)
+            if self._attempts[index] < self.max_attempts:
+                self._pending.appendleft(index)
+                self._cond.notify_all()
+                return
+        self._finish(
+            index,
+            {
+                'status': 'failed',
+                'worker': worker,
+                'duration': 0.0,
+                'failure': [
+                    'The worker running this doctest died {} time(s). '
+                    'The last one was {}.'.format(self._attempts[index], worker)
+                ],
+            },
+        )
+
+    def _handle(self, conn: socket.socket) -> None:
+        worker = '?'
+        index = None
+        try:
+            file = conn.makefile('rwb')
+            hello = _recv(file)
+            if hello is None or hello.get('type') != 'hello':
+                return
+            worker = str(hello.get('worker', '?'))
+            while True:
+                message = _recv(file)
+                if message is None:
+                    break
+                if message['type'] == 'result' and index is not None:
+                    message['worker'] = worker
+                    self._finish(index, message)
+                    index = None
+                elif message['type'] == 'ready':
+                    index = self._next_task(worker)
+                    if index is None:
+                        _send(file, {'type': 'done'})
+                        break
+                    _send(file, self._task_message(index))
+        except (OSError, ValueError):
+            pass
+        finally:
+            if index is not None:
+                self._requeue(index, worker)
+            with self._cond:
+                self._n_connections -= 1
+                self._cond.notify_all()
+            conn.close()
+
+
+def _scheduling_constraints(example: DocTest) -> tuple[bool, frozenset[str]]:
+    try:
+        return example.scheduling_constraints()
+    except (exceptions.DoctestParseError, SyntaxError):
+        # The doctest fails when a worker runs it
+        return False, frozenset()
+
+
+def _run_task(
+    message: dict[str, typing.Any],
+    parsed: dict[tuple, dict[tuple, DocTest]],
+    verbose: int,
+    hooks: list | None = None,
+) -> dict[str, typing.Any]:
+    """
+    Run the doctest described by a task message on a worker.
+    """
+    from xdoctest import core
+    from xdoctest.utils import util_import
+
+    modpath = message['modpath']
+    if not os.path.exists(modpath) and message['modname']:
+        modpath = util_import.modname_to_modpath(message['modname']) or modpath
+    key = (modpath, message['style'], message['analysis'])
+    if key not in parsed:
+        parsed[key] = {
+            (example.callname, example.num): example
+            for example in core.parse_doctestables(
+                modpath, style=message['style'], analysis=message['analysis']
+            )
+        }
+    example = parsed[key].get((message['callname'], message['num']), None)
+    result: dict[str, typing.Any] = {'type': 'result', 'id': message['id']}
+    if example is None:
+        result.update(
+            {
+                'status': 'failed',
+                'duration': 0.0,
+                'failure': [
+                    'The worker did not find {}::{}:{}'.format(
+                        modpath, message['callname'], message['num']
+                    )
+                ],
+            }
+        )
+        return result
+    example.mode = 'native'
+    example.config.update(message['config'])
+    hooks = hooks or []
+    for hook in hooks:
+        hook.before_example(example)
+    tic = time.perf_counter()
+    summary = example.run(verbose=verbose, on_error='return')
+    result['duration'] = time.perf_counter() - tic
+    for hook in hooks:
+        hook.after_example(example, summary)
+    if summary['skipped']:
+        result['status'] = 'skipped'
+    elif summary['passed']:
+        result['status'] = 'passed'
+    else:
+        result['status'] = 'failed'
+        result['failure'] = example.repr_failure()
+    result['n_warnings'] = len(example.warn_list or [])
+    return result
+
+
+def default_worker_name() -> str:
+    """
+    Returns:
+        str: ``HOSTNAME:PID`` of this process
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def run_worker(
+    address: str,
+    name: str | None = None,
+    verbose: int = 0,
+    connect_timeout: float = 30.0,
+    hooks: list | None = None,
+) -> int:
+    """
+    Run doctests from a coordinator until it has no more work.
+
+    Args:
+        address (str): the address of the coordinator
+        name (str | None): identifies the worker in reports. Defaults to
+            :func:`default_worker_name`.
+        verbose (int): verbosity of :func:`DocTest.run`
+        connect_timeout (float): how long to retry connecting, so workers can
+            be started before the coordinator
+        hooks (List | None): started objects whose ``before_example(example)``
+            and ``after_example(example, summary)`` methods are called
+            around each doctest, e.g. a
+            :class:`xdoctest.profiling.DoctestProfiler`
+
+    Returns:
+        int: the number of doctests that were run
+    """
+    family, sockaddr = parse_address(address)
+    if name is None:
+        name = default_worker_name()
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(sockaddr)
+            break
+        except OSError:
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+    parsed: dict[tuple, dict[tuple, DocTest]] = {}
+    n_run = 0
+    with sock:
+        file = sock.makefile('rwb')
+        _send(file, {'type': 'hello', 'worker': name})
+        while True:
+            _send(file, {'type': 'ready'})
+            message = _recv(file)
+            if message is None or message['type'] != 'task':
+                break
+            _send(file, _run_task(message, parsed, verbose, hooks))
+            n_run += 1
+    return n_run
+
+
+def spawn_workers(
+    address: str, n_workers: int, worker_args: list[str] | None = None
+) -> list[subprocess.Popen]:
+    """
+    Start local worker processes.
+
+    Args:
+        address (str): the address of the coordinator
+        n_workers (int): the number of processes
+        worker_args (List[str] | None): extra ``xdoctest worker`` options,
+            e.g. ``['--profile']``
+
+    Returns:
+        List[Popen]
+    """
+    procs = []
+    for index in range(n_workers):
+        command = [
+            sys.executable,
+            '-m',
+            'xdoctest',
+            'worker',
+            '--connect',
+            address,
+            '--name',
+            'local-{}'.format(index),
+        ] + list(worker_args or [])
+        procs.append(subprocess.Popen(command, stdout=subprocess.DEVNULL))
+    return procs
+
+
+def run_queue(
+    examples: list[DocTest],
+    address: str,
+    n_workers: int = 0,
+    style: str = 'auto',
+    analysis: str = 'auto',
+    config: typing.Any = None,
+    _log: typing.Callable | None = None,
+    hooks: list | None = None,
+    history: typing.Any = None,
+    maxfail: int | None = None,
+    worker_args: list[str] | None = None,
+) -> dict[str, typing.Any]:
+    """
+    Coordinate a queue run for the native runner.
+
+    Args:
+        examples (List[DocTest]): the doctests to run
+        address (str): where to listen
+        n_workers (int): the number of local worker processes to start
+        style (str): the parsing style
+        analysis (str): the analysis mode
+        config (Dict | None): the configuration of the runner
+        _log (Callable | None): the logging function of the runner
+        hooks (List | None): objects whose ``after_example(example,
+            summary)`` method receives each result. The summary of a failed
+            doctest includes the ``failure`` report of the worker.
+        history (DurationHistory | None): receives the measured durations
+        maxfail (int | None): stop handing out doctests after this many
+            failures
+        worker_args (List[str] | None): extra options for the local worker
+            processes
+
+    Returns:
+        Dict[str, Any]: a run summary like the one of the local runner
+    """
+    from xdoctest import utils
+
+    if _log is None:
+        _log = print
+    if hooks is None:
+        hooks = []
+    colored = config is not None and config.get('colored', True)
+
+    def on_result(example: DocTest, result: dict[str, typing.Any]) -> None:
+        color = {'passed': 'green', 'failed': 'red'}.get(
+            result['status'], 'yellow'
+        )
+        text = '{}: {} [{}, {:0.2f}s]'.format(
+            result['status'],
+            example.node,
+            result.get('worker', '?'),
+            result['duration'],
+        )
+        _log(utils.color_text(text, color) if colored else text)
+
+    server = QueueServer(
+        examples,
+        address,
+        style=style,
+        analysis=analysis,
+        maxfail=maxfail,
+        on_result=on_result,
+    )
+    bound = server.bind()
+    _log('serving {} doctest(s) on {}'.format(len(examples), bound))
+    # Workers that never get a doctest would wait for a connection in vain
+    n_workers = min(n_workers, len(examples))
+    procs = spawn_workers(bound, n_workers, worker_args) if n_workers else []
+    try:
+        results = server.serve(procs)
+    finally:
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    failed: list[typing.Any] = []
+    times = {}
+    n_passed = n_failed = n_skipped = 0
+    for index, example in enumerate(examples):
+        result = results.get(index, None)
+        if result is None:
+            continue
+        times[example] = result['duration']
+        status = result['status']
+        summary = {
+            'passed': status == 'passed',
+            'failed': status == 'failed',
+            'skipped': status == 'skipped',
+            'duration': result['duration'],
+        }
+        if status == 'failed':
+            # The doctest on the coordinator never ran, so it cannot report
+            summary['failure'] = result.get('failure', [])
+        for hook in hooks:
+            hook.after_example(example, summary)
+        if history is not None and status != 'skipped':
+            history.update(sharding.shard_key(example), result['duration'])
+        if status == 'passed':
+            n_passed += 1
+        elif status == 'skipped':
+            n_skipped += 1
+        else:
+            n_failed += 1
+            failed.append(RemoteFailure(example, result.get('failure', [])))
+
+    _log('Finished doctests on {} worker(s)'.format(len(server.workers)))
+    _log('%d / %d passed' % (n_passed, len(examples)))
+    return {
+        'failed': failed,
+        'warned': [],
+        'action': 'run_examples',
+        'n_warned': 0,
+        'n_skipped': n_skipped,
+        'n_passed': n_passed,
+        'n_failed': n_failed,
+        'n_total': len(examples),
+        'n_not_run': len(examples) - len(results),
+        'times': times,
+        'workers': dict(server.workers),
+    }
+
+
+def worker_main(argv: list[str] | None = None) -> int:
+    """
+    The ``xdoctest worker`` command line interface.
+
+    Args:
+        argv (List[str] | None): arguments after ``worker``
+
+    Returns:
+        int: the exit code
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='xdoctest worker',
+        description='Run doctests handed out by "xdoctest serve-queue"',
+    )
+    parser.add_argument(
+        '--connect',
+        required=True,
+        metavar='ADDR',
+        help='Address of the coordinator: HOST:PORT or unix:PATH',
+    )
+    parser.add_argument(
+        '--name', default=None, help='Name of the worker in reports'
+    )
+    parser.add_argument(
+        '--verbose', type=int, default=0, help='Verbosity of each doctest'
+    )
+    parser.add_argument(
+        '--connect-timeout',
+        type=float,
+        default=30.0,
+        help='Seconds to keep retrying to connect to the coordinator',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=(
+            'Profile the user code of each doctest with cProfile. The merged '
+            'profile is named after the worker'
+        ),
+    )
+    parser.add_argument(
+        '--profile-dir',
+        default=None,
+        help=(
+            'Directory for --profile and --sample-profile results. '
+            'Implies --profile unless --sample-profile is given'
+        ),
+    )
+    parser.add_argument(
+        '--sample-profile',
+        type=float,
+        default=None,
+        metavar='HZ',
+        help='Sample the stacks of running doctests HZ times per second',
+    )
+    parser.add_argument(
+        '--trace-events',
+        default=None,
+        metavar='PATH',
+        help=(
+            'Write a timeline of the doctests in the Chrome trace event '
+            'format. The worker name is inserted before the extension'
+        ),
+    )
+    args = parser.parse_args(argv)
+    name = args.name
+    if name is None:
+        name = default_worker_name()
+    profile_dir = args.profile_dir
+    profile = args.profile or (
+        profile_dir is not None and not args.sample_profile
+    )
+    if profile_dir is None:
+        profile_dir = 'prof'
+
+    # Only started hooks are added, so each one is finished
+    hooks: list[typing.Any] = []
+    trace_writer = None
+    try:
+        try:
+            if args.trace_events is not None:
+                from xdoctest import trace_events
+
+                trace_writer = trace_events.TraceEventWriter(
+                    args.trace_events, tag=name
+                )
+                trace_writer.start()
+            if profile:
+                from xdoctest import profiling
+
+                profiler = profiling.DoctestProfiler(profile_dir, tag=name)
+                profiler.start()
+                hooks.append(profiler)
+            if args.sample_profile:
+                from xdoctest import profiling
+
+                sampler = profiling.SamplingProfiler(
+                    args.sample_profile, profile_dir, tag=name
+                )
+                sampler.start()
+                hooks.append(sampler)
+            run_worker(
+                args.connect,
+                name=name,
+                verbose=args.verbose,
+                connect_timeout=args.connect_timeout,
+                hooks=hooks,
+            )
+        finally:
+            for hook in hooks:
+                hook.finish()
+            if trace_writer is not None:
+                trace_writer.finish()
+    except (OSError, ValueError) as ex:
+        print('xdoctest worker: {}'.format(ex), file=sys.stderr)
+        return 1
+    return 0
@@ -93,6 +93,50 @@ def test_directive_syntax_error() -> None:
     assert stdout.count('not-skipped') == 1
 
 
+def test_requires_resolution_cache() -> None:
+    """
+    pytest tests/test_directive.py::test_requires_resolution_cache
+    """
+    import sys
+    import warnings
+    from os.path import join
+
+    from xdoctest import directive, timing
+
+    modname = 'xdoctest_resolution_cache_mod'
+    with utils.TempDir() as temp:
+        with open(join(temp.dpath, modname + '.py'), 'w') as file:
+            file.write('')
+        timing.TIMER.reset()
+        timing.TIMER.enabled = True
+        try:
+            assert not directive._module_exists(modname)
+            assert not directive._module_exists(modname)
+            # Adding the module to the path invalidates the cached result
+            sys.path.append(str(temp.dpath))
+            try:
+                assert directive._module_exists(modname)
+            finally:
+                sys.path.remove(str(temp.dpath))
+            # Unknown directives still warn when the parse is cached
+            with warnings.catch_warnings(record=True) as warnlist:
+                warnings.simplefilter('always')
+                for _ in range(2):
+                    list(directive.Directive.extract('# xdoctest: +SKIP, +BAD'))
+            assert len(warnlist) == 2
+            counters = timing.TIMER.summary()['counters']
+        finally:
+            timing.TIMER.enabled = False
+            timing.TIMER.reset()
+    assert counters['module_exists'] == {
+        'misses': 2,
+        'hits': 1,
+        'invalidations': 1,
+    }
+    assert counters['split_opstr']['hits'] >= 1
+    assert counters['parse_directive_optstr']['hits'] >= 2
+
+
 if __name__ == '__main__':
     """
     CommandLine:
@@ -272,6 +272,23 @@ def test_doctestconfig_cli_flags() -> None:
     assert ns2.xdoctest_deferred_output_matching is False
 
 
+def test_doctestconfig_budget_options() -> None:
+    import pytest
+
+    ns = dict(doctest_example.DoctestConfig())
+    ns['options'] = '+MAX_TIME(2s),-MAX_MEMORY'
+    config = doctest_example.DoctestConfig()._populate_from_cli(ns)
+    assert config['default_runtime_state'] == {
+        'MAX_TIME': 2.0,
+        'MAX_MEMORY': False,
+    }
+
+    # A budget without a limit is an error rather than a 1 second budget
+    ns['options'] = '+MAX_TIME'
+    with pytest.raises(ValueError, match='expected exactly 1 argument'):
+        doctest_example.DoctestConfig()._populate_from_cli(ns)
+
+
 def test_optional_want_false_fails_on_stdout() -> None:
     docsrc = utils.codeblock(
         """
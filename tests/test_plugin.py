@@ -1518,6 +1518,32 @@ class TestXDoctestSkips:
         )
         reprec.assertoutcome(passed=0, skipped=1)
 
+    def test_static_skip_before_fixtures(
+        self, testdir: pytest.Testdir, makedoctest
+    ) -> None:
+        """
+        CommandLine:
+            pytest tests/test_plugin.py::TestXDoctestSkips::test_static_skip_before_fixtures
+        """
+        # The fixture would error if the skipped doctest was set up
+        testdir.makeconftest("""
+            import pytest
+            @pytest.fixture(autouse=True)
+            def broken():
+                raise AssertionError('fixture was set up')
+        """)
+        makedoctest("""
+            >>> # xdoctest: +REQUIRES(module:notamodule)
+            >>> import notamodule
+        """)
+        result = testdir.runpytest(
+            '--xdoctest-modules', '-rs', *(EXTRA_ARGS + OLD_TEXT_ARGS)
+        )
+        result.assert_outcomes(skipped=1)
+        result.stdout.fnmatch_lines(
+            ['*doctest has unmet requirements: module:notamodule*']
+        )
+
     def test_vacuous_all_skipped(self, testdir, makedoctest) -> None:
         makedoctest('')
         reprec = testdir.inline_run('--xdoctest-modules', *EXTRA_ARGS)
@@ -1857,6 +1883,203 @@ class TestXDoctestReportingOption:
         )
 
 
+class TestXDoctestCacheOptions:
+    def test_duration_history_longest_first(
+        self, testdir: pytest.Testdir
+    ) -> None:
+        """
+        pytest tests/test_plugin.py::TestXDoctestCacheOptions::test_duration_history_longest_first
+        """
+        import json
+
+        testdir.makepyfile(
+            test_durations="""
+            def fast():
+                '''
+                >>> x = 1
+                '''
+
+            def slow():
+                '''
+                >>> import time
+                >>> time.sleep(0.05)
+                '''
+            """
+        )
+        cache_dpath = str(testdir.tmpdir.join('cache'))
+        args = ['--xdoctest-modules', '--xdoctest-cache-dir', cache_dpath]
+        reprec = testdir.inline_run(
+            '--xdoctest-duration-history', *(args + EXTRA_ARGS)
+        )
+        reprec.assertoutcome(passed=2)
+        with open(str(testdir.tmpdir.join('cache', 'durations.json'))) as file:
+            nodes = json.load(file)['nodes']
+        assert len(nodes) == 2
+        slow_node = [n for n in nodes if n.endswith('slow:0')][0]
+        fast_node = [n for n in nodes if n.endswith('fast:0')][0]
+        assert nodes[slow_node]['ewma'] > nodes[fast_node]['ewma']
+
+        result = testdir.runpytest(
+            '--collect-only',
+            '-q',
+            '--xdoctest-longest-first',
+            *(args + EXTRA_ARGS),
+        )
+        result.stdout.fnmatch_lines(['*::slow:0', '*::fast:0'])
+
+    def test_changed_since(self, testdir: pytest.Testdir) -> None:
+        """
+        pytest tests/test_plugin.py::TestXDoctestCacheOptions::test_changed_since
+        """
+        import subprocess
+
+        source = """
+            def func1():
+                '''
+                >>> x = 1
+                '''
+
+            def func2():
+                '''
+                >>> x = 2
+                '''
+            """
+        testdir.makepyfile(changed=source, unchanged=source)
+        for args in [
+            ['init', '-q'],
+            ['add', '.'],
+            ['commit', '-q', '-m', 'initial'],
+        ]:
+            subprocess.check_call(
+                ['git', '-c', 'user.name=test', '-c', 'user.email=test@test']
+                + args,
+                cwd=str(testdir.tmpdir),
+            )
+        testdir.makepyfile(changed=source.replace('x = 2', 'x = 3'))
+        reprec = testdir.inline_run(
+            '--xdoctest-modules',
+            '--xdoctest-changed-since',
+            'HEAD',
+            *EXTRA_ARGS,
+        )
+        reprec.assertoutcome(passed=1)
+
+    def test_shard(self, testdir: pytest.Testdir) -> None:
+        """
+        pytest tests/test_plugin.py::TestXDoctestCacheOptions::test_shard
+        """
+        import json
+
+        from xdoctest import sharding
+
+        testdir.makepyfile(
+            test_shards='\n'.join(
+                [
+                    "def func{}():\n    '''\n    >>> x = {}\n    '''\n".format(
+                        i, i
+                    )
+                    for i in range(8)
+                ]
+            )
+        )
+        reports = []
+        n_passed = 0
+        for index in [1, 2, 3]:
+            report_fpath = str(
+                testdir.tmpdir.join('shard{}.json'.format(index))
+            )
+            reprec = testdir.inline_run(
+                '--xdoctest-modules',
+                '--xdoctest-shard',
+                '{}/3'.format(index),
+                '--xdoctest-shard-report',
+                report_fpath,
+                *EXTRA_ARGS,
+            )
+            passed, skipped, failed = reprec.listoutcomes()
+            n_passed += len(passed)
+            with open(report_fpath) as file:
+                reports.append(json.load(file))
+        assert n_passed == 8
+        assert sharding.verify_reports(reports) == []
+
+        result = testdir.runpytest(
+            '--xdoctest-modules', '--xdoctest-shard', '4/3', *EXTRA_ARGS
+        )
+        assert result.ret == pytest.ExitCode.USAGE_ERROR
+
+    def test_profile_per_worker(self, testdir: pytest.Testdir) -> None:
+        """
+        pytest tests/test_plugin.py::TestXDoctestCacheOptions::test_profile_per_worker
+        """
+        testdir.makepyfile(
+            test_profile="""
+            def work():
+                '''
+                >>> print(sum(range(10)))
+                45
+                '''
+            """
+        )
+        # Pretend to be the pytest-xdist worker gw1
+        testdir.makeconftest(
+            """
+            import pytest
+
+            @pytest.hookimpl(tryfirst=True)
+            def pytest_configure(config):
+                config.workerinput = {'workerid': 'gw1'}
+            """
+        )
+        profile_dpath = testdir.tmpdir.join('prof')
+        reprec = testdir.inline_run(
+            '--xdoctest-modules',
+            '--xdoctest-profile-dir',
+            str(profile_dpath),
+            *EXTRA_ARGS,
+        )
+        reprec.assertoutcome(passed=1)
+        assert profile_dpath.join('combined.gw1.prof').check()
+
+    def test_trace_events_per_worker(self, testdir: pytest.Testdir) -> None:
+        """
+        pytest tests/test_plugin.py::TestXDoctestCacheOptions::test_trace_events_per_worker
+        """
+        import json
+
+        testdir.makepyfile(
+            test_trace="""
+            def work():
+                '''
+                >>> x = 1
+                '''
+            """
+        )
+        # Pretend to be the pytest-xdist worker gw1
+        testdir.makeconftest(
+            """
+            import pytest
+
+            @pytest.hookimpl(tryfirst=True)
+            def pytest_configure(config):
+                config.workerinput = {'workerid': 'gw1'}
+            """
+        )
+        trace_fpath = testdir.tmpdir.join('trace.json')
+        reprec = testdir.inline_run(
+            '--xdoctest-modules',
+            '--xdoctest-trace-events',
+            str(trace_fpath),
+            *EXTRA_ARGS,
+        )
+        reprec.assertoutcome(passed=1)
+        with open(str(testdir.tmpdir.join('trace.gw1.json'))) as file:
+            events = json.load(file)['traceEvents']
+        names = {event['name'] for event in events}
+        assert 'part 0' in names
+        assert {'name': 'xdoctest gw1'} in [event['args'] for event in events]
+
+
 class Disabled:
     def test_docstring_context_around_error(
         self, testdir: pytest.Testdir
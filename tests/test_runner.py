@@ -1,4 +1,4 @@
-from os.path import join
+from os.path import exists, join
 
 from xdoctest import utils
 
@@ -511,6 +511,1757 @@ def test_hack_the_sys_argv() -> None:
     # assert '1 passed' in cap.text
 
 
+def test_timing_breakdown() -> None:
+    """
+    pytest tests/test_runner.py::test_timing_breakdown -s
+    """
+    from xdoctest import runner, timing
+
+    source = utils.codeblock(
+        '''
+        def func1():
+            """
+            Example:
+                >>> print(1)
+                1
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_timing_breakdown.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], timing_breakdown=True
+            )
+    assert cap.text is not None
+    assert 'Timing breakdown' in cap.text
+    assert 'framework overhead' in cap.text
+    summary = run_summary['timing']
+    for phase in ['calldefs', 'parse', 'import', 'compile', 'exec', 'check']:
+        assert summary['counts'][phase] > 0, phase
+    assert modpath in summary['per_module']
+    assert not timing.TIMER.enabled
+
+
+def test_profile_dir() -> None:
+    """
+    pytest tests/test_runner.py::test_profile_dir -s
+    """
+    import os
+
+    from xdoctest import runner, timing
+
+    source = utils.codeblock(
+        '''
+        def slow_func():
+            """
+            Example:
+                >>> total = sum(i * i for i in range(10000))
+                >>> print(total > 0)
+                True
+            """
+
+        def skipped_func():
+            """
+            Example:
+                >>> # xdoctest: +SKIP
+                >>> print(1)
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_profile_dir.py')
+        prof_dpath = join(str(dpath), 'prof')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], profile_dir=prof_dpath
+            )
+        profile_info = run_summary['profile']
+        fnames = sorted(os.listdir(prof_dpath))
+        assert 'combined.prof' in fnames
+        assert profile_info['merged_fpath'] == join(prof_dpath, 'combined.prof')
+        # Only the doctest that executed code gets a profile
+        assert len(profile_info['fpaths']) == 1
+        fpath = list(profile_info['fpaths'].values())[0]
+        assert os.path.exists(fpath)
+        assert 'slow_func' in fpath
+    assert cap.text is not None
+    assert '=== Profile ===' in cap.text
+    assert 'cumulative' in cap.text
+    assert not timing._LISTENERS
+
+
+def test_sample_profile() -> None:
+    """
+    pytest tests/test_runner.py::test_sample_profile -s
+    """
+    import os
+
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def busy_func():
+            """
+            Example:
+                >>> import time
+                >>> start = time.perf_counter()
+                >>> while time.perf_counter() - start < 0.1:
+                ...     pass
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_sample_profile.py')
+        prof_dpath = join(str(dpath), 'prof')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                sample_profile=500,
+                profile_dir=prof_dpath,
+            )
+        sample_info = run_summary['sample_profile']
+        assert sample_info['n_samples'] > 0
+        assert sample_info['fpath'] == join(prof_dpath, 'samples.collapsed')
+        with open(sample_info['fpath']) as file:
+            lines = file.read().splitlines()
+        # Sampling alone must not turn on the deterministic profiler
+        assert 'profile' not in run_summary
+        assert not os.path.exists(join(prof_dpath, 'combined.prof'))
+    node = sample_info['top_nodes'][0][0]
+    assert 'busy_func' in node
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+        assert stack.startswith(node + ';part')
+    assert cap.text is not None
+    assert '=== Sampling profile ===' in cap.text
+
+
+def test_line_timing_durations() -> None:
+    """
+    pytest tests/test_runner.py::test_line_timing_durations -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def func1():
+            """
+            Example:
+                >>> import time
+                >>> x = 1
+                >>> time.sleep(0.05); y = 2
+                >>> z = 3
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_line_timing.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                durations=2,
+                config={'line_timing': True},
+            )
+    assert cap.text is not None
+    assert 'slowest lines:' in cap.text
+    assert 'SLOWEST LINES' in cap.text
+    # The sleep dominates and is reported at its line in the source file
+    after = cap.text.split('slowest lines:')[1].strip().splitlines()
+    assert len(after) == 2
+    assert 'test_line_timing.py:6: time.sleep(0.05); y = 2' in after[0]
+
+
+def test_trace_events() -> None:
+    """
+    pytest tests/test_runner.py::test_trace_events -s
+    """
+    import json
+
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def func1():
+            """
+            Example:
+                >>> x = 1
+                >>> print(x)
+                1
+            """
+
+        def func2():
+            """
+            Example:
+                >>> print(2)
+                2
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_trace_events.py')
+        fpath = join(str(dpath), 'trace.json')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout():
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], trace_events=fpath
+            )
+        assert run_summary['trace_events'] == fpath
+        with open(fpath) as file:
+            data = json.load(file)
+    events = [e for e in data['traceEvents'] if e['ph'] == 'X']
+    cats = {e['cat'] for e in events}
+    assert {'run', 'calldefs', 'parse', 'import', 'doctest', 'exec'} <= cats
+    doctest_events = [e for e in events if e['cat'] == 'doctest']
+    assert len(doctest_events) == 2
+    part_events = [e for e in events if e['cat'] == 'exec']
+    assert len(part_events) == 3
+    # Parts are nested within their doctest on the same track
+    outer = doctest_events[0]
+    inner = part_events[0]
+    assert inner['tid'] == outer['tid']
+    assert outer['ts'] <= inner['ts']
+    assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+
+
+def test_resource_report() -> None:
+    """
+    pytest tests/test_runner.py::test_resource_report -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def big_func():
+            """
+            Example:
+                >>> data = [0] * 2000000
+                >>> del data
+            """
+
+        def small_func():
+            """
+            Example:
+                >>> data = [0] * 10
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_resource_report.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], resource_report=True
+            )
+    assert cap.text is not None
+    assert '=== Resource report ===' in cap.text
+    resource_info = run_summary['resources']
+    assert len(resource_info['records']) == 2
+    top_node = resource_info['top_peak_alloc'][0]
+    assert top_node.endswith('big_func:0')
+    record = [r for r in resource_info['records'] if r['node'] == top_node][0]
+    assert record['peak_alloc'] >= 8 * 2000000
+
+
+def test_detect_leaks() -> None:
+    """
+    pytest tests/test_runner.py::test_detect_leaks -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        _CACHE = []
+
+        def leaky_func():
+            """
+            Example:
+                >>> _CACHE.extend([[] for _ in range(500)])
+            """
+
+        def clean_func():
+            """
+            Example:
+                >>> data = [[] for _ in range(500)]
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_detect_leaks.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], detect_leaks=True, leak_reruns=2
+            )
+    assert cap.text is not None
+    assert '=== Leak report ===' in cap.text
+    suspects = run_summary['leaks']['suspects']
+    nodes = [record['node'] for record in suspects]
+    assert any(node.endswith('leaky_func:0') for node in nodes)
+    assert not any(node.endswith('clean_func:0') for node in nodes)
+    record = [r for r in suspects if r['node'].endswith('leaky_func:0')][0]
+    assert record['confirmed'] is True
+    assert len(record['rerun_objects']) == 2
+    assert record['top_types'][0][0] == 'list'
+
+
+def test_repeat_benchmark() -> None:
+    """
+    pytest tests/test_runner.py::test_repeat_benchmark -s
+    """
+    import json
+
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        _COUNTER = [0]
+
+        def counted():
+            """
+            Only the first execution is checked, so later iterations that
+            print a different value still count as successful.
+
+            Example:
+                >>> _COUNTER[0] += 1
+                >>> print(_COUNTER[0])
+                1
+            """
+
+        def failing():
+            """
+            Example:
+                >>> assert False
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_repeat_benchmark.py')
+        fpath = join(str(dpath), 'bench.json')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                repeat=4,
+                warmup=2,
+                benchmark_json=fpath,
+            )
+        with open(fpath) as file:
+            data = json.load(file)
+    assert cap.text is not None
+    assert '=== Benchmark (repeat=4, warmup=2) ===' in cap.text
+    assert run_summary['n_failed'] == 1
+    results = run_summary['benchmark']['results']
+    # Failing doctests are not benchmarked
+    assert len(results) == 1
+    assert results[0]['node'].endswith('counted:0')
+    assert results[0]['n'] == 4
+    assert len(results[0]['times']) == 4
+    assert data['results'] == results
+    assert data['repeat'] == 4
+
+
+def test_budget_directives() -> None:
+    """
+    pytest tests/test_runner.py::test_budget_directives -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def slow_part():
+            """
+            Example:
+                >>> import time
+                >>> time.sleep(0.05)  # xdoctest: +MAX_TIME(1ms)
+            """
+
+        def slow_block():
+            """
+            Example:
+                >>> # xdoctest: +MAX_TIME(30ms)
+                >>> import time
+                >>> time.sleep(0.02)
+                >>> time.sleep(0.02)
+            """
+
+        def big_alloc():
+            """
+            Example:
+                >>> # xdoctest: +MAX_MEMORY(1MB)
+                >>> data = bytearray(4 * 1024 ** 2)
+            """
+
+        def within_budget():
+            """
+            Example:
+                >>> # xdoctest: +MAX_TIME(60), +MAX_MEMORY(100MB)
+                >>> data = list(range(10))
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_budget_directives.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            run_summary = runner.doctest_module(modpath, 'all', argv=[''])
+        assert cap.text is not None
+        assert run_summary['n_failed'] == 3
+        assert run_summary['n_passed'] == 1
+        assert 'REASON: BudgetExceededError' in cap.text
+        assert 'MAX_TIME budget exceeded: part 1 took' in cap.text
+        assert 'MAX_TIME budget exceeded: parts took' in cap.text
+        assert 'MAX_MEMORY budget exceeded: a part allocated 4.0MB' in cap.text
+
+        # The budgets can be scaled or disabled globally
+        config = {'budget_scale': 10}
+        with utils.CaptureStdout():
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], config=config
+            )
+        assert run_summary['n_failed'] == 1
+        config = {'default_runtime_state': {'MAX_TIME': False}}
+        with utils.CaptureStdout():
+            run_summary = runner.doctest_module(
+                modpath, 'all', argv=[''], config=config
+            )
+        assert run_summary['n_failed'] == 1
+
+
+def test_duration_history() -> None:
+    """
+    pytest tests/test_runner.py::test_duration_history -s
+    """
+    from xdoctest import cache, runner
+
+    source = utils.codeblock(
+        '''
+        def fast():
+            """
+            Example:
+                >>> x = 1
+            """
+
+        def slow():
+            """
+            Example:
+                >>> import time
+                >>> time.sleep(0.05)
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_duration_history.py')
+        cache_dpath = join(str(dpath), 'cache')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout():
+            runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                cache_dir=cache_dpath,
+                duration_history=True,
+            )
+        history = cache.DurationHistory(cache_dpath)
+        nodes = sorted(history.entries, key=history.estimate)
+        # The keys do not depend on where the module is checked out
+        assert nodes == [
+            'test_duration_history::fast:0',
+            'test_duration_history::slow:0',
+        ]
+
+        # The slowest doctest now runs first
+        with utils.CaptureStdout() as cap:
+            runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                cache_dir=cache_dpath,
+                longest_first=True,
+                progress=True,
+            )
+        assert cap.text is not None
+        assert '[1/2]' in cap.text and 'ETA' in cap.text
+        assert cap.text.index('slow:0') < cap.text.index('fast:0')
+        assert cache.DurationHistory(cache_dpath).entries[nodes[0]]['n'] == 2
+
+
+def test_baseline_regressions() -> None:
+    """
+    pytest tests/test_runner.py::test_baseline_regressions -s
+    """
+    import os
+
+    from xdoctest import __main__
+
+    template = utils.codeblock(
+        '''
+        def steady():
+            """
+            Example:
+                >>> x = 1
+            """
+
+        def changing():
+            """
+            Example:
+                >>> import time
+                >>> time.sleep({})
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_baseline_regressions.py')
+        cache_dpath = join(str(dpath), 'cache')
+        base_argv = ['xdoctest', modpath, 'all', '--cache-dir', cache_dpath]
+        with open(modpath, 'w') as file:
+            file.write(template.format(0))
+        with utils.CaptureStdout():
+            retcode = __main__.main(base_argv + ['--save-baseline', 'main'])
+        assert retcode == 0
+        assert exists(join(cache_dpath, 'baselines', 'main.json'))
+
+        # Compare a changed copy in another checkout against the baseline
+        other_dpath = join(str(dpath), 'other')
+        os.makedirs(other_dpath)
+        modpath = join(other_dpath, 'test_baseline_regressions.py')
+        with open(modpath, 'w') as file:
+            file.write(template.format(0.1))
+        argv = ['xdoctest', modpath, 'all', '--cache-dir', cache_dpath]
+        argv += ['--compare-baseline', 'main']
+        with utils.CaptureStdout() as cap:
+            retcode = __main__.main(argv)
+        assert retcode == 0
+        assert cap.text is not None
+        assert '=== Baseline comparison (main) ===' in cap.text
+        assert '1 regressions' in cap.text
+        assert 'time: ' in cap.text and 'changing:0' in cap.text
+
+        # Regressions can fail the run
+        with utils.CaptureStdout():
+            retcode = __main__.main(argv + ['--fail-on-regression'])
+        assert retcode == 1
+        # But not if the slowdown is tolerated
+        with utils.CaptureStdout():
+            retcode = __main__.main(
+                argv + ['--fail-on-regression', '--baseline-atol', '10']
+            )
+        assert retcode == 0
+
+
+def test_last_failed_and_maxfail() -> None:
+    """
+    pytest tests/test_runner.py::test_last_failed_and_maxfail -s
+    """
+    from xdoctest import __main__
+
+    source = utils.codeblock(
+        '''
+        def pass1():
+            """
+            Example:
+                >>> print('running pass1')
+            """
+
+        def fail1():
+            """
+            Example:
+                >>> print('running fail1')
+                >>> assert False
+            """
+
+        def fail2():
+            """
+            Example:
+                >>> print('running fail2')
+                >>> assert False
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        modpath = join(str(dpath), 'test_last_failed.py')
+        cache_dpath = join(str(dpath), 'cache')
+        base_argv = ['xdoctest', modpath, 'all', '--cache-dir', cache_dpath]
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        # Stop at the first failure
+        with utils.CaptureStdout() as cap:
+            retcode = __main__.main(base_argv + ['-x'])
+        assert retcode == 1
+        assert cap.text is not None
+        assert 'running fail2' not in cap.text
+        assert '1 failed, 1 passed, 1 not run' in cap.text
+
+        # Only fail1 is known to fail, so it runs alone
+        with utils.CaptureStdout() as cap:
+            __main__.main(base_argv + ['--lf'])
+        assert cap.text is not None
+        assert 'running 1 of 3 doctests that failed last time' in cap.text
+        assert 'running pass1' not in cap.text
+        assert 'running fail1' in cap.text
+
+        # A full run records fail2, and --ff runs both failures first
+        with utils.CaptureStdout():
+            __main__.main(base_argv)
+        with utils.CaptureStdout() as cap:
+            __main__.main(base_argv + ['--ff', '--maxfail', '2'])
+        assert cap.text is not None
+        assert 'running pass1' not in cap.text
+        assert '2 failed, 1 not run' in cap.text
+
+        # The failures are found from another checkout as well
+        other_dpath = utils.ensuredir(join(str(dpath), 'other'))
+        other_modpath = join(other_dpath, 'test_last_failed.py')
+        with open(other_modpath, 'w') as file:
+            file.write(source)
+        argv = ['xdoctest', other_modpath, 'all', '--cache-dir', cache_dpath]
+        with utils.CaptureStdout() as cap:
+            __main__.main(argv + ['--lf'])
+        assert cap.text is not None
+        assert 'running 2 of 3 doctests that failed last time' in cap.text
+
+
+def test_cache_results() -> None:
+    """
+    pytest tests/test_runner.py::test_cache_results -s
+    """
+    import shutil
+
+    from xdoctest import runner
+
+    with utils.TempDir() as temp:
+        dpath = temp.dpath
+        pkg_dpath = join(str(dpath), 'cache_results_pkg')
+        utils.ensuredir(pkg_dpath)
+        cache_dpath = join(str(dpath), 'cache')
+        helper_fpath = join(pkg_dpath, 'helper.py')
+        modpath = join(pkg_dpath, 'mod.py')
+        with open(join(pkg_dpath, '__init__.py'), 'w') as file:
+            file.write('')
+        with open(join(pkg_dpath, 'unrelated.py'), 'w') as file:
+            file.write('VALUE = 1\n')
+        with open(helper_fpath, 'w') as file:
+            file.write('VALUE = 1\n')
+        with open(modpath, 'w') as file:
+            file.write(
+                utils.codeblock(
+                    '''
+                    from .helper import VALUE
+
+                    def uses_helper():
+                        """
+                        Example:
+                            >>> assert VALUE == 1
+                        """
+
+                    def fails():
+                        """
+                        Example:
+                            >>> assert False
+                        """
+                    '''
+                )
+            )
+
+        def run(**kwargs):
+            with utils.CaptureStdout():
+                return runner.doctest_module(
+                    modpath,
+                    'all',
+                    argv=[''],
+                    cache_dir=cache_dpath,
+                    cache_results=True,
+                    **kwargs,
+                )
+
+        summary = run()
+        assert summary['n_passed'] == 1 and summary['n_failed'] == 1
+        assert summary['n_cached'] == 0
+        assert exists(join(cache_dpath, 'results.json'))
+
+        # The passing doctest is cached, the failing one runs again
+        summary = run()
+        assert summary['n_cached'] == 1 and summary['n_failed'] == 1
+        assert summary['result_cache']['hits'] == 1
+
+        # Changing an unrelated module does not invalidate the cache
+        with open(join(pkg_dpath, 'unrelated.py'), 'w') as file:
+            file.write('VALUE = 2\n')
+        assert run()['n_cached'] == 1
+
+        # Changing an imported first-party module does
+        with open(helper_fpath, 'w') as file:
+            file.write('VALUE = 1  # changed\n')
+        summary = run()
+        assert summary['n_cached'] == 0 and summary['n_passed'] == 1
+
+        # As does the configuration
+        config = {'global_exec': 'import math'}
+        assert run(config=config)['n_cached'] == 0
+        assert run(config=config)['n_cached'] == 1
+
+        # --no-cache runs everything
+        summary = run(config=config, no_cache=True)
+        assert summary['n_cached'] == 0 and summary['n_passed'] == 1
+        assert summary['result_cache']['hits'] == 1
+
+        # The results are found from another checkout as well
+        other_dpath = join(str(dpath), 'other', 'cache_results_pkg')
+        shutil.copytree(pkg_dpath, other_dpath)
+        with utils.CaptureStdout():
+            summary = runner.doctest_module(
+                join(other_dpath, 'mod.py'),
+                'all',
+                argv=[''],
+                cache_dir=cache_dpath,
+                cache_results=True,
+                config=config,
+            )
+        assert summary['n_cached'] == 1
+
+
+def test_changed_since() -> None:
+    """
+    pytest tests/test_runner.py::test_changed_since -s
+    """
+    import subprocess
+
+    from xdoctest import changes, runner
+
+    def git(*args):
+        subprocess.check_call(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test']
+            + list(args),
+            cwd=dpath,
+            stdout=subprocess.DEVNULL,
+        )
+
+    source = utils.codeblock(
+        '''
+        def func1():
+            """
+            Example:
+                >>> print('running func1')
+            """
+
+        def func2():
+            """
+            Example:
+                >>> print('running func2')
+
+            Example:
+                >>> print('running func2 again')
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        pkg_dpath = join(dpath, 'changed_pkg')
+        utils.ensuredir(pkg_dpath)
+        modpath = join(pkg_dpath, 'changed_mod.py')
+        other_modpath = join(pkg_dpath, 'unchanged_mod.py')
+        with open(join(pkg_dpath, '__init__.py'), 'w') as file:
+            file.write('')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with open(other_modpath, 'w') as file:
+            file.write(source)
+        git('init', '-q')
+        git('add', '.')
+        git('commit', '-q', '-m', 'initial')
+
+        def run(target):
+            with utils.CaptureStdout() as cap:
+                summary = runner.doctest_module(
+                    target, 'all', argv=[''], changed_since='HEAD'
+                )
+            return summary, cap.text
+
+        summary, text = run(pkg_dpath)
+        assert summary['n_total'] == 0
+
+        # Only the second example of func2 changed
+        with open(modpath, 'w') as file:
+            file.write(source.replace('func2 again', 'func2 once more'))
+        summary, text = run(pkg_dpath)
+        assert summary['n_total'] == 1
+        assert 'running func2 once more' in text
+
+        # Untracked files count as entirely changed
+        with open(join(pkg_dpath, 'new_mod.py'), 'w') as file:
+            file.write(source)
+        summary, text = run(modpath)
+        assert summary['n_total'] == 1
+        summary, text = run(pkg_dpath)
+        assert summary['n_total'] == 4
+
+        # Paths that git quotes in diffs are found as well
+        quoted_fpath = join(dpath, 'caf\u00e9 "q".py')
+        with open(quoted_fpath, 'w') as file:
+            file.write('x = 1\n')
+        git('add', '.')
+        git('commit', '-q', '-m', 'quoted')
+        with open(quoted_fpath, 'w') as file:
+            file.write('x = 2\n')
+        assert quoted_fpath in changes.ChangeSet.from_git('HEAD', dpath)
+
+
+def test_test_impact() -> None:
+    """
+    pytest tests/test_runner.py::test_test_impact -s
+    """
+    import subprocess
+
+    from xdoctest import impact, runner
+
+    def git(*args):
+        subprocess.check_call(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test']
+            + list(args),
+            cwd=dpath,
+            stdout=subprocess.DEVNULL,
+        )
+
+    lib_source = utils.codeblock(
+        """
+        SCALE = 1
+
+
+        def double(x):
+            return x * 2 * SCALE
+
+
+        def triple(x):
+            return x * 3 * SCALE
+        """
+    )
+    mod_source = utils.codeblock(
+        '''
+        def check_double():
+            """
+            Example:
+                >>> from impact_pkg.lib import double
+                >>> print(double(2))
+                4
+            """
+
+
+        def check_triple():
+            """
+            Example:
+                >>> from impact_pkg.lib import triple
+                >>> print(triple(2))
+                6
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        pkg_dpath = join(dpath, 'impact_pkg')
+        cache_dpath = join(dpath, 'cache')
+        utils.ensuredir(pkg_dpath)
+        lib_fpath = join(pkg_dpath, 'lib.py')
+        with open(join(pkg_dpath, '__init__.py'), 'w') as file:
+            file.write('')
+        with open(lib_fpath, 'w') as file:
+            file.write(lib_source)
+        with open(join(pkg_dpath, 'mod.py'), 'w') as file:
+            file.write(mod_source)
+        with open(join(dpath, '.gitignore'), 'w') as file:
+            file.write('cache/\n')
+        git('init', '-q')
+        git('add', '.')
+        git('commit', '-q', '-m', 'initial')
+
+        def run(**kwargs):
+            with utils.CaptureStdout() as cap:
+                summary = runner.doctest_module(
+                    pkg_dpath,
+                    'all',
+                    argv=[''],
+                    cache_dir=cache_dpath,
+                    **kwargs,
+                )
+            return summary, cap.text
+
+        # Without footprints everything runs
+        summary, text = run(impacted=True)
+        assert summary['n_total'] == 2
+        assert 'running all doctests' in text
+
+        with utils.PythonPathContext(dpath):
+            summary, text = run(record_impact=True)
+        assert summary['n_passed'] == 2
+        assert exists(join(cache_dpath, 'impact.json'))
+        # The footprints do not depend on where the package is checked out
+        assert sorted(impact.ImpactMap(cache_dpath).nodes) == [
+            'impact_pkg.mod::check_double:0',
+            'impact_pkg.mod::check_triple:0',
+        ]
+
+        summary, text = run(impacted=True)
+        assert summary['n_total'] == 0
+
+        # Only the doctest that calls the edited function runs
+        with open(lib_fpath, 'w') as file:
+            file.write(lib_source.replace('x * 3', 'x + x + x'))
+        summary, text = run(impacted=True)
+        assert summary['n_total'] == 1
+        assert 'check_triple' in text
+
+        # Module-level code runs at import time, which affects everything
+        with open(lib_fpath, 'w') as file:
+            file.write(lib_source.replace('SCALE = 1', 'SCALE = 1  # one'))
+        summary, text = run(impacted=True)
+        assert summary['n_total'] == 2
+
+        # Footprints recorded from a dirty tree are stale after a commit
+        with utils.PythonPathContext(dpath):
+            run(record_impact=True)
+        git('commit', '-q', '-am', 'edit')
+        summary, text = run(impacted=True)
+        assert summary['n_total'] == 2
+        assert 'running all doctests' in text
+
+
+def test_coverage() -> None:
+    """
+    pytest tests/test_runner.py::test_coverage -s
+    """
+    import json
+    import os
+    import sys
+
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def sign(x):
+            """
+            Example:
+                >>> print(sign(2))
+                1
+            """
+            if x > 0:
+                return 1
+            return -1
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        pkg_dpath = join(dpath, 'coverage_pkg')
+        utils.ensuredir(pkg_dpath)
+        modpath = join(pkg_dpath, 'mod.py')
+        report_fpath = join(dpath, 'report', 'coverage.json')
+        with open(join(pkg_dpath, '__init__.py'), 'w') as file:
+            file.write('')
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        if sys.gettrace() is not None and sys.version_info[0:2] < (3, 12):
+            import pytest
+
+            pytest.skip('coverage cannot be measured under another tracer')
+
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                pkg_dpath, 'all', argv=[''], coverage=report_fpath
+            )
+        assert summary['n_passed'] == 1
+        assert '=== Coverage ===' in cap.text
+
+        with open(report_fpath) as file:
+            data = json.load(file)
+        file_data = data['files'][os.path.realpath(modpath)]
+        # The doctest lines are attributed to the docstring
+        assert 4 in file_data['executed_lines']
+        assert 7 in file_data['executed_lines']
+        assert 8 in file_data['executed_lines']
+        assert 9 in file_data['missing_lines']
+        if data['meta']['branch_coverage']:
+            assert [7, 8] in file_data['executed_branches']
+            assert [7, 9] in file_data['missing_branches']
+
+        # Anything else is written in the lcov format
+        lcov_fpath = join(dpath, 'coverage.lcov')
+        with utils.CaptureStdout():
+            runner.doctest_module(
+                pkg_dpath, 'all', argv=[''], coverage=lcov_fpath
+            )
+        with open(lcov_fpath) as file:
+            text = file.read()
+        assert 'SF:{}'.format(os.path.realpath(modpath)) in text
+        assert 'DA:9,0' in text
+
+
+def test_shard() -> None:
+    """
+    pytest tests/test_runner.py::test_shard -s
+    """
+    from xdoctest import runner, sharding
+
+    source = '\n'.join(
+        [
+            utils.codeblock(
+                '''
+                def func{0}():
+                    """
+                    Example:
+                        >>> print('func{0}')
+                    """
+                '''
+            ).format(i)
+            for i in range(10)
+        ]
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        modpath = join(dpath, 'shard_mod.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        # Every shard must see the same durations, so record them up front
+        with utils.CaptureStdout():
+            runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                cache_dir=join(dpath, 'cache'),
+                duration_history=True,
+            )
+
+        for strategy in ['hash', 'duration']:
+            reports = []
+            n_passed = 0
+            for index in [1, 2, 3]:
+                report_fpath = join(dpath, '{}{}.json'.format(strategy, index))
+                with utils.CaptureStdout() as cap:
+                    summary = runner.doctest_module(
+                        modpath,
+                        'all',
+                        argv=[''],
+                        shard='{}/3'.format(index),
+                        shard_strategy=strategy,
+                        shard_report=report_fpath,
+                        cache_dir=join(dpath, 'cache'),
+                    )
+                assert '=== Shard {}/3 ==='.format(index) in cap.text
+                n_passed += summary['n_passed']
+                assert summary['n_deselected'] + summary['n_passed'] == 10
+                reports.append(summary['shard'])
+            assert n_passed == 10
+            assert sharding.verify_reports(reports) == []
+            assert exists(report_fpath)
+
+
+def test_serve_queue() -> None:
+    """
+    pytest tests/test_runner.py::test_serve_queue -s
+    """
+    import json
+    import sys
+
+    from xdoctest import runner
+
+    if sys.platform.startswith('win32'):
+        import pytest
+
+        pytest.skip('uses a Unix socket')
+
+    source = utils.codeblock(
+        '''
+        def passing():
+            """
+            >>> print('passing')
+            """
+
+        def failing():
+            """
+            >>> assert False
+            """
+
+        def skipped():
+            """
+            >>> # xdoctest: +SKIP
+            >>> print('skipped')
+            """
+
+        def crashing():
+            """
+            >>> # Kill the first worker that runs this
+            >>> import os
+            >>> marker = os.path.join(os.path.dirname(__file__), 'crashed')
+            >>> if not os.path.exists(marker):
+            ...     open(marker, 'w').close()
+            ...     os._exit(1)
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        addresses = ['127.0.0.1:0', 'unix:' + join(dpath, 'queue.sock')]
+        for index, address in enumerate(addresses):
+            mod_dpath = utils.ensuredir(join(dpath, str(index)))
+            modpath = join(mod_dpath, 'queue_mod.py')
+            marker = join(mod_dpath, 'crashed')
+            journal_fpath = join(mod_dpath, 'journal.jsonl')
+            with open(modpath, 'w') as file:
+                file.write(source)
+            with utils.CaptureStdout() as cap:
+                summary = runner.doctest_module(
+                    modpath,
+                    'all',
+                    argv=[''],
+                    serve_queue=address,
+                    queue_workers=2,
+                    journal=journal_fpath,
+                )
+            # The skipped doctest is skipped at collection and never served
+            assert 'serving 3 doctest(s)' in cap.text
+            assert summary['n_passed'] == 2
+            assert summary['n_failed'] == 1
+            assert summary['n_skipped'] == 1
+            assert summary['n_not_run'] == 0
+            # The crashing doctest was re-queued onto the other worker
+            assert exists(marker)
+            assert 'failing:0' in summary['failed'][0].cmdline
+            assert 'AssertionError' in '\n'.join(
+                summary['failed'][0].repr_failure()
+            )
+            # The journal records the failure report of the worker
+            with open(journal_fpath) as file:
+                records = [json.loads(line) for line in file]
+            failures = [
+                r['failure'] for r in records if r['status'] == 'failed'
+            ]
+            assert len(failures) == 1
+            assert 'AssertionError' in '\n'.join(failures[0])
+
+
+def test_serve_queue_locks() -> None:
+    """
+    pytest tests/test_runner.py::test_serve_queue_locks -s
+    """
+    import sys
+
+    from xdoctest import runner
+
+    if sys.platform.startswith('win32'):
+        import pytest
+
+        pytest.skip('uses a Unix socket')
+
+    blocks = [
+        utils.codeblock(
+            '''
+            import os
+            import time
+
+            ACTIVE = os.path.join(os.path.dirname(__file__), 'active')
+
+
+            def occupy(name):
+                """
+                Mark a doctest as running for a while and return the doctests
+                that ran at the same time.
+                """
+                fpath = os.path.join(ACTIVE, name)
+                open(fpath, 'w').close()
+                try:
+                    others = set(os.listdir(ACTIVE))
+                    time.sleep(0.2)
+                    others.update(os.listdir(ACTIVE))
+                finally:
+                    os.remove(fpath)
+                return sorted(others - {name})
+            '''
+        ),
+        utils.codeblock(
+            '''
+            def serial():
+                """
+                >>> occupy('serial')  # xdoctest: +SERIAL
+                []
+                """
+            '''
+        ),
+    ]
+    for num in range(3):
+        blocks.append(
+            utils.codeblock(
+                f'''
+                def locked{num}():
+                    """
+                    >>> # xdoctest: +LOCK(port)
+                    >>> others = occupy('locked{num}')
+                    >>> assert not [n for n in others if 'locked' in n]
+                    """
+
+
+                def free{num}():
+                    """
+                    >>> occupy('free{num}')
+                    ...
+                    """
+                '''
+            )
+        )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        utils.ensuredir(join(dpath, 'active'))
+        modpath = join(dpath, 'locked_mod.py')
+        with open(modpath, 'w') as file:
+            file.write('\n\n\n'.join(blocks))
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                serve_queue='unix:' + join(dpath, 'queue.sock'),
+                queue_workers=3,
+            )
+        assert summary['n_passed'] == 7, cap.text
+        assert summary['n_failed'] == 0
+
+
+def test_smoke_run() -> None:
+    """
+    pytest tests/test_runner.py::test_smoke_run -s
+    """
+    from xdoctest import runner
+
+    sources = {
+        'mod_a.py': utils.codeblock(
+            '''
+            def broken():
+                """
+                >>> assert False
+                """
+
+            def slow():
+                """
+                >>> import time
+                >>> time.sleep(0.5)
+                """
+
+            def fast():
+                """
+                >>> print('fast')
+                fast
+                """
+            '''
+        ),
+        'mod_b.py': utils.codeblock(
+            '''
+            def first():
+                """
+                >>> print('first')
+                first
+                """
+
+            def second():
+                """
+                >>> print('second')
+                second
+                """
+            '''
+        ),
+    }
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        pkg_dpath = utils.ensuredir(join(dpath, 'smoke_pkg'))
+        open(join(pkg_dpath, '__init__.py'), 'w').close()
+        for fname, source in sources.items():
+            with open(join(pkg_dpath, fname), 'w') as file:
+                file.write(source)
+        kwargs = dict(argv=[''], cache_dir=join(dpath, 'cache'))
+
+        # Smoke runs record durations and failures, here of the full suite
+        with utils.CaptureStdout():
+            summary = runner.doctest_module(
+                pkg_dpath, 'all', sample='1.0', **kwargs
+            )
+        assert summary['n_failed'] == 1
+
+        # The failed doctest goes first, then one doctest of the other module
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                pkg_dpath, 'all', sample='2', **kwargs
+            )
+        smoke_info = summary['smoke']
+        assert summary['n_failed'] == 1
+        assert summary['n_passed'] == 1
+        assert smoke_info['n_failed_first'] == 1
+        assert smoke_info['n_modules_covered'] == 2
+        assert len(smoke_info['skipped']['not sampled']) == 3
+        assert 'ran 2 of 5 doctests from 2 of 2 modules' in cap.text
+        assert 'skipped 3: not sampled' in cap.text
+
+        # The slow doctest does not fit into the budget
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                pkg_dpath, 'all', time_budget=0.3, **kwargs
+            )
+        skipped = summary['smoke']['skipped']
+        assert list(skipped) == ['expected to exceed the remaining time budget']
+        assert skipped[list(skipped)[0]][0].endswith('slow:0')
+        assert summary['n_passed'] == 3
+        assert summary['n_not_run'] == 1
+        assert 'used' in cap.text and 'of a 0.30s time budget' in cap.text
+
+
+def test_journal_resume() -> None:
+    """
+    pytest tests/test_runner.py::test_journal_resume -s
+    """
+    import subprocess
+    import sys
+
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def a_passing():
+            """
+            >>> print('a')
+            a
+            """
+
+        def b_failing():
+            """
+            >>> assert False, 'b is broken'
+            """
+
+        def c_crashing():
+            """
+            >>> # Kill the first run, like an OOM kill would
+            >>> import os
+            >>> marker = os.path.join(os.path.dirname(__file__), 'crashed')
+            >>> if not os.path.exists(marker):
+            ...     open(marker, 'w').close()
+            ...     os._exit(1)
+            """
+
+        def d_passing():
+            """
+            >>> print('d')
+            d
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        modpath = join(dpath, 'journal_mod.py')
+        journal_fpath = join(dpath, 'journal.jsonl')
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        command = [sys.executable, '-m', 'xdoctest', modpath, 'all']
+        info = subprocess.run(
+            command + ['--journal', journal_fpath],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        assert info.returncode == 1
+        with open(journal_fpath) as file:
+            assert len(file.read().splitlines()) == 2
+
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                journal=journal_fpath,
+                resume=True,
+            )
+        assert 'resuming: 2 doctests finished in an earlier run' in cap.text
+        assert 'resumed 2 doctests from an earlier run' in cap.text
+        assert summary['n_passed'] == 3
+        assert summary['n_failed'] == 1
+        assert summary['n_total'] == 4
+        assert summary['journal']['resumed']['failed'] == 1
+        assert 'b is broken' in '\n'.join(summary['failed'][0].repr_failure())
+        assert 'b_failing:0' in summary['failed'][0].cmdline
+        with open(journal_fpath) as file:
+            assert len(file.read().splitlines()) == 4
+
+
+def test_selection_pushdown() -> None:
+    """
+    pytest tests/test_runner.py::test_selection_pushdown -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def good_one():
+            """
+            >>> print('one')
+            one
+            """
+
+        def good_two():
+            """
+            >>> print('two')
+            two
+            >>> print('three')  # xdoctest: +SKIP
+            """
+
+        def unparsable():
+            """
+            >>> x = (
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        modpath = join(temp.dpath, 'pushdown_mod.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        # The unparsable docstring is only parsed if it is selected
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(modpath, 'all', argv=[''])
+        assert 'Cannot scrape callname=unparsable' in cap.text
+
+        cases = [
+            ({'command': 'good_one'}, 1),
+            ({'command': 'good_*'}, 2),
+            ({'command': 'all', 'keyword': 'two or one'}, 2),
+            ({'command': 'good_*', 'keyword': 'not two'}, 1),
+            ({'command': 'all', 'keyword': 'pushdown_mod and two'}, 1),
+        ]
+        for kwargs, n_passed in cases:
+            with utils.CaptureStdout() as cap:
+                summary = runner.doctest_module(modpath, argv=[''], **kwargs)
+            assert 'Cannot scrape callname=unparsable' not in cap.text, kwargs
+            assert summary['n_passed'] == n_passed, kwargs
+
+
+def test_dedup() -> None:
+    """
+    pytest tests/test_runner.py::test_dedup -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def func():
+            """
+            Example:
+                >>> import os
+                >>> marker = os.path.join(os.path.dirname(__file__), 'ran')
+                >>> with open(marker, 'a') as file:
+                ...     _ = file.write('x')
+            """
+
+        def func_alias():
+            """
+            Example:
+                >>> import os
+                >>> marker = os.path.join(os.path.dirname(__file__), 'ran')
+                >>> with open(marker, 'a') as file:
+                ...     _ = file.write('x')
+            """
+
+        def other():
+            """
+            Example:
+                >>> print('other')
+                other
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        modpath = join(dpath, 'dedup_mod.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                modpath, 'all', argv=[''], dedup=True
+            )
+        with open(join(dpath, 'ran')) as file:
+            assert file.read() == 'x'
+
+    assert summary['n_passed'] == 2
+    assert summary['n_deduplicated'] == 1
+    groups = summary['dedup']['groups']
+    assert [g['status'] for g in groups] == ['passed']
+    assert groups[0]['node'].endswith('::func:0')
+    assert groups[0]['aliases'] == [
+        groups[0]['node'].replace('func', 'func_alias')
+    ]
+    assert '=== Deduplicated ===' in cap.text
+    assert 'alias: ' in cap.text
+    assert '2 passed, 1 deduplicated' in cap.text
+
+
+def test_static_skip() -> None:
+    """
+    pytest tests/test_runner.py::test_static_skip -s
+    """
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def skipped():
+            """
+            >>> # xdoctest: +SKIP
+            >>> raise AssertionError('should not run')
+            """
+
+        def missing_module():
+            """
+            >>> # xdoctest: +REQUIRES(module:notamodule)
+            >>> import notamodule
+            """
+
+        def reenabled():
+            """
+            >>> # xdoctest: +SKIP
+            >>> raise AssertionError('should not run')
+            >>> # xdoctest: -SKIP
+            >>> print('ran')
+            ran
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        modpath = join(str(temp.dpath), 'static_skip_mod.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(modpath, 'all', argv=[''])
+
+    assert summary['n_passed'] == 1
+    assert summary['n_skipped'] == 2
+    assert summary['n_total'] == 3
+    static_skips = summary['static_skips']
+    assert [n.split('::')[-1] for n in sum(static_skips.values(), [])] == [
+        'skipped:0',
+        'missing_module:0',
+    ]
+    assert list(static_skips) == [
+        'doctest encountered a SKIP directive',
+        'doctest has unmet requirements: module:notamodule',
+    ]
+    assert '=== Skipped at collection ===' in cap.text
+    assert '1 passed, 2 skipped' in cap.text
+
+
+def test_unwritable_cache_dir() -> None:
+    """
+    pytest tests/test_runner.py::test_unwritable_cache_dir -s
+    """
+    import warnings
+
+    from xdoctest import runner
+
+    source = utils.codeblock(
+        '''
+        def func():
+            """
+            >>> print('ok')
+            ok
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        modpath = join(str(temp.dpath), 'unwritable_cache_mod.py')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        # A path below a regular file can never be created
+        cache_dir = join(modpath, 'cache')
+        with warnings.catch_warnings(record=True) as warnlist:
+            warnings.simplefilter('always')
+            with utils.CaptureStdout():
+                summary = runner.doctest_module(
+                    modpath,
+                    'all',
+                    argv=[''],
+                    cache_dir=cache_dir,
+                    cache_failures=True,
+                    duration_history=True,
+                )
+    assert summary['n_passed'] == 1
+    messages = [str(w.message) for w in warnlist]
+    assert any('cannot write' in m for m in messages), messages
+
+
+def test_serve_queue_rejects_local_options() -> None:
+    """
+    pytest tests/test_runner.py::test_serve_queue_rejects_local_options
+    """
+    import pytest
+
+    from xdoctest import runner
+
+    options = [
+        {'save_baseline': 'main'},
+        {'compare_baseline': 'main'},
+        {'timing_breakdown': True},
+        {'config': {'line_timing': True}},
+    ]
+    for kwargs in options:
+        with pytest.raises(ValueError, match='serve_queue cannot be combined'):
+            runner.doctest_module(
+                'xdoctest.smoke',
+                'all',
+                argv=[''],
+                serve_queue='127.0.0.1:0',
+                **kwargs,
+            )
+
+
+def test_serve_queue_profile() -> None:
+    """
+    pytest tests/test_runner.py::test_serve_queue_profile -s
+    """
+    import glob
+    import sys
+
+    from xdoctest import runner
+
+    if sys.platform.startswith('win32'):
+        import pytest
+
+        pytest.skip('uses a Unix socket')
+
+    source = utils.codeblock(
+        '''
+        def first():
+            """
+            >>> print(sum(range(10)))
+            45
+            """
+
+        def second():
+            """
+            >>> print(sum(range(20)))
+            190
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        modpath = join(dpath, 'queue_profile_mod.py')
+        profile_dpath = join(dpath, 'prof')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout() as cap:
+            summary = runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                serve_queue='unix:' + join(dpath, 'queue.sock'),
+                queue_workers=2,
+                profile=True,
+                profile_dir=profile_dpath,
+            )
+        assert summary['n_passed'] == 2
+        assert 'wrote their profiles to' in cap.text
+        # Each worker that ran a doctest merged its profiles under its name
+        merged = glob.glob(join(profile_dpath, 'combined.local-*.prof'))
+        assert 1 <= len(merged) <= 2
+        assert len(glob.glob(join(profile_dpath, '*first_0*.prof'))) == 1
+
+
+def test_serve_queue_trace_events() -> None:
+    """
+    pytest tests/test_runner.py::test_serve_queue_trace_events -s
+    """
+    import glob
+    import json
+    import sys
+
+    from xdoctest import runner
+
+    if sys.platform.startswith('win32'):
+        import pytest
+
+        pytest.skip('uses a Unix socket')
+
+    source = utils.codeblock(
+        '''
+        def first():
+            """
+            >>> x = 1
+            """
+
+        def second():
+            """
+            >>> x = 2
+            """
+        '''
+    )
+    with utils.TempDir() as temp:
+        dpath = str(temp.dpath)
+        modpath = join(dpath, 'queue_trace_mod.py')
+        trace_fpath = join(dpath, 'trace.json')
+        with open(modpath, 'w') as file:
+            file.write(source)
+        with utils.CaptureStdout():
+            summary = runner.doctest_module(
+                modpath,
+                'all',
+                argv=[''],
+                serve_queue='unix:' + join(dpath, 'queue.sock'),
+                queue_workers=2,
+                trace_events=trace_fpath,
+            )
+        assert summary['n_passed'] == 2
+        # The traces of the workers were merged into the one of the
+        # coordinator
+        assert glob.glob(join(dpath, 'trace.*.json')) == []
+        with open(trace_fpath) as file:
+            events = json.load(file)['traceEvents']
+        names = [e['name'] for e in events if e['ph'] == 'X']
+        assert names.count('part 0') == 2
+        assert any('parse' in name for name in names)
+        process_names = {
+            e['args']['name'] for e in events if e['name'] == 'process_name'
+        }
+        assert 'xdoctest' in process_names
+        assert process_names & {'xdoctest local-0', 'xdoctest local-1'}
+
+
 if __name__ == '__main__':
     """
     CommandLine: